@@ -0,0 +1,181 @@
+"""
+Índice aproximado de vecinos más cercanos (IVF) implementado con numpy.
+
+Las filas (normalizadas) se agrupan con k-means esférico en `nlist` listas
+invertidas; una consulta sólo compara contra las filas de las `nprobe` listas
+cuyos centroides son más parecidos. Más `nprobe` = más recall y más costo.
+
+`crear_indice` elige el índice: búsqueda exacta (VectorIndex) para bases
+chicas o con ANN_INDEX="exact", IVF en otro caso. El IVF se puede guardar
+junto a los embeddings y se reutiliza mientras la firma de las filas coincida.
+"""
+import os
+import json
+import time
+import logging
+import numpy as np
+
+from config import ANN_INDEX, ANN_MIN_ROWS, ANN_NLIST, ANN_NPROBE
+from vector_index import VectorIndex, normalizar_filas, top_k_indices
+
+logger = logging.getLogger(__name__)
+
+FORMATO_VERSION = 1
+TAMANO_BLOQUE = 16384
+
+
+def nlist_automatico(n):
+    return max(1, int(np.sqrt(n)))
+
+
+def _asignar(matriz, centroides):
+    """Índice del centroide más parecido para cada fila, por bloques para acotar memoria."""
+    asignaciones = np.empty(matriz.shape[0], dtype=np.int64)
+    for desde in range(0, matriz.shape[0], TAMANO_BLOQUE):
+        bloque = np.asarray(matriz[desde:desde + TAMANO_BLOQUE], dtype=np.float32)
+        asignaciones[desde:desde + len(bloque)] = np.argmax(bloque @ centroides.T, axis=1)
+    return asignaciones
+
+
+def entrenar_centroides(matriz, nlist, iteraciones=15, muestra_por_lista=64, semilla=0):
+    """K-means esférico sobre una muestra de `matriz`; devuelve `nlist` centroides normalizados."""
+    rng = np.random.default_rng(semilla)
+    n = matriz.shape[0]
+    nlist = min(nlist, n)
+    muestra = np.sort(rng.choice(n, size=min(n, nlist * muestra_por_lista), replace=False))
+    datos = np.asarray(matriz[muestra], dtype=np.float32)
+
+    centroides = datos[rng.choice(len(datos), size=nlist, replace=False)].copy()
+    for _ in range(iteraciones):
+        asignaciones = _asignar(datos, centroides)
+        sumas = np.zeros_like(centroides)
+        np.add.at(sumas, asignaciones, datos)
+        vacias = np.bincount(asignaciones, minlength=nlist) == 0
+        # Una lista vacía se re-siembra con una fila al azar para no perderla.
+        sumas[vacias] = datos[rng.choice(len(datos), size=int(vacias.sum()))]
+        centroides = normalizar_filas(sumas)
+    return centroides
+
+
+class IndiceIVF:
+    """
+    Índice de listas invertidas con la misma interfaz de búsqueda que
+    VectorIndex (`buscar`, `buscar_lote`, `matriz`, `len`).
+    """
+
+    def __init__(self, matriz, centroides, nprobe=ANN_NPROBE, asignaciones=None):
+        self.matriz = matriz
+        self.centroides = np.ascontiguousarray(centroides, dtype=np.float32)
+        self.nprobe = nprobe
+        if asignaciones is None:
+            asignaciones = _asignar(matriz, self.centroides)
+        # Filas agrupadas por lista: la lista c son orden[offsets[c]:offsets[c + 1]].
+        self.orden = np.argsort(asignaciones, kind="stable")
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(asignaciones, minlength=self.nlist))))
+
+    @classmethod
+    def entrenar(cls, matriz, nlist=None, nprobe=ANN_NPROBE):
+        inicio = time.perf_counter()
+        centroides = entrenar_centroides(matriz, nlist or nlist_automatico(matriz.shape[0]))
+        indice = cls(matriz, centroides, nprobe)
+        logger.info(
+            f"Índice IVF entrenado: {len(indice)} filas, {indice.nlist} listas "
+            f"en {time.perf_counter() - inicio:.2f}s."
+        )
+        return indice
+
+    def __len__(self):
+        return self.matriz.shape[0]
+
+    @property
+    def nlist(self):
+        return self.centroides.shape[0]
+
+    @property
+    def dimension(self):
+        return self.matriz.shape[1]
+
+    def candidatos(self, consulta, nprobe=None):
+        """Filas de las `nprobe` listas más cercanas a `consulta` (normalizada)."""
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        listas = top_k_indices(self.centroides @ consulta, nprobe)
+        return np.concatenate([self.orden[self.offsets[c]:self.offsets[c + 1]] for c in listas])
+
+    def buscar(self, consulta, top_k=1, min_score=None, nprobe=None):
+        return self.buscar_lote(consulta, top_k, min_score, nprobe)[0]
+
+    def buscar_lote(self, consultas, top_k=1, min_score=None, nprobe=None):
+        consultas = normalizar_filas(consultas)
+        resultados = []
+        for consulta in consultas:
+            candidatos = self.candidatos(consulta, nprobe)
+            scores = np.asarray(self.matriz[candidatos], dtype=np.float32) @ consulta
+            mejores = top_k_indices(scores, top_k)
+            indices, scores = candidatos[mejores], scores[mejores]
+            if min_score is not None:
+                mascara = scores >= min_score
+                indices, scores = indices[mascara], scores[mascara]
+            resultados.append((indices, scores))
+        return resultados
+
+    def guardar(self, path, firma=None):
+        """Guarda centroides y listas (no la matriz, que ya está en el store de embeddings)."""
+        meta = json.dumps({"version": FORMATO_VERSION, "filas_total": len(self), "firma": firma})
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, centroides=self.centroides, orden=self.orden, offsets=self.offsets, meta=np.array(meta))
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @classmethod
+    def cargar(cls, path, matriz, firma=None, nprobe=ANN_NPROBE):
+        """Devuelve el índice guardado en `path` para `matriz`, o None si falta o quedó viejo."""
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as datos:
+                meta = json.loads(str(datos["meta"]))
+                if (meta.get("version") != FORMATO_VERSION or meta.get("filas_total") != matriz.shape[0]
+                        or meta.get("firma") != firma):
+                    return None
+                indice = cls.__new__(cls)
+                indice.matriz = matriz
+                indice.centroides = datos["centroides"]
+                indice.orden = datos["orden"]
+                indice.offsets = datos["offsets"]
+                indice.nprobe = nprobe
+                return indice
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"No se pudo leer el índice IVF '{path}': {e}")
+            return None
+
+
+def crear_indice(matriz, normalizada=False, tipo=ANN_INDEX, min_filas=ANN_MIN_ROWS,
+                 nlist=ANN_NLIST, nprobe=ANN_NPROBE, path=None, firma=None, base=None):
+    """
+    Devuelve el índice de búsqueda para `matriz`: exacto (VectorIndex) si
+    `tipo` es "exact" o hay menos de `min_filas` filas; IVF en otro caso.
+
+    Con `path` el IVF se lee de disco si su `firma` coincide y, si no, se
+    entrena y se guarda. Con `base` (un IndiceIVF previo de la misma
+    dimensión) se reutilizan sus centroides en lugar de volver a entrenar.
+    """
+    exacto = VectorIndex(matriz, normalizada=normalizada)
+    if tipo != "ivf" or len(exacto) < max(min_filas, 1):
+        return exacto
+
+    matriz = exacto.matriz
+    if isinstance(base, IndiceIVF) and base.dimension == exacto.dimension:
+        return IndiceIVF(matriz, base.centroides, nprobe)
+    if path:
+        indice = IndiceIVF.cargar(path, matriz, firma, nprobe)
+        if indice is not None:
+            return indice
+    indice = IndiceIVF.entrenar(matriz, nlist or None, nprobe)
+    if path:
+        indice.guardar(path, firma)
+    return indice
@@ -1,19 +1,30 @@
 # app.py
-from flask import Flask, request, render_template, jsonify, session
+from flask import Flask, Response, request, render_template, jsonify, session
 from flask_cors import CORS
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+import json
 import logging
 from datetime import datetime
 # from urllib.parse import quote # Ya no se usa directamente aquí, se movió a utils.py
 
-from config import SECRET_KEY, OPENROUTER_API_KEY
-from models import detectar_toxicidad
-from utils import generar_respuesta_contextual # SOLO esta función se importa de utils
-from rag_embedder import crear_embeddings
+from config import SECRET_KEY, OPENROUTER_API_KEY, PRELOAD_MODELS, BACKGROUND_SCRAPING_ENABLED
+from models import detectar_toxicidad, batcher_toxicidad, cascada_toxicidad
+from utils import (
+    generar_respuesta_contextual, llamar_ia_openrouter_stream, es_error_de_limite, MENSAJE_LIMITE,
+    cache_respuestas_ia, llamadas_ia,
+)
+from rag_embedder import crear_embeddings, estadisticas_busqueda
+from rag_system import start_background_scraping, get_scraping_status
 from data_manager import load_knowledge_base, load_tramites_urls
+from model_registry import registry
+from embedding_pipeline import cache_consultas
+from llm_client import cliente_llm
 
 app = Flask(__name__)
 app.secret_key = SECRET_KEY
 CORS(app)
+# Firma las respuestas transmitidas que el navegador devuelve para guardarlas en el historial.
+firmador_historial = URLSafeTimedSerializer(app.secret_key, salt="historial-stream")
 
 # Configura logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -32,26 +43,54 @@ with app.app_context():
     crear_embeddings() # Asegura que los embeddings existan y estén actualizados
     logger.info("Embeddings actualizados.")
 
+    if BACKGROUND_SCRAPING_ENABLED:
+        logger.info("Scrapeando en segundo plano las URLs que faltan en la base...")
+        start_background_scraping()
+
+    if PRELOAD_MODELS:
+        logger.info("Precargando modelos...")
+        registry.preload()
+
 
 @app.route('/', methods=['GET'])
 def index():
     return render_template('index.html')
 
-@app.route('/api/chat', methods=['POST'])
-def chat():
+def _leer_mensaje():
+    """Devuelve (mensaje, None) o (None, respuesta de error 400)."""
     if not request.is_json:
-        return jsonify({"respuesta": "Formato inválido, se esperaba JSON.", "error": True}), 400
+        return None, (jsonify({"respuesta": "Formato inválido, se esperaba JSON.", "error": True}), 400)
 
     data = request.get_json()
     mensaje = data.get('mensaje', '').strip()
 
     if not mensaje:
-        return jsonify({"respuesta": "Por favor, escribe tu consulta.", "error": True}), 400
+        return None, (jsonify({"respuesta": "Por favor, escribe tu consulta.", "error": True}), 400)
+    return mensaje, None
+
+
+def _registrar_en_historial(mensaje, respuesta):
+    entrada = {
+        'usuario': mensaje,
+        'asistente': respuesta,
+        'timestamp': datetime.now().isoformat()
+    }
+    session['historial'] = session.get('historial', [])
+    session['historial'].append(entrada)
+    session['historial'] = session['historial'][-10:] # Limitar historial
+    return entrada
 
+
+def _procesar_mensaje(mensaje, stream_ia=False):
+    """
+    Genera la respuesta a `mensaje` y actualiza la sesión. Devuelve
+    (datos, status) con el JSON de /api/chat. Con `stream_ia=True`, si la
+    respuesta tiene que salir del LLM devuelve (None, None) y no toca la sesión.
+    """
     es_toxico, razon_toxicidad = detectar_toxicidad(mensaje)
     if es_toxico:
         logger.warning(f"Mensaje tóxico detectado: '{mensaje}' - {razon_toxicidad}")
-        return jsonify({"respuesta": "Usá un lenguaje respetuoso, por favor. Estoy para ayudarte.", "tipo": "toxicidad"}), 200
+        return {"respuesta": "Usá un lenguaje respetuoso, por favor. Estoy para ayudarte.", "tipo": "toxicidad"}, 200
 
     historial_conversacion = session.get('historial', [])
     current_tramite_data = session.get('current_tramite_data', None)
@@ -59,24 +98,28 @@ def chat():
     respuesta_generada = generar_respuesta_contextual(
         mensaje,
         historial_conversacion,
-        current_tramite_data=current_tramite_data
+        current_tramite_data=current_tramite_data,
+        stream_ia=stream_ia
     )
     
     if not respuesta_generada:
         logger.error("❌ La función generar_respuesta_contextual devolvió None.")
-        return jsonify({
+        return {
             "respuesta": "Ocurrió un error inesperado en el servidor. Por favor, intentá más tarde.",
             "tipo": "error_interno",
             "sugerencias": []
-        }), 500
+        }, 500
+
+    if respuesta_generada.get('tipo') == 'stream_ia':
+        return None, None
 
     if respuesta_generada.get('error'):
         logger.error(f"Error detectado en la respuesta de utils: {respuesta_generada.get('mensaje', 'Error desconocido')}")
-        return jsonify({
+        return {
             "respuesta": respuesta_generada.get('mensaje', "Ocurrió un error inesperado al procesar tu solicitud."),
             "tipo": respuesta_generada.get('tipo', 'error_interno'),
             "sugerencias": respuesta_generada.get('sugerencias', [])
-        }), 500 # Devolver 500 para errores del servidor/IA
+        }, 500 # Devolver 500 para errores del servidor/IA
 
     datos_identificado = respuesta_generada.get('datos_tramite_identificado')
     if datos_identificado is not None:
@@ -94,15 +137,118 @@ def chat():
     
     if respuesta_generada.get('tipo') == 'tramite_especifico':
         response_data_to_send['info'] = respuesta_generada.get('info')
-    session['historial'] = session.get('historial', [])
-    session['historial'].append({
-        'usuario': mensaje,
-        'asistente': response_data_to_send['respuesta'],
-        'timestamp': datetime.now().isoformat()
+    _registrar_en_historial(mensaje, response_data_to_send['respuesta'])
+
+    return response_data_to_send, 200
+
+
+@app.route('/api/chat', methods=['POST'])
+def chat():
+    mensaje, error = _leer_mensaje()
+    if error:
+        return error
+
+    datos, status = _procesar_mensaje(mensaje)
+    return jsonify(datos), status
+
+
+def _evento_sse(evento, datos):
+    return f"event: {evento}\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n"
+
+
+def _sse_respuesta_ia(mensaje, historial, entrada):
+    """
+    Eventos `token` con cada fragmento del LLM y un `fin` (o `error`) al
+    terminar. `fin` lleva en `historial` el texto completo firmado, para que
+    el navegador lo devuelva a /api/chat/historial y quede en la sesión.
+    """
+    partes = []
+    try:
+        for texto in llamar_ia_openrouter_stream(mensaje, historial):
+            partes.append(texto)
+            yield _evento_sse("token", {"texto": texto})
+    except Exception as e:
+        logger.error(f"Error en el streaming de la IA: {e}")
+        if es_error_de_limite(e):
+            yield _evento_sse("error", {"respuesta": MENSAJE_LIMITE, "tipo": "error_limite", "error": True})
+        else:
+            yield _evento_sse("error", {
+                "respuesta": "Hubo un problema técnico al conectar con la IA. Intenta de nuevo más tarde.",
+                "tipo": "error_red",
+                "error": True,
+            })
+        return
+
+    if not partes:
+        yield _evento_sse("error", {
+            "respuesta": "No pude generar una respuesta adecuada. ¿Podrías reformular tu pregunta?",
+            "tipo": "error_ia_vacia",
+            "error": True,
+        })
+        return
+    respuesta = "".join(partes)
+    token = firmador_historial.dumps({"timestamp": entrada["timestamp"], "usuario": mensaje, "asistente": respuesta})
+    yield _evento_sse("fin", {
+        "respuesta": respuesta,
+        "tipo": "respuesta_general_ia",
+        "sugerencias": [],
+        "historial": token,
     })
-    session['historial'] = session['historial'][-10:] # Limitar historial
 
-    return jsonify(response_data_to_send), 200
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Igual que /api/chat pero como text/event-stream. Las respuestas de la base
+    de conocimiento (y los errores) salen en un solo evento `mensaje` con el
+    mismo JSON que /api/chat; las del LLM salen como eventos `token` a medida
+    que se generan, seguidos de `fin` con el texto completo.
+
+    La sesión es una cookie y se envía con los headers, antes del cuerpo: la
+    pregunta se guarda en el historial antes de transmitir y la respuesta del
+    LLM la completa el navegador con /api/chat/historial al recibir `fin`.
+    """
+    mensaje, error = _leer_mensaje()
+    if error:
+        return error
+
+    datos, status = _procesar_mensaje(mensaje, stream_ia=True)
+    if datos is not None:
+        datos["error"] = status != 200
+        eventos = iter([_evento_sse("mensaje", datos)])
+    else:
+        historial = list(session.get('historial', []))
+        entrada = _registrar_en_historial(mensaje, "")
+        eventos = _sse_respuesta_ia(mensaje, historial, entrada)
+
+    def generar():
+        # Un comentario inicial para que el navegador reciba los headers enseguida.
+        yield ": inicio\n\n"
+        yield from eventos
+
+    return Response(generar(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # Que nginx no acumule el stream
+    })
+
+
+@app.route('/api/chat/historial', methods=['POST'])
+def chat_historial():
+    """Completa en el historial la respuesta de un turno transmitido por /api/chat/stream."""
+    data = request.get_json(silent=True) or {}
+    try:
+        turno = firmador_historial.loads(data.get('historial', ''), max_age=3600)
+    except BadSignature:
+        return jsonify({"respuesta": "Token de historial inválido.", "error": True}), 400
+
+    historial = session.get('historial', [])
+    for item in reversed(historial):
+        if item.get('timestamp') == turno['timestamp'] and item.get('usuario') == turno['usuario']:
+            item['asistente'] = turno['asistente']
+            session['historial'] = historial
+            return jsonify({"registrado": True})
+    # El turno ya no está (historial limpiado o fuera de los últimos 10).
+    return jsonify({"registrado": False})
 
 
 @app.route('/api/limpiar_historial', methods=['POST'])
@@ -112,6 +258,23 @@ def limpiar_historial():
     logger.info("Historial limpiado")
     return jsonify({"mensaje": "Historial de conversación eliminado."})
 
+@app.route('/api/metricas', methods=['GET'])
+def metricas():
+    return jsonify({
+        "modelos": registry.estadisticas(),
+        "cache_consultas": cache_consultas.estadisticas(),
+        "batcher_toxicidad": batcher_toxicidad.estadisticas(),
+        "cascada_toxicidad": cascada_toxicidad.estadisticas(),
+        "busqueda": dict(estadisticas_busqueda),
+        "llm": cliente_llm.estadisticas(),
+        "cache_respuestas_ia": cache_respuestas_ia.estadisticas(),
+        "llamadas_ia_compartidas": llamadas_ia.estadisticas(),
+    })
+
+@app.route('/api/estado_scraping', methods=['GET'])
+def estado_scraping():
+    return jsonify(get_scraping_status())
+
 if __name__ == '__main__':
     if not OPENROUTER_API_KEY:
         print("⚠️ ADVERTENCIA: No configuraste OPENROUTER_API_KEY en .env")
@@ -0,0 +1,101 @@
+"""
+Benchmark del índice IVF contra la búsqueda exacta: recall@k y milisegundos
+por consulta para distintos valores de nprobe.
+
+Por defecto genera embeddings sintéticos agrupados (parecidos a los de una
+base de trámites de varias provincias); con --store usa los embeddings
+guardados por rag_embedder.
+
+Uso:
+    python benchmark_ann.py --filas 100000
+    python benchmark_ann.py --store --k 5 --nprobe 4 8 16 32
+"""
+import sys
+import json
+import time
+import argparse
+import logging
+import numpy as np
+
+from ann_index import IndiceIVF, nlist_automatico
+from vector_index import VectorIndex, normalizar_filas
+
+
+def embeddings_sinteticos(filas, dimension=384, grupos=None, ruido=3.0, semilla=0):
+    """Filas normalizadas alrededor de `grupos` centros al azar."""
+    rng = np.random.default_rng(semilla)
+    grupos = grupos or max(1, filas // 200)
+    centros = normalizar_filas(rng.standard_normal((grupos, dimension)))
+    pertenencia = rng.integers(0, grupos, size=filas)
+    matriz = centros[pertenencia] + ruido * rng.standard_normal((filas, dimension)).astype(np.float32) / np.sqrt(dimension)
+    return normalizar_filas(matriz)
+
+
+def consultas_desde(matriz, cantidad, ruido=0.8, semilla=1):
+    """Consultas cercanas (pero no iguales) a filas de la base."""
+    rng = np.random.default_rng(semilla)
+    base = matriz[rng.choice(matriz.shape[0], size=cantidad, replace=False)]
+    ruido_filas = ruido * rng.standard_normal(base.shape).astype(np.float32) / np.sqrt(matriz.shape[1])
+    return normalizar_filas(base + ruido_filas)
+
+
+def _ms_por_consulta(buscar, consultas):
+    inicio = time.perf_counter()
+    resultados = [buscar(consulta) for consulta in consultas]
+    return resultados, (time.perf_counter() - inicio) * 1000 / len(consultas)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", action="store_true", help="Usar los embeddings guardados en lugar de sintéticos")
+    parser.add_argument("--filas", type=int, default=100000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--ruido", type=float, default=2.0, help="Dispersión de los datos sintéticos (más = más difícil)")
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--nlist", type=int, default=0, help="0 = √filas")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32, 64])
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.store:
+        from embedding_store import cargar_embeddings
+        matriz, _ = cargar_embeddings(mmap=False)
+        matriz = normalizar_filas(matriz)
+    else:
+        matriz = embeddings_sinteticos(args.filas, args.dimension, ruido=args.ruido)
+    consultas = consultas_desde(matriz, min(args.consultas, matriz.shape[0]))
+
+    exacto = VectorIndex(matriz, normalizada=True)
+    verdad, ms_exacto = _ms_por_consulta(lambda q: exacto.buscar(q, top_k=args.k)[0], consultas)
+
+    inicio = time.perf_counter()
+    ivf = IndiceIVF.entrenar(matriz, args.nlist or nlist_automatico(matriz.shape[0]))
+    segundos_entrenamiento = time.perf_counter() - inicio
+
+    resultados = []
+    for nprobe in args.nprobe:
+        aproximados, ms = _ms_por_consulta(lambda q: ivf.buscar(q, top_k=args.k, nprobe=nprobe)[0], consultas)
+        recall = np.mean([
+            len(set(a.tolist()) & set(v.tolist())) / max(len(v), 1) for a, v in zip(aproximados, verdad)
+        ])
+        resultados.append({
+            "nprobe": nprobe,
+            f"recall@{args.k}": round(float(recall), 4),
+            "ms_por_consulta": round(ms, 3),
+            "aceleracion": round(ms_exacto / ms, 2) if ms else None,
+        })
+
+    print(json.dumps({
+        "filas": matriz.shape[0],
+        "dimension": matriz.shape[1],
+        "nlist": ivf.nlist,
+        "segundos_entrenamiento": round(segundos_entrenamiento, 2),
+        "exacto_ms_por_consulta": round(ms_exacto, 3),
+        "ivf": resultados,
+    }, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
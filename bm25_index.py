@@ -0,0 +1,128 @@
+"""
+Índice léxico BM25 en memoria sobre la base de conocimiento (título,
+descripción, requisitos y organismo) y fusión de rankings por
+reciprocal-rank fusion (RRF).
+
+El título pesa más que el resto de los campos (BM25F simplificado: las
+frecuencias de cada campo se suman con su peso).
+"""
+import re
+import math
+import logging
+import numpy as np
+
+from text_utils import normalizar_texto
+from vector_index import top_k_indices
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+PESOS_CAMPOS = {"titulo": 3.0, "descripcion": 1.0, "requisitos": 1.0, "organismo": 1.0}
+
+# Palabras vacías y verbos de conversación que no distinguen un trámite de otro.
+PALABRAS_VACIAS = frozenset("""
+a al algo ante como con cual cuales cuando cuanto cuanta de del donde e el en es esa ese eso esta este esto
+hay la las le les lo los me mi mis muy necesito necesitaria no o para pero por puedo podes podria que quiero
+queria quisiera se si sin sobre su sus te tengo tener un una uno y ya hacer hago saco sacar tramitar tramito
+obtener obtengo solicitar solicito pedir pido sale cuesta queda
+""".split())
+
+
+def tokenizar(texto):
+    return [t for t in _TOKEN.findall(normalizar_texto(texto)) if t not in PALABRAS_VACIAS]
+
+
+def _texto_campo(valor):
+    if isinstance(valor, list):
+        return " ".join(str(v) for v in valor)
+    return str(valor or "")
+
+
+class IndiceBM25:
+    """
+    Índice invertido BM25 sobre registros de la base de conocimiento.
+    `buscar` devuelve (indices, scores) como VectorIndex; los índices son
+    posiciones en la lista de registros usada para construirlo.
+    """
+
+    def __init__(self, registros, k1=1.5, b=0.75, pesos=PESOS_CAMPOS):
+        self.k1 = k1
+        self.b = b
+        frecuencias = []
+        for registro in registros:
+            data = registro.get("data") or {}
+            tf = {}
+            for campo, peso in pesos.items():
+                for termino in tokenizar(_texto_campo(data.get(campo))):
+                    tf[termino] = tf.get(termino, 0.0) + peso
+            frecuencias.append(tf)
+
+        self.n = len(frecuencias)
+        self.largos = np.array([sum(tf.values()) for tf in frecuencias], dtype=np.float32)
+        self.largo_medio = float(self.largos.mean()) if self.n else 0.0
+
+        postings = {}
+        for doc, tf in enumerate(frecuencias):
+            for termino, frecuencia in tf.items():
+                postings.setdefault(termino, ([], []))
+                postings[termino][0].append(doc)
+                postings[termino][1].append(frecuencia)
+        self.postings = {
+            termino: (np.array(docs, dtype=np.int64), np.array(tfs, dtype=np.float32))
+            for termino, (docs, tfs) in postings.items()
+        }
+        self.idf = {
+            termino: math.log(1 + (self.n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for termino, (docs, _) in self.postings.items()
+        }
+        # Un término que no está en la base cuenta como el más raro posible.
+        self.idf_desconocido = math.log(1 + (self.n + 0.5) / 0.5) if self.n else 0.0
+        logger.info(f"Índice BM25 construido: {self.n} documentos, {len(self.postings)} términos.")
+
+    def __len__(self):
+        return self.n
+
+    def puntuar(self, terminos):
+        """Vector con el score BM25 de cada documento para los `terminos` de la consulta."""
+        scores = np.zeros(self.n, dtype=np.float32)
+        normalizacion = self.k1 * (1 - self.b + self.b * self.largos / max(self.largo_medio, 1e-9))
+        for termino in set(terminos):
+            if termino not in self.postings:
+                continue
+            docs, tfs = self.postings[termino]
+            scores[docs] += self.idf[termino] * tfs * (self.k1 + 1) / (tfs + normalizacion[docs])
+        return scores
+
+    def cobertura(self, terminos, doc):
+        """Fracción (ponderada por idf) de los términos de la consulta que aparecen en `doc`."""
+        terminos = set(terminos)
+        total = sum(self.idf.get(t, self.idf_desconocido) for t in terminos)
+        if not total:
+            return 0.0
+        presentes = sum(
+            self.idf[t] for t in terminos
+            if t in self.postings and doc in self.postings[t][0]
+        )
+        return presentes / total
+
+    def buscar(self, consulta, top_k=10):
+        terminos = tokenizar(consulta)
+        if not terminos or not self.n:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = self.puntuar(terminos)
+        indices = top_k_indices(scores, top_k)
+        indices = indices[scores[indices] > 0]
+        return indices, scores[indices]
+
+
+def fusion_rrf(rankings, k=60):
+    """
+    Reciprocal-rank fusion: cada lista de `rankings` aporta 1 / (k + posición)
+    a sus elementos. Devuelve los elementos ordenados por score fusionado.
+    """
+    scores = {}
+    for ranking in rankings:
+        for posicion, elemento in enumerate(ranking, 1):
+            scores[elemento] = scores.get(elemento, 0.0) + 1.0 / (k + posicion)
+    return sorted(scores, key=lambda elemento: scores[elemento], reverse=True)
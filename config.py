@@ -5,6 +5,20 @@ load_dotenv()
 
 SECRET_KEY = os.urandom(24)
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+# Base de la API compatible con /chat/completions (se puede apuntar a un servidor local de pruebas)
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))  # llamadas al LLM en vuelo a la vez
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "2"))  # espera máxima por un lugar libre
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "30"))  # tiempo total por llamada
+# Cache semántico de respuestas del LLM (sólo mensajes sin historial previo)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_SIMILARITY = float(os.getenv("LLM_CACHE_SIMILARITY", "0.92"))  # coseno mínimo para reusar una respuesta
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "512"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "86400"))
+LLM_CACHE_FILE = os.getenv("LLM_CACHE_FILE", "data/llm_response_cache.npz")  # "" = sólo en memoria
+# Preguntas idénticas simultáneas (sin historial) comparten una sola llamada al LLM
+LLM_SINGLE_FLIGHT_ENABLED = os.getenv("LLM_SINGLE_FLIGHT_ENABLED", "1") == "1"
 BASE_URL = "https://www.formosa.gob.ar" 
 TOXICITY_MODEL_NAME = "unitary/toxic-bert"
 TOXICITY_THRESHOLD = 0.5
@@ -30,3 +44,91 @@ WHITELIST_WORDS = [
 EMBEDDING_MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"
 KNOWLEDGE_BASE_FILE = 'data/tramites_knowledge_base.json'
 TRAMITES_URLS_FILE = 'data/tramites_urls.json'
+EMBEDDINGS_FILE = 'data/tramites_embeddings.json'
+EMBEDDINGS_MATRIX_FILE = 'data/tramites_embeddings.npy'
+EMBEDDINGS_MANIFEST_FILE = 'data/tramites_embeddings.manifest.json'
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+# Índice de búsqueda: "ivf" (aproximado, listas invertidas) o "exact" (producto contra toda la matriz)
+ANN_INDEX = os.getenv("ANN_INDEX", "ivf")
+ANN_MIN_ROWS = int(os.getenv("ANN_MIN_ROWS", "5000"))  # con menos filas la búsqueda es exacta
+ANN_NLIST = int(os.getenv("ANN_NLIST", "0"))  # listas del IVF; 0 = √filas
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "16"))  # listas revisadas por consulta (más = más recall)
+EMBEDDINGS_ANN_FILE = 'data/tramites_embeddings.ivf.npz'
+# Búsqueda híbrida: BM25 (título/descripción/requisitos/organismo) + embeddings, fusionados con RRF
+BM25_ENABLED = os.getenv("BM25_ENABLED", "1") == "1"
+BM25_CONFIDENT_COVERAGE = 1.0  # el mejor resultado léxico contiene todos los términos de la consulta...
+BM25_CONFIDENT_MARGIN = 1.5  # ...y supera al segundo por este factor...
+BM25_MIN_SCORE = float(os.getenv("BM25_MIN_SCORE", "8.0"))  # ...y llega a este score: no se calcula el embedding
+BM25_MIN_COVERAGE = 0.5  # cobertura mínima para que un resultado léxico entre en la fusión (sólo si hubo resultado denso)
+RRF_K = 60
+HYBRID_CANDIDATES = 20
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "1") == "1"
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048"))
+QUERY_EMBEDDING_CACHE_TTL = int(os.getenv("QUERY_EMBEDDING_CACHE_TTL", "3600"))
+TOXICITY_BATCHING_ENABLED = os.getenv("TOXICITY_BATCHING_ENABLED", "1") == "1"
+TOXICITY_BATCH_MAX_SIZE = int(os.getenv("TOXICITY_BATCH_MAX_SIZE", "16"))
+TOXICITY_BATCH_MAX_WAIT_MS = float(os.getenv("TOXICITY_BATCH_MAX_WAIT_MS", "5"))
+# Backend de inferencia en CPU: "torch" (fp32), "int8" (cuantización dinámica) u "onnx" (onnxruntime,
+# con las dependencias opcionales de requirements-onnx.txt)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+ONNX_MODELS_DIR = 'data/onnx'
+# Cascada de toxicidad: etapas en orden; la primera que esté segura decide.
+TOXICITY_CASCADE_STAGES = [
+    etapa.strip()
+    for etapa in os.getenv("TOXICITY_CASCADE_STAGES", "lexico,frases_seguras,ngram,modelo").split(",")
+    if etapa.strip()
+]
+TOXICITY_NGRAM_MODEL_FILE = 'data/toxicity_ngram.npz'
+TOXICITY_NGRAM_BENIGN_MAX = 0.05
+TOXICITY_NGRAM_TOXIC_MIN = 0.97
+TOXICITY_SAFE_MAX_TOKENS = 25
+
+# Etapa frases_seguras: un mensaje corto sólo con estas palabras es benigno si es un saludo
+# o si tiene una palabra de intención (pregunta o pedido) y un sustantivo de trámite.
+SAFE_GREETING_WORDS = [
+    "hola", "buenas", "buenos", "buen", "dia", "dias", "tardes", "noches", "gracias", "muchas",
+    "por", "favor", "ok", "si", "no", "bueno", "dale", "perfecto", "chau",
+]
+SAFE_INTENT_WORDS = [
+    "como", "donde", "cuando", "cuanto", "cuanta", "cuantos", "que", "cual", "cuales",
+    "quiero", "queria", "necesito", "necesitaria", "quisiera", "puedo", "podes", "podria", "saco", "sacar",
+    "hago", "hacer", "tramito", "tramitar", "obtengo", "obtener", "solicito", "solicitar", "renovar",
+    "renuevo", "pedir", "pido", "sale", "cuesta", "queda", "abre", "atienden", "consultar", "inscribirme",
+]
+SAFE_CONNECTOR_WORDS = [
+    "me", "mi", "mis", "el", "la", "los", "las", "un", "una", "de", "del", "en", "para", "con", "y", "o",
+    "a", "al", "se", "es", "esta", "hay", "tengo", "tener", "lo", "le", "nuevo", "nueva",
+]
+SAFE_TRAMITE_WORDS = [
+    "tramite", "tramites", "requisitos", "turno", "turnos", "dni", "documento", "pasaporte", "certificado",
+    "constancia", "partida", "acta", "nacimiento", "matrimonio", "defuncion", "antecedentes", "buena",
+    "conducta", "licencia", "conducir", "carnet", "registro", "civil", "formulario", "inscripcion",
+    "habilitacion", "comercial", "permiso", "pesca", "caza", "impuesto", "impuestos", "ingresos", "brutos",
+    "rentas", "patente", "automotor", "sellos", "libre", "deuda", "jubilacion", "pension", "obra", "social",
+    "titulo", "escolaridad", "alumno", "regular", "mediacion", "cooperativa", "proveedores", "marca",
+    "residencia", "domicilio", "legalizacion", "copia", "oficina", "horario", "costo", "arancel",
+]
+# Nunca cuentan como vocabulario seguro, aunque alguien las agregue arriba: las amenazas van al modelo.
+SAFE_EXCLUDED_WORDS = [
+    "muerte", "muerto", "muertos", "matar", "mato", "maten", "matarlos", "morir", "muera", "mueran",
+    "asesinar", "bomba", "explotar", "quemar", "incendiar", "arma", "armas", "tiro", "tiros", "balear",
+    "sangre", "golpear", "degollar", "colgar", "amenaza", "venganza",
+]
+SCRAPER_MAX_WORKERS = int(os.getenv("SCRAPER_MAX_WORKERS", "8"))
+SCRAPER_REQUESTS_PER_SECOND = float(os.getenv("SCRAPER_REQUESTS_PER_SECOND", "4"))
+SCRAPER_PARSE_PROCESSES = int(os.getenv("SCRAPER_PARSE_PROCESSES", "0")) or None  # None = os.cpu_count()
+# Parser de las páginas de trámites: "lxml" (sólo las secciones usadas) o "html.parser" (página completa)
+SCRAPER_PARSER = os.getenv("SCRAPER_PARSER", "lxml")
+KB_COMMIT_BATCH = 25
+# Almacenamiento de la base de conocimiento: "sqlite" (indexado por URL) o "json" (archivo único)
+KB_BACKEND = os.getenv("KB_BACKEND", "sqlite")
+KB_SQLITE_FILE = 'data/tramites_knowledge_base.sqlite3'
+HTML_CACHE_ENABLED = os.getenv("HTML_CACHE_ENABLED", "1") == "1"
+HTML_CACHE_DIR = 'data/html_cache'
+# Checkpoints para reanudar el crawler y el scraping (--reanudar)
+CRAWL_CHECKPOINT_FILE = 'data/crawl_checkpoint.json'
+SCRAPE_CHECKPOINT_FILE = 'data/scrape_checkpoint.jsonl'
+# Scrapear en segundo plano, al arrancar, las URLs de tramites_urls.json que faltan en la base.
+# Lo hace un solo proceso por host (el que toma el lock), no cada worker.
+BACKGROUND_SCRAPING_ENABLED = os.getenv("BACKGROUND_SCRAPING_ENABLED", "0") == "1"
+BACKGROUND_SCRAPING_LOCK_FILE = 'data/background_scraping.lock'
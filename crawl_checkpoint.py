@@ -0,0 +1,112 @@
+"""
+Checkpoints del crawler y del scraping, para poder reanudar una corrida cortada.
+
+    data/crawl_checkpoint.json      frontera, páginas visitadas, fallidas y trámites descubiertos
+    data/scrape_checkpoint.jsonl    una línea por URL terminada: url, estado ('ok' / 'error'), fecha
+
+El checkpoint del crawler se reescribe completo (de forma atómica) cada pocas
+páginas; el del scraping es un log de sólo-agregar y el último estado de cada
+URL es el que vale.
+"""
+import os
+import json
+import logging
+import threading
+from datetime import datetime
+
+from config import CRAWL_CHECKPOINT_FILE, SCRAPE_CHECKPOINT_FILE
+
+logger = logging.getLogger(__name__)
+
+FORMATO_VERSION = 1
+
+_lock_estados = threading.Lock()
+
+
+def guardar_frontera(base_url, por_visitar, visitadas, fallidas, tramites, completo=False,
+                     path=CRAWL_CHECKPOINT_FILE):
+    """Guarda el estado del crawler. Las URLs en curso deben venir dentro de `por_visitar`."""
+    estado = {
+        "version": FORMATO_VERSION,
+        "base_url": base_url,
+        "actualizado": datetime.now().isoformat(),
+        "completo": completo,
+        "por_visitar": sorted(por_visitar),
+        "visitadas": sorted(visitadas),
+        "fallidas": sorted(fallidas),
+        "tramites": sorted(tramites),
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(estado, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def cargar_frontera(base_url, path=CRAWL_CHECKPOINT_FILE):
+    """
+    Devuelve el último checkpoint del crawler para `base_url` como dict con
+    conjuntos en por_visitar / visitadas / fallidas / tramites, o None si no
+    hay uno utilizable.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            estado = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Checkpoint del crawler ilegible en '{path}', se empieza de cero: {e}")
+        return None
+    if estado.get("version") != FORMATO_VERSION or estado.get("base_url") != base_url:
+        logger.warning(f"El checkpoint '{path}' es de otra versión o sitio; se ignora.")
+        return None
+    for clave in ("por_visitar", "visitadas", "fallidas", "tramites"):
+        estado[clave] = set(estado.get(clave, []))
+    return estado
+
+
+def registrar_estados(urls, estado, path=SCRAPE_CHECKPOINT_FILE):
+    """Agrega al log el `estado` ('ok' o 'error') de cada URL de `urls`."""
+    fecha = datetime.now().isoformat()
+    lineas = "".join(
+        json.dumps({"url": url, "estado": estado, "fecha": fecha}, ensure_ascii=False) + "\n" for url in urls
+    )
+    if not lineas:
+        return
+    with _lock_estados:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(lineas)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def estados_scrape(path=SCRAPE_CHECKPOINT_FILE):
+    """{url: último estado registrado}."""
+    estados = {}
+    if not os.path.exists(path):
+        return estados
+    with open(path, "r", encoding="utf-8") as f:
+        for linea in f:
+            try:
+                entrada = json.loads(linea)
+            except ValueError:
+                # Una línea cortada por una caída a mitad de escritura.
+                continue
+            estados[entrada["url"]] = entrada["estado"]
+    return estados
+
+
+def urls_completadas(path=SCRAPE_CHECKPOINT_FILE):
+    return {url for url, estado in estados_scrape(path).items() if estado == "ok"}
+
+
+def reiniciar_estados(path=SCRAPE_CHECKPOINT_FILE):
+    """Empieza un log de scraping nuevo (corrida desde cero)."""
+    with _lock_estados:
+        if os.path.exists(path):
+            os.remove(path)
@@ -1,11 +1,74 @@
 import json
 import os
 import logging
-from config import KNOWLEDGE_BASE_FILE, TRAMITES_URLS_FILE
+import threading
+from config import KNOWLEDGE_BASE_FILE, TRAMITES_URLS_FILE, KB_BACKEND, KB_SQLITE_FILE
 
 logger = logging.getLogger(__name__)
 
+_kb_store = None
+_kb_store_lock = threading.Lock()
+
+
+def get_kb_store():
+    """
+    Returns the SQLite knowledge base store (KB_BACKEND = "sqlite").
+    On first use, the JSON knowledge base file is upserted into the database
+    whenever its hash differs from the one recorded at the last import, so an
+    empty database gets seeded and an edited JSON is picked up on restart.
+    `python kb_store.py importar` replaces the database with the JSON instead.
+    """
+    global _kb_store
+    if _kb_store is None:
+        with _kb_store_lock:
+            if _kb_store is None:
+                from kb_store import KnowledgeBaseStore
+                store = KnowledgeBaseStore(KB_SQLITE_FILE)
+                if os.path.exists(KNOWLEDGE_BASE_FILE):
+                    _sync_from_json(store)
+                _kb_store = store
+    return _kb_store
+
+
+def _sync_from_json(store):
+    from kb_store import META_HASH_JSON, hash_archivo
+    json_hash = hash_archivo(KNOWLEDGE_BASE_FILE)
+    stored_hash = store.get_meta(META_HASH_JSON)
+    if stored_hash == json_hash:
+        return
+    if stored_hash is None and store.count() > 0:
+        # Database seeded before the hash was recorded: it may hold newer scraped entries than the JSON.
+        logger.warning(
+            f"'{KB_SQLITE_FILE}' has no record of the imported JSON; keeping it as is. "
+            f"Run 'python kb_store.py importar' to replace it with '{KNOWLEDGE_BASE_FILE}'."
+        )
+        store.set_meta(META_HASH_JSON, json_hash)
+        return
+    entries = [entry for entry in _load_knowledge_base_json() if entry.get('url')]
+    if not entries:
+        return
+    if stored_hash is None:
+        logger.info(f"Seeding '{KB_SQLITE_FILE}' from '{KNOWLEDGE_BASE_FILE}'.")
+    else:
+        logger.info(f"'{KNOWLEDGE_BASE_FILE}' changed since the last import; upserting {len(entries)} entries into '{KB_SQLITE_FILE}'.")
+    with store.transaction():
+        store.upsert_many(entries)
+        store.set_meta(META_HASH_JSON, json_hash)
+
+
 def load_knowledge_base():
+    if KB_BACKEND == "sqlite":
+        try:
+            data = get_kb_store().all()
+            logger.info(f"Loaded {len(data)} entries from knowledge base.")
+            return data
+        except Exception as e:
+            logger.error(f"Unexpected error loading knowledge base from '{KB_SQLITE_FILE}': {e}. Returning empty list.")
+            return []
+    return _load_knowledge_base_json()
+
+
+def _load_knowledge_base_json():
     if os.path.exists(KNOWLEDGE_BASE_FILE):
         try:
             with open(KNOWLEDGE_BASE_FILE, 'r', encoding='utf-8') as f:
@@ -22,15 +85,66 @@ def load_knowledge_base():
     return []
 
 def save_knowledge_base(data):
+    """Replaces the whole knowledge base atomically."""
+    if KB_BACKEND == "sqlite":
+        try:
+            get_kb_store().replace_all(data)
+            logger.info(f"Knowledge base saved to '{KB_SQLITE_FILE}' with {len(data)} entries.")
+        except Exception as e:
+            logger.error(f"Unexpected error saving knowledge base to '{KB_SQLITE_FILE}': {e}")
+        return
+    _save_knowledge_base_json(data)
+
+
+def _save_knowledge_base_json(data):
     os.makedirs(os.path.dirname(KNOWLEDGE_BASE_FILE), exist_ok=True)
+    tmp_file = f"{KNOWLEDGE_BASE_FILE}.tmp-{os.getpid()}"
     try:
-        with open(KNOWLEDGE_BASE_FILE, 'w', encoding='utf-8') as f:
+        with open(tmp_file, 'w', encoding='utf-8') as f:
             json.dump(data, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_file, KNOWLEDGE_BASE_FILE)
         logger.info(f"Knowledge base saved to '{KNOWLEDGE_BASE_FILE}' with {len(data)} entries.")
     except IOError as e:
         logger.error(f"Error saving knowledge base file to '{KNOWLEDGE_BASE_FILE}': {e}")
     except Exception as e:
         logger.error(f"Unexpected error saving knowledge base to '{KNOWLEDGE_BASE_FILE}': {e}")
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+
+def get_tramite(url):
+    """Returns the knowledge base entry for `url`, or None."""
+    if KB_BACKEND == "sqlite":
+        return get_kb_store().get(url)
+    for entry in _load_knowledge_base_json():
+        if entry.get('url') == url:
+            return entry
+    return None
+
+
+def upsert_tramites(entries):
+    """Inserts or updates several entries ({'url': ..., 'data': ...}) in one transaction."""
+    entries = [entry for entry in entries if entry.get('url')]
+    if not entries:
+        return
+    if KB_BACKEND == "sqlite":
+        get_kb_store().upsert_many(entries)
+        logger.info(f"Upserted {len(entries)} entries into '{KB_SQLITE_FILE}'.")
+        return
+    kb = _load_knowledge_base_json()
+    index = {entry.get('url'): i for i, entry in enumerate(kb)}
+    for entry in entries:
+        if entry['url'] in index:
+            kb[index[entry['url']]].update(entry)
+        else:
+            index[entry['url']] = len(kb)
+            kb.append(entry)
+    _save_knowledge_base_json(kb)
+
+
+def upsert_tramite(url, data):
+    upsert_tramites([{'url': url, 'data': data}])
 
 def load_tramites_urls():
     if os.path.exists(TRAMITES_URLS_FILE):
@@ -49,5 +163,12 @@ def load_tramites_urls():
     return {}
 
 def get_all_urls_to_scrape():
+    """
+    Returns the tramite URLs to scrape. tramites_urls.json is a plain list of
+    URLs (as written by the crawler); the older {key: {"url": ...}} format is
+    still accepted.
+    """
     urls_data = load_tramites_urls()
-    return [info["url"] for info in urls_data.values()]
+    if isinstance(urls_data, dict):
+        urls_data = urls_data.values()
+    return [info["url"] if isinstance(info, dict) else info for info in urls_data]
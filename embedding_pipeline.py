@@ -0,0 +1,97 @@
+import time
+import logging
+import numpy as np
+
+from config import EMBEDDING_BATCH_SIZE, QUERY_EMBEDDING_CACHE_SIZE, QUERY_EMBEDDING_CACHE_TTL
+from lru_cache import LRUCache
+from text_utils import normalizar_texto
+
+logger = logging.getLogger(__name__)
+
+# Última ejecución de cada indexador, para logs y métricas.
+estadisticas = {}
+
+cache_consultas = LRUCache(QUERY_EMBEDDING_CACHE_SIZE, QUERY_EMBEDDING_CACHE_TTL)
+
+
+def codificar_textos(modelo, textos, batch_size=EMBEDDING_BATCH_SIZE, normalizar=True, nombre="embeddings"):
+    """
+    Codifica `textos` con `modelo` (SentenceTransformer) y devuelve una matriz
+    float32 con una fila por texto, en el orden original.
+
+    Los textos se ordenan por longitud y se agrupan en lotes de `batch_size`,
+    de modo que cada lote contiene textos de largo parecido y se rellena lo
+    mínimo posible.
+    """
+    textos = list(textos)
+    n = len(textos)
+    if n == 0:
+        return np.zeros((0, modelo.get_sentence_embedding_dimension() or 0), dtype=np.float32)
+
+    batch_size = max(1, int(batch_size))
+    # Los más largos primero: si un lote no entra en memoria falla al principio.
+    orden = sorted(range(n), key=lambda i: len(textos[i]), reverse=True)
+
+    resultado = None
+    inicio = time.perf_counter()
+    for desde in range(0, n, batch_size):
+        indices = orden[desde:desde + batch_size]
+        lote = modelo.encode(
+            [textos[i] for i in indices],
+            batch_size=len(indices),
+            convert_to_numpy=True,
+            normalize_embeddings=normalizar,
+            show_progress_bar=False,
+        )
+        if resultado is None:
+            resultado = np.empty((n, lote.shape[1]), dtype=np.float32)
+        resultado[indices] = lote
+
+    segundos = max(time.perf_counter() - inicio, 1e-9)
+    estadisticas[nombre] = {
+        "documentos": n,
+        "segundos": round(segundos, 3),
+        "docs_por_segundo": round(n / segundos, 1),
+        "batch_size": batch_size,
+    }
+    logger.info(f"{nombre}: {n} textos codificados en {segundos:.2f}s ({n / segundos:.1f} docs/s, batch={batch_size}).")
+    return resultado
+
+
+def codificar_consulta(modelo, texto):
+    """
+    Embedding (float32, sin normalizar) de una consulta de usuario.
+    Las consultas repetidas se sirven desde un LRU indexado por el texto
+    normalizado (sin acentos, minúsculas y espacios simples).
+    """
+    clave = normalizar_texto(texto)
+    emb = cache_consultas.get(clave)
+    if emb is None:
+        emb = np.asarray(modelo.encode(texto, convert_to_numpy=True), dtype=np.float32)
+        emb.setflags(write=False)
+        cache_consultas.put(clave, emb)
+    return emb
+
+
+def codificar_consultas(modelo, textos):
+    """
+    Versión por lotes de `codificar_consulta`: devuelve una matriz float32 con
+    una fila por texto. Las consultas que no están en el LRU se codifican
+    juntas en una sola llamada al modelo.
+    """
+    textos = list(textos)
+    claves = [normalizar_texto(texto) for texto in textos]
+    embeddings = [cache_consultas.get(clave) for clave in claves]
+
+    faltantes = [i for i, emb in enumerate(embeddings) if emb is None]
+    if faltantes:
+        nuevos = np.asarray(modelo.encode([textos[i] for i in faltantes], convert_to_numpy=True), dtype=np.float32)
+        for i, emb in zip(faltantes, nuevos):
+            emb = emb.copy()
+            emb.setflags(write=False)
+            cache_consultas.put(claves[i], emb)
+            embeddings[i] = emb
+
+    if not embeddings:
+        return np.zeros((0, modelo.get_sentence_embedding_dimension() or 0), dtype=np.float32)
+    return np.vstack(embeddings)
@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import numpy as np
+
+from config import (
+    EMBEDDING_MODEL_NAME,
+    EMBEDDINGS_FILE,
+    EMBEDDINGS_MATRIX_FILE,
+    EMBEDDINGS_MANIFEST_FILE,
+)
+from vector_index import normalizar_filas
+
+logger = logging.getLogger(__name__)
+
+FORMATO_VERSION = 1
+
+
+def hash_contenido(texto, modelo=EMBEDDING_MODEL_NAME):
+    """Clave de contenido de un embedding: depende del texto y del modelo que lo generó."""
+    return hashlib.sha256(f"{modelo}\n{texto}".encode("utf-8")).hexdigest()
+
+
+def _reemplazo_atomico(path, escribir):
+    """Escribe en un archivo temporal y lo renombra sobre `path`.
+    Los procesos que ya tienen mapeado el archivo anterior siguen leyendo su copia."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    try:
+        escribir(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def guardar_embeddings(matriz, filas, modelo=EMBEDDING_MODEL_NAME,
+                       matrix_path=EMBEDDINGS_MATRIX_FILE, manifest_path=EMBEDDINGS_MANIFEST_FILE):
+    """
+    Guarda los embeddings como matriz float32 normalizada (.npy) y un manifiesto
+    JSON con una fila {url, titulo, ...} por cada fila de la matriz.
+    """
+    matriz = normalizar_filas(matriz) if len(filas) else np.zeros((0, 0), dtype=np.float32)
+    if matriz.shape[0] != len(filas):
+        raise ValueError(f"La matriz tiene {matriz.shape[0]} filas pero el manifiesto {len(filas)}.")
+
+    manifiesto = {
+        "version": FORMATO_VERSION,
+        "modelo": modelo,
+        "dimension": int(matriz.shape[1]),
+        "filas_total": len(filas),
+        "normalizado": True,
+        "sha256_matriz": _hash_matriz(matriz),
+        "filas": filas,
+    }
+
+    def escribir_matriz(tmp_path):
+        with open(tmp_path, "wb") as f:
+            np.save(f, matriz)
+
+    def escribir_manifiesto(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifiesto, f, ensure_ascii=False, indent=1)
+
+    # La matriz primero: un lector que ve el manifiesto nuevo siempre encuentra sus filas. Uno
+    # que leyó el manifiesto anterior justo antes puede abrir la matriz nueva; cargar_embeddings
+    # lo detecta con sha256_matriz y vuelve a leer los dos archivos.
+    _reemplazo_atomico(matrix_path, escribir_matriz)
+    _reemplazo_atomico(manifest_path, escribir_manifiesto)
+    logger.info(f"Embeddings guardados en '{matrix_path}' ({matriz.shape[0]}x{matriz.shape[1]}, {modelo}).")
+
+
+def _hash_matriz(matriz):
+    return hashlib.sha256(np.ascontiguousarray(matriz, dtype=np.float32)).hexdigest()
+
+
+def firma_filas(filas):
+    """Huella de las filas del manifiesto (URL + hash), para saber si un índice derivado quedó viejo."""
+    h = hashlib.sha256()
+    for fila in filas:
+        h.update(f"{fila.get('url')}\t{fila.get('hash')}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def existe_store(matrix_path=EMBEDDINGS_MATRIX_FILE, manifest_path=EMBEDDINGS_MANIFEST_FILE):
+    return os.path.exists(matrix_path) and os.path.exists(manifest_path)
+
+
+def cargar_manifiesto(manifest_path=EMBEDDINGS_MANIFEST_FILE):
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _verificar_store(matriz, manifiesto, matrix_path, manifest_path):
+    filas = manifiesto.get("filas", [])
+    if matriz.shape[0] != len(filas):
+        raise ValueError(
+            f"Store de embeddings inconsistente: {matriz.shape[0]} filas en '{matrix_path}' "
+            f"y {len(filas)} en '{manifest_path}'."
+        )
+    if len(filas) and matriz.shape[1] != manifiesto.get("dimension"):
+        raise ValueError(
+            f"Dimensión {matriz.shape[1]} distinta a la del manifiesto ({manifiesto.get('dimension')})."
+        )
+    # Los manifiestos anteriores a sha256_matriz sólo se verifican por forma.
+    if manifiesto.get("sha256_matriz") not in (None, _hash_matriz(matriz)):
+        raise ValueError(f"'{matrix_path}' no es la matriz que describe '{manifest_path}'.")
+
+
+def cargar_embeddings(matrix_path=EMBEDDINGS_MATRIX_FILE, manifest_path=EMBEDDINGS_MANIFEST_FILE, mmap=True,
+                      reintentos=1):
+    """
+    Devuelve (matriz, manifiesto). Con `mmap=True` la matriz se abre en modo
+    solo lectura con np.load(mmap_mode="r"), de modo que varios workers
+    comparten las mismas páginas del archivo.
+
+    Si otro proceso guarda el store entre la lectura del manifiesto y la de
+    la matriz, no coinciden: se vuelven a leer hasta `reintentos` veces antes
+    de levantar ValueError.
+    """
+    for intento in range(reintentos + 1):
+        manifiesto = cargar_manifiesto(manifest_path)
+        matriz = np.load(matrix_path, mmap_mode="r" if mmap else None)
+        try:
+            _verificar_store(matriz, manifiesto, matrix_path, manifest_path)
+            return matriz, manifiesto
+        except ValueError as e:
+            if intento == reintentos:
+                raise
+            logger.info(f"{e} Se vuelve a leer (el store se estaba guardando).")
+            time.sleep(0.05)
+
+
+def convertir_desde_json(json_path=EMBEDDINGS_FILE, modelo=EMBEDDING_MODEL_NAME,
+                         matrix_path=EMBEDDINGS_MATRIX_FILE, manifest_path=EMBEDDINGS_MANIFEST_FILE):
+    """Convierte el antiguo tramites_embeddings.json al formato binario."""
+    with open(json_path, "r", encoding="utf-8") as f:
+        base_emb = json.load(f)
+
+    filas = []
+    vectores = []
+    for tramite in base_emb:
+        if tramite.get("url") is None or not tramite.get("embedding"):
+            logger.warning(f"Embedding sin URL o vector válido omitido: {tramite.get('titulo')}")
+            continue
+        filas.append({"url": tramite["url"], "titulo": tramite.get("titulo")})
+        vectores.append(tramite["embedding"])
+
+    matriz = np.array(vectores, dtype=np.float32)
+    guardar_embeddings(matriz, filas, modelo, matrix_path, manifest_path)
+    print(f"*** Convertidos {len(filas)} embeddings de '{json_path}' a '{matrix_path}'.")
+    return len(filas)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    convertir_desde_json()
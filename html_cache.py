@@ -0,0 +1,85 @@
+"""
+Cache local del HTML crudo de los trámites, direccionado por contenido.
+
+    data/html_cache/objects/ab/abcdef....html.gz   cuerpo comprimido, nombre = sha256 del cuerpo
+    data/html_cache/index.jsonl                    una línea por descarga: url, fecha, hash, encoding
+
+Un mismo cuerpo descargado varias veces se guarda una sola vez.
+"""
+import os
+import gzip
+import json
+import hashlib
+import logging
+import threading
+from datetime import datetime
+
+from config import HTML_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+_lock_indice = threading.Lock()
+
+
+def _ruta_objeto(hash_contenido, directorio=HTML_CACHE_DIR):
+    return os.path.join(directorio, "objects", hash_contenido[:2], f"{hash_contenido}.html.gz")
+
+
+def _ruta_indice(directorio=HTML_CACHE_DIR):
+    return os.path.join(directorio, "index.jsonl")
+
+
+def guardar_html(url, contenido, encoding=None, hash_contenido=None, fecha=None, directorio=HTML_CACHE_DIR):
+    """Guarda el cuerpo (bytes) de una descarga de `url` y la registra en el índice. Devuelve el hash."""
+    hash_contenido = hash_contenido or hashlib.sha256(contenido).hexdigest()
+    ruta = _ruta_objeto(hash_contenido, directorio)
+    if not os.path.exists(ruta):
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        tmp_ruta = f"{ruta}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with gzip.open(tmp_ruta, "wb", compresslevel=6) as f:
+            f.write(contenido)
+        os.replace(tmp_ruta, ruta)
+
+    linea = json.dumps({
+        "url": url,
+        "fecha": fecha or datetime.now().isoformat(),
+        "hash": hash_contenido,
+        "encoding": encoding,
+    }, ensure_ascii=False)
+    with _lock_indice:
+        with open(_ruta_indice(directorio), "a", encoding="utf-8") as f:
+            f.write(linea + "\n")
+    return hash_contenido
+
+
+def leer_html(hash_contenido, encoding=None, directorio=HTML_CACHE_DIR):
+    """Devuelve el HTML guardado con ese hash como texto."""
+    with gzip.open(_ruta_objeto(hash_contenido, directorio), "rb") as f:
+        contenido = f.read()
+    return contenido.decode(encoding or "utf-8", errors="replace")
+
+
+def descargas(directorio=HTML_CACHE_DIR):
+    """Itera las entradas del índice en orden de descarga."""
+    ruta = _ruta_indice(directorio)
+    if not os.path.exists(ruta):
+        return
+    with open(ruta, "r", encoding="utf-8") as f:
+        for linea in f:
+            if linea.strip():
+                yield json.loads(linea)
+
+
+def ultimas_versiones(directorio=HTML_CACHE_DIR):
+    """{url: entrada del índice} con la descarga más reciente de cada URL."""
+    ultimas = {}
+    for entrada in descargas(directorio):
+        previa = ultimas.get(entrada["url"])
+        if previa is None or entrada["fecha"] >= previa["fecha"]:
+            ultimas[entrada["url"]] = entrada
+    return ultimas
+
+
+def ultimo_html(url, directorio=HTML_CACHE_DIR):
+    entrada = ultimas_versiones(directorio).get(url)
+    return leer_html(entrada["hash"], entrada.get("encoding"), directorio) if entrada else None
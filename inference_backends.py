@@ -0,0 +1,129 @@
+import os
+import logging
+import importlib.util
+
+from config import EMBEDDING_MODEL_NAME, TOXICITY_MODEL_NAME, ONNX_MODELS_DIR
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "int8", "onnx")
+
+# Paquetes opcionales de cada backend (módulo, requisito de pip); ver requirements-onnx.txt.
+DEPENDENCIAS = {
+    "onnx": [("onnxruntime", "onnxruntime"), ("optimum.onnxruntime", "optimum[onnxruntime]")],
+}
+
+
+def _instalado(modulo):
+    try:
+        return importlib.util.find_spec(modulo) is not None
+    except ModuleNotFoundError:
+        return False
+
+
+def verificar_backend(backend):
+    """
+    Falla enseguida si `backend` no existe o le faltan dependencias, en lugar
+    de dejar que el registro de modelos anote el error y devuelva None.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de inferencia desconocido: '{backend}'. Opciones: {', '.join(BACKENDS)}")
+    faltantes = [requisito for modulo, requisito in DEPENDENCIAS.get(backend, []) if not _instalado(modulo)]
+    if faltantes:
+        raise RuntimeError(
+            f"INFERENCE_BACKEND='{backend}' necesita {', '.join(faltantes)}. "
+            f"Instalalo con: pip install -r requirements-onnx.txt"
+        )
+
+
+def _cuantizar_int8(modelo):
+    """Cuantización dinámica int8 de las capas Linear (pesos int8, activaciones fp32)."""
+    import torch
+    return torch.quantization.quantize_dynamic(modelo, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def cargar_modelo_embedding(backend="torch"):
+    """SentenceTransformer con el backend pedido; la API de encode() no cambia."""
+    from sentence_transformers import SentenceTransformer
+    verificar_backend(backend)
+
+    if backend == "onnx":
+        # sentence-transformers exporta el grafo ONNX la primera vez y lo corre con onnxruntime.
+        return SentenceTransformer(EMBEDDING_MODEL_NAME, device="cpu", backend="onnx")
+
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME, device="cpu" if backend == "int8" else None)
+    if backend == "int8":
+        model = _cuantizar_int8(model)
+    return model
+
+
+class _SalidaClasificacion:
+    def __init__(self, logits):
+        self.logits = logits
+
+
+class ModeloOnnxClasificacion:
+    """
+    Envuelve una sesión de onnxruntime con la misma interfaz que usamos del
+    modelo de transformers: model(**inputs).logits como tensor de torch.
+    """
+
+    def __init__(self, onnx_path):
+        import onnxruntime as ort
+        opciones = ort.SessionOptions()
+        opciones.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(onnx_path, opciones, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def eval(self):
+        return self
+
+    def __call__(self, **inputs):
+        import torch
+        feeds = {
+            nombre: inputs[nombre].cpu().numpy() if hasattr(inputs[nombre], "cpu") else inputs[nombre]
+            for nombre in self.input_names if nombre in inputs
+        }
+        logits = self.session.run(None, feeds)[0]
+        return _SalidaClasificacion(torch.from_numpy(logits))
+
+
+def _exportar_toxicidad_onnx(tokenizer, model, onnx_path):
+    import torch
+    os.makedirs(os.path.dirname(onnx_path), exist_ok=True)
+    ejemplo = tokenizer(["texto de ejemplo"], return_tensors="pt")
+    nombres = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in ejemplo]
+    ejes = {n: {0: "batch", 1: "secuencia"} for n in nombres}
+    ejes["logits"] = {0: "batch"}
+    model.eval()
+    torch.onnx.export(
+        model,
+        tuple(ejemplo[n] for n in nombres),
+        onnx_path,
+        input_names=nombres,
+        output_names=["logits"],
+        dynamic_axes=ejes,
+        opset_version=17,
+    )
+    logger.info(f"Modelo de toxicidad exportado a ONNX en '{onnx_path}'.")
+
+
+def cargar_modelo_toxicidad(backend="torch"):
+    """Devuelve (tokenizer, model) con el backend pedido."""
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+    verificar_backend(backend)
+
+    tokenizer = AutoTokenizer.from_pretrained(TOXICITY_MODEL_NAME)
+
+    if backend == "onnx":
+        onnx_path = os.path.join(ONNX_MODELS_DIR, TOXICITY_MODEL_NAME.replace("/", "__"), "model.onnx")
+        if not os.path.exists(onnx_path):
+            fp32 = AutoModelForSequenceClassification.from_pretrained(TOXICITY_MODEL_NAME)
+            _exportar_toxicidad_onnx(tokenizer, fp32, onnx_path)
+        return tokenizer, ModeloOnnxClasificacion(onnx_path)
+
+    model = AutoModelForSequenceClassification.from_pretrained(TOXICITY_MODEL_NAME)
+    model.eval()
+    if backend == "int8":
+        model = _cuantizar_int8(model)
+    return tokenizer, model
@@ -0,0 +1,185 @@
+"""
+Base de conocimiento en SQLite, con la URL como clave primaria.
+
+Exportar / importar el formato JSON de siempre:
+    python kb_store.py exportar [data/tramites_knowledge_base.json]
+    python kb_store.py importar [data/tramites_knowledge_base.json]
+
+`importar` reemplaza la base entera por el JSON. Al arrancar, la app además
+hace upsert del JSON si su hash cambió desde la última importación (ver
+data_manager.get_kb_store), así que editar el JSON alcanza para actualizar
+las entradas que contiene.
+"""
+import os
+import sys
+import json
+import hashlib
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from config import KB_SQLITE_FILE, KNOWLEDGE_BASE_FILE
+
+logger = logging.getLogger(__name__)
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS tramites (
+    url TEXT PRIMARY KEY,
+    posicion INTEGER NOT NULL,
+    entrada TEXT NOT NULL,
+    actualizado TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tramites_posicion ON tramites (posicion);
+CREATE TABLE IF NOT EXISTS meta (
+    clave TEXT PRIMARY KEY,
+    valor TEXT NOT NULL
+);
+"""
+
+# Hash del JSON importado por última vez (o exportado: ya coincide con la base).
+META_HASH_JSON = "json_sha256"
+
+_UPSERT = """
+INSERT INTO tramites (url, posicion, entrada, actualizado)
+VALUES (?, (SELECT COALESCE(MAX(posicion), 0) + 1 FROM tramites), ?, ?)
+ON CONFLICT(url) DO UPDATE SET entrada = excluded.entrada, actualizado = excluded.actualizado
+"""
+
+
+def hash_archivo(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+class KnowledgeBaseStore:
+    """
+    Cada entrada de la base ({'url': ..., 'data': {...}, ...}) es una fila
+    indexada por URL. Usa WAL para que la app pueda leer mientras el scraper
+    escribe, y una conexión por thread.
+    """
+
+    def __init__(self, path=KB_SQLITE_FILE):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conexion().executescript(_ESQUEMA)
+
+    def _conexion(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Transacción atómica: todo o nada, visible para los lectores al hacer commit."""
+        conn = self._conexion()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def get(self, url):
+        fila = self._conexion().execute("SELECT entrada FROM tramites WHERE url = ?", (url,)).fetchone()
+        return json.loads(fila[0]) if fila else None
+
+    def contains(self, url):
+        return self._conexion().execute("SELECT 1 FROM tramites WHERE url = ?", (url,)).fetchone() is not None
+
+    def upsert(self, entry):
+        self.upsert_many([entry])
+
+    def upsert_many(self, entries):
+        """Inserta o actualiza entradas; en las existentes sólo se reemplazan las claves recibidas."""
+        ahora = datetime.now().isoformat()
+        with self.transaction() as conn:
+            for entry in entries:
+                fila = conn.execute("SELECT entrada FROM tramites WHERE url = ?", (entry["url"],)).fetchone()
+                combinada = {**json.loads(fila[0]), **entry} if fila else entry
+                conn.execute(_UPSERT, (entry["url"], json.dumps(combinada, ensure_ascii=False), ahora))
+
+    def delete(self, url):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM tramites WHERE url = ?", (url,))
+
+    def all(self):
+        filas = self._conexion().execute("SELECT entrada FROM tramites ORDER BY posicion").fetchall()
+        return [json.loads(fila[0]) for fila in filas]
+
+    def urls(self):
+        return [fila[0] for fila in self._conexion().execute("SELECT url FROM tramites ORDER BY posicion")]
+
+    def count(self):
+        return self._conexion().execute("SELECT COUNT(*) FROM tramites").fetchone()[0]
+
+    def get_meta(self, clave):
+        fila = self._conexion().execute("SELECT valor FROM meta WHERE clave = ?", (clave,)).fetchone()
+        return fila[0] if fila else None
+
+    def set_meta(self, clave, valor):
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO meta (clave, valor) VALUES (?, ?) ON CONFLICT(clave) DO UPDATE SET valor = excluded.valor",
+                (clave, valor),
+            )
+
+    def replace_all(self, entries):
+        """Reemplaza toda la base por `entries` (en ese orden) en una sola transacción."""
+        ahora = datetime.now().isoformat()
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM tramites")
+            conn.executemany(
+                "INSERT OR REPLACE INTO tramites (url, posicion, entrada, actualizado) VALUES (?, ?, ?, ?)",
+                [
+                    (entry["url"], posicion, json.dumps(entry, ensure_ascii=False), ahora)
+                    for posicion, entry in enumerate(entries, 1)
+                    if entry.get("url")
+                ],
+            )
+
+    def import_json(self, path=KNOWLEDGE_BASE_FILE):
+        with open(path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        with self.transaction():
+            self.replace_all(entries)
+            self.set_meta(META_HASH_JSON, hash_archivo(path))
+        logger.info(f"Imported {len(entries)} entries from '{path}' into '{self.path}'.")
+        return len(entries)
+
+    def export_json(self, path=KNOWLEDGE_BASE_FILE):
+        entries = self.all()
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, path)
+        self.set_meta(META_HASH_JSON, hash_archivo(path))
+        logger.info(f"Exported {len(entries)} entries from '{self.path}' to '{path}'.")
+        return len(entries)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] not in ("exportar", "importar"):
+        print(__doc__)
+        sys.exit(1)
+    destino = sys.argv[2] if len(sys.argv) > 2 else KNOWLEDGE_BASE_FILE
+    store = KnowledgeBaseStore()
+    if sys.argv[1] == "exportar":
+        print(f"*** {store.export_json(destino)} entradas exportadas a '{destino}'.")
+    else:
+        print(f"*** {store.import_json(destino)} entradas importadas desde '{destino}'.")
@@ -0,0 +1,196 @@
+"""
+Cliente HTTP para la API de chat completions de OpenRouter (o cualquier
+servidor compatible con /chat/completions, ver OPENROUTER_BASE_URL).
+
+- Una sola requests.Session con pool de conexiones keep-alive.
+- Un semáforo acota las llamadas en vuelo; si no hay lugar en
+  LLM_QUEUE_TIMEOUT segundos la llamada falla enseguida (LLMSaturado).
+- Las llamadas corren en un ThreadPoolExecutor propio y cada una tiene un
+  deadline total (no sólo un timeout de lectura): al vencer, quien espera
+  recibe LLMTimeout y el worker del servidor queda libre.
+- `stream` devuelve los tokens a medida que llegan, para /api/chat/stream.
+"""
+import json
+import time
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+
+from config import (
+    OPENROUTER_API_KEY, OPENROUTER_BASE_URL, LLM_MAX_CONCURRENCY, LLM_QUEUE_TIMEOUT,
+    LLM_CONNECT_TIMEOUT, LLM_DEADLINE_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class LLMError(Exception):
+    pass
+
+
+class LLMTimeout(LLMError):
+    pass
+
+
+class LLMSaturado(LLMError):
+    pass
+
+
+class ClienteLLM:
+    def __init__(self, base_url=OPENROUTER_BASE_URL, api_key=OPENROUTER_API_KEY,
+                 max_concurrencia=LLM_MAX_CONCURRENCY, espera_lugar=LLM_QUEUE_TIMEOUT,
+                 timeout_conexion=LLM_CONNECT_TIMEOUT, deadline=LLM_DEADLINE_SECONDS):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.espera_lugar = espera_lugar
+        self.timeout_conexion = timeout_conexion
+        self.deadline = deadline
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrencia, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._semaforo = threading.BoundedSemaphore(max_concurrencia)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrencia, thread_name_prefix="llm")
+        self._lock = threading.Lock()
+        self._stats = {
+            "llamadas": 0,
+            "en_vuelo": 0,
+            "ok": 0,
+            "errores": 0,
+            "timeouts": 0,
+            "saturado": 0,
+            "segundos_total": 0.0,
+        }
+
+    def _contar(self, clave, valor=1):
+        with self._lock:
+            self._stats[clave] += valor
+
+    def _headers(self):
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+
+    def _post(self, payload, vence, **kwargs):
+        restante = max(vence - time.monotonic(), 0.001)
+        return self.session.post(
+            f"{self.base_url}/chat/completions",
+            headers=self._headers(),
+            json=payload,
+            timeout=(min(self.timeout_conexion, restante), restante),
+            **kwargs,
+        )
+
+    def _completar(self, payload, vence):
+        inicio = time.perf_counter()
+        try:
+            response = self._post(payload, vence)
+            response.raise_for_status()
+            resultado = response.json()
+            self._contar("ok")
+            return resultado
+        except Exception:
+            self._contar("errores")
+            raise
+        finally:
+            self._contar("segundos_total", time.perf_counter() - inicio)
+
+    def _reservar_lugar(self):
+        if not self._semaforo.acquire(timeout=self.espera_lugar):
+            self._contar("saturado")
+            raise LLMSaturado(f"Hay demasiadas llamadas al LLM en curso (espera > {self.espera_lugar}s).")
+        self._contar("llamadas")
+        self._contar("en_vuelo")
+
+    def _liberar_lugar(self, _futuro=None):
+        self._contar("en_vuelo", -1)
+        self._semaforo.release()
+
+    def enviar(self, payload, deadline=None):
+        """
+        Envía la llamada al executor y devuelve (futuro, vence). El lugar en
+        el semáforo se libera cuando la llamada termina, aunque nadie espere
+        su resultado.
+        """
+        vence = time.monotonic() + (deadline or self.deadline)
+        self._reservar_lugar()
+        try:
+            futuro = self._executor.submit(self._completar, payload, vence)
+        except Exception:
+            self._liberar_lugar()
+            raise
+        futuro.add_done_callback(self._liberar_lugar)
+        return futuro, vence
+
+    def completar(self, payload, deadline=None):
+        """
+        Hace un POST a /chat/completions con `payload` y devuelve el JSON de
+        respuesta. Lanza LLMSaturado, LLMTimeout o las excepciones de requests.
+        """
+        futuro, vence = self.enviar(payload, deadline)
+        try:
+            return futuro.result(timeout=max(vence - time.monotonic(), 0))
+        except FuturesTimeoutError:
+            self._contar("timeouts")
+            futuro.cancel()
+            raise LLMTimeout(f"El LLM no respondió dentro del deadline ({deadline or self.deadline}s).")
+
+    def stream(self, payload, deadline=None):
+        """
+        Generador con los fragmentos de texto de una respuesta en streaming
+        (SSE de OpenAI/OpenRouter, `"stream": true`). Corre en el thread que lo
+        consume y ocupa un lugar del semáforo hasta terminar o cerrarse; el
+        deadline se aplica al total de la respuesta.
+        """
+        deadline = deadline or self.deadline
+        vence = time.monotonic() + deadline
+        self._reservar_lugar()
+        inicio = time.perf_counter()
+        response = None
+        try:
+            response = self._post({**payload, "stream": True}, vence, stream=True)
+            response.raise_for_status()
+            # chunk_size=None entrega cada chunk HTTP apenas llega (con 512 se acumulan varios tokens).
+            for linea in response.iter_lines(chunk_size=None):
+                if time.monotonic() > vence:
+                    self._contar("timeouts")
+                    raise LLMTimeout(f"El LLM no terminó de responder dentro del deadline ({deadline}s).")
+                # El SSE suele venir sin charset; se decodifica como UTF-8 y no con el default de requests.
+                linea = linea.decode("utf-8", errors="replace")
+                # Las líneas que empiezan con ':' son comentarios keep-alive de OpenRouter.
+                if not linea or not linea.startswith("data:"):
+                    continue
+                datos = linea[len("data:"):].strip()
+                if datos == "[DONE]":
+                    break
+                evento = json.loads(datos)
+                if evento.get("error"):
+                    raise LLMError(evento["error"].get("message", "Error en el streaming del LLM."))
+                for choice in evento.get("choices") or []:
+                    texto = (choice.get("delta") or {}).get("content")
+                    if texto:
+                        yield texto
+            self._contar("ok")
+        except Exception:
+            self._contar("errores")
+            raise
+        finally:
+            if response is not None:
+                response.close()
+            self._contar("segundos_total", time.perf_counter() - inicio)
+            self._liberar_lugar()
+
+    def estadisticas(self):
+        with self._lock:
+            stats = dict(self._stats)
+        terminadas = stats["ok"] + stats["errores"]
+        stats["latencia_media_s"] = round(stats.pop("segundos_total") / terminadas, 3) if terminadas else None
+        return stats
+
+
+cliente_llm = ClienteLLM()
@@ -0,0 +1,66 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Cache LRU acotado y seguro entre threads, con expiración opcional.
+    `ttl` en segundos; 0 o None desactiva la expiración.
+    """
+
+    def __init__(self, max_size=1024, ttl=None):
+        self.max_size = max(0, int(max_size))
+        self.ttl = ttl or None
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirados = 0
+        self.desalojados = 0
+
+    def get(self, clave, default=None):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                self.misses += 1
+                return default
+            valor, guardado = entrada
+            if self.ttl and time.monotonic() - guardado > self.ttl:
+                del self._datos[clave]
+                self.expirados += 1
+                self.misses += 1
+                return default
+            self._datos.move_to_end(clave)
+            self.hits += 1
+            return valor
+
+    def put(self, clave, valor):
+        if self.max_size == 0:
+            return
+        with self._lock:
+            self._datos[clave] = (valor, time.monotonic())
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_size:
+                self._datos.popitem(last=False)
+                self.desalojados += 1
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self):
+        return len(self._datos)
+
+    def estadisticas(self):
+        consultas = self.hits + self.misses
+        return {
+            "tamano": len(self._datos),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / consultas, 3) if consultas else 0.0,
+            "expirados": self.expirados,
+            "desalojados": self.desalojados,
+        }
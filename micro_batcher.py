@@ -0,0 +1,107 @@
+import os
+import time
+import queue
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Agrupa llamadas concurrentes en lotes. Un thread de fondo junta los pedidos
+    pendientes durante hasta `max_wait_ms` (o hasta `max_batch_size` pedidos),
+    llama una vez a `procesar_lote(items) -> resultados` y resuelve el Future
+    de cada llamador con su resultado.
+    """
+
+    def __init__(self, procesar_lote, max_batch_size=16, max_wait_ms=5, nombre="micro_batcher"):
+        self.procesar_lote = procesar_lote
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        self.nombre = nombre
+        self._lock = threading.Lock()
+        self._pid = None
+        self._cola = None
+        self._thread = None
+        self._lotes = 0
+        self._items = 0
+        self._tamano_max = 0
+        self._histograma = Counter()
+        self._segundos_procesando = 0.0
+
+    def _asegurar_worker(self):
+        # Los threads no sobreviven a un fork: cada proceso arranca su propio worker.
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            self._cola = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._loop, name=self.nombre, daemon=True)
+            self._thread.start()
+
+    def submit(self, item):
+        """Encola `item` y devuelve un Future con su resultado."""
+        self._asegurar_worker()
+        futuro = Future()
+        self._cola.put((item, futuro))
+        return futuro
+
+    def procesar(self, item, timeout=None):
+        """Encola `item` y espera su resultado (re-lanza la excepción del lote si falló)."""
+        return self.submit(item).result(timeout=timeout)
+
+    def _juntar_lote(self):
+        lote = [self._cola.get()]
+        limite = time.monotonic() + self.max_wait
+        while len(lote) < self.max_batch_size:
+            restante = limite - time.monotonic()
+            try:
+                lote.append(self._cola.get(timeout=restante) if restante > 0 else self._cola.get_nowait())
+            except queue.Empty:
+                break
+        return lote
+
+    def _loop(self):
+        while True:
+            lote = self._juntar_lote()
+            pendientes = [(item, futuro) for item, futuro in lote if futuro.set_running_or_notify_cancel()]
+            if not pendientes:
+                continue
+
+            inicio = time.perf_counter()
+            try:
+                resultados = self.procesar_lote([item for item, _ in pendientes])
+                if len(resultados) != len(pendientes):
+                    raise RuntimeError(f"{self.nombre}: se esperaban {len(pendientes)} resultados y llegaron {len(resultados)}")
+                for (_, futuro), resultado in zip(pendientes, resultados):
+                    futuro.set_result(resultado)
+            except Exception as e:
+                logger.error(f"Error procesando lote de {len(pendientes)} en {self.nombre}: {e}")
+                for _, futuro in pendientes:
+                    futuro.set_exception(e)
+
+            with self._lock:
+                self._lotes += 1
+                self._items += len(pendientes)
+                self._tamano_max = max(self._tamano_max, len(pendientes))
+                self._histograma[len(pendientes)] += 1
+                self._segundos_procesando += time.perf_counter() - inicio
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "profundidad_cola": self._cola.qsize() if self._cola is not None else 0,
+                "lotes": self._lotes,
+                "items": self._items,
+                "tamano_promedio": round(self._items / self._lotes, 2) if self._lotes else 0.0,
+                "tamano_max": self._tamano_max,
+                "histograma_tamanos": dict(sorted(self._histograma.items())),
+                "ms_promedio_lote": round(1000 * self._segundos_procesando / self._lotes, 2) if self._lotes else 0.0,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": round(self.max_wait * 1000, 2),
+            }
@@ -0,0 +1,125 @@
+import os
+import time
+import logging
+import threading
+
+from config import EMBEDDING_MODEL_NAME, TOXICITY_MODEL_NAME, INFERENCE_BACKEND
+from inference_backends import cargar_modelo_embedding, cargar_modelo_toxicidad, verificar_backend
+
+logger = logging.getLogger(__name__)
+
+MODELO_EMBEDDING = "embedding"
+MODELO_TOXICIDAD = "toxicity"
+
+
+def _rss_bytes():
+    """Memoria residente actual del proceso (0 si no se puede medir)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0
+
+
+def _bytes_parametros(instancia):
+    """Suma el tamaño de parámetros y buffers de los módulos torch contenidos en `instancia`."""
+    modulos = instancia if isinstance(instancia, (tuple, list)) else (instancia,)
+    total = 0
+    for modulo in modulos:
+        if hasattr(modulo, "parameters") and hasattr(modulo, "buffers"):
+            total += sum(p.numel() * p.element_size() for p in modulo.parameters())
+            total += sum(b.numel() * b.element_size() for b in modulo.buffers())
+    return total
+
+
+class ModelRegistry:
+    """
+    Registro central de modelos. Cada modelo se carga una sola vez por proceso,
+    la primera vez que se pide, y todos los módulos reciben la misma instancia.
+    """
+
+    def __init__(self):
+        self._cargadores = {}
+        self._modelos = {}
+        self._errores = {}
+        self._estadisticas = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, nombre, cargador, descripcion=None):
+        """Registra `cargador`, una función sin argumentos que devuelve el modelo."""
+        with self._lock:
+            self._cargadores[nombre] = (cargador, descripcion or nombre)
+            self._locks.setdefault(nombre, threading.Lock())
+
+    def obtener(self, nombre):
+        """
+        Devuelve la instancia compartida de `nombre`, cargándola si hace falta.
+        Si la carga falla devuelve None y no vuelve a intentarlo.
+        """
+        if nombre in self._modelos:
+            return self._modelos[nombre]
+        if nombre in self._errores:
+            return None
+        if nombre not in self._cargadores:
+            raise KeyError(f"Modelo no registrado: {nombre}")
+
+        with self._locks[nombre]:
+            if nombre in self._modelos:
+                return self._modelos[nombre]
+            if nombre in self._errores:
+                return None
+
+            cargador, descripcion = self._cargadores[nombre]
+            rss_antes = _rss_bytes()
+            inicio = time.perf_counter()
+            try:
+                instancia = cargador()
+            except Exception as e:
+                logger.error(f"Error loading model {descripcion}: {e}")
+                self._errores[nombre] = str(e)
+                return None
+
+            segundos = time.perf_counter() - inicio
+            self._estadisticas[nombre] = {
+                "modelo": descripcion,
+                "segundos_carga": round(segundos, 3),
+                "memoria_parametros_mb": round(_bytes_parametros(instancia) / 2**20, 1),
+                "rss_delta_mb": round(max(_rss_bytes() - rss_antes, 0) / 2**20, 1),
+            }
+            self._modelos[nombre] = instancia
+            logger.info(f"Loaded model {descripcion} in {segundos:.2f}s.")
+            return instancia
+
+    def preload(self, nombres=None):
+        """
+        Carga por adelantado los modelos indicados (todos por defecto).
+        Pensado para servidores que hacen fork de los workers después de cargar.
+        """
+        for nombre in nombres or list(self._cargadores):
+            self.obtener(nombre)
+
+    def estadisticas(self):
+        resultado = {}
+        for nombre, (_, descripcion) in self._cargadores.items():
+            if nombre in self._estadisticas:
+                resultado[nombre] = {"cargado": True, **self._estadisticas[nombre]}
+            else:
+                resultado[nombre] = {"cargado": False, "modelo": descripcion, "error": self._errores.get(nombre)}
+        return resultado
+
+
+# Un backend mal configurado corta el arranque: si no, la búsqueda devolvería [] y la toxicidad se saltearía.
+verificar_backend(INFERENCE_BACKEND)
+
+registry = ModelRegistry()
+registry.registrar(
+    MODELO_EMBEDDING,
+    lambda: cargar_modelo_embedding(INFERENCE_BACKEND),
+    f"{EMBEDDING_MODEL_NAME} [{INFERENCE_BACKEND}]",
+)
+registry.registrar(
+    MODELO_TOXICIDAD,
+    lambda: cargar_modelo_toxicidad(INFERENCE_BACKEND),
+    f"{TOXICITY_MODEL_NAME} [{INFERENCE_BACKEND}]",
+)
@@ -1,48 +1,162 @@
+import os
+import re
 import torch
 import logging
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
-from config import TOXICITY_MODEL_NAME, FORBIDDEN_WORDS, WHITELIST_WORDS, TOXICITY_THRESHOLD
+import threading
+from config import (
+    FORBIDDEN_WORDS, WHITELIST_WORDS, TOXICITY_THRESHOLD,
+    TOXICITY_BATCHING_ENABLED, TOXICITY_BATCH_MAX_SIZE, TOXICITY_BATCH_MAX_WAIT_MS,
+    TOXICITY_CASCADE_STAGES, TOXICITY_NGRAM_MODEL_FILE, TOXICITY_NGRAM_BENIGN_MAX,
+    TOXICITY_NGRAM_TOXIC_MIN, TOXICITY_SAFE_MAX_TOKENS, SAFE_GREETING_WORDS, SAFE_INTENT_WORDS,
+    SAFE_CONNECTOR_WORDS, SAFE_TRAMITE_WORDS, SAFE_EXCLUDED_WORDS,
+)
+from model_registry import registry, MODELO_TOXICIDAD
+from micro_batcher import MicroBatcher
+from text_utils import normalizar_texto
+from toxicity_cascade import CascadaToxicidad, ClasificadorNgramas, tokenizar
 
 logger = logging.getLogger(__name__)
 
-try:
-    tokenizer = AutoTokenizer.from_pretrained(TOXICITY_MODEL_NAME)
-    model = AutoModelForSequenceClassification.from_pretrained(TOXICITY_MODEL_NAME)
-    logger.info(f"Loaded toxicity model: {TOXICITY_MODEL_NAME}")
-except Exception as e:
-    logger.error(f"Error loading toxicity model {TOXICITY_MODEL_NAME}: {e}")
-    tokenizer = None
-    model = None
 
-def detectar_toxicidad(texto):
+def _patron_trie(trie):
+    """Convierte un trie {caracter: subtrie, '': True} en una expresión regular factorizada."""
+    terminal = "" in trie
+    ramas = [re.escape(c) + _patron_trie(sub) for c, sub in sorted(trie.items()) if c]
+    if not ramas:
+        return ""
+    patron = ramas[0] if len(ramas) == 1 and len(ramas[0]) == 1 else "(?:" + "|".join(ramas) + ")"
+    # Opcional y codicioso: ante "puta" y "puta madre" se prefiere la coincidencia más larga.
+    return f"(?:{patron})?" if terminal else patron
+
+
+def compilar_lista_palabras(palabras, inicio_de_palabra=False):
     """
-    Detects if a text is toxic using a pre-trained model and a list of forbidden words.
-    Incorporates a whitelist to override detection for specific terms.
+    Compila una lista de palabras/frases en una única regex con forma de trie
+    (prefijos compartidos), que recorre el texto una sola vez. Conserva la
+    semántica de subcadena del chequeo original con `in`; con
+    `inicio_de_palabra=True` la coincidencia tiene que empezar una palabra
+    ("puta" sigue encontrando "putas", pero ya no "disputa"). Las palabras se
+    normalizan igual que el texto (sin acentos ni mayúsculas, pero con ñ).
     """
-    if not texto:
-        return False, "Texto vacío"
+    trie = {}
+    for palabra in dict.fromkeys(normalizar_texto(p, conservar_enie=True) for p in palabras if p):
+        nodo = trie
+        for c in palabra:
+            nodo = nodo.setdefault(c, {})
+        nodo[""] = True
+    if not trie:
+        return re.compile(r"(?!x)x")
+    return re.compile((r"\b" if inicio_de_palabra else "") + _patron_trie(trie))
+
+
+PATRON_WHITELIST = compilar_lista_palabras(WHITELIST_WORDS)
+PATRON_PROHIBIDAS = compilar_lista_palabras(FORBIDDEN_WORDS, inicio_de_palabra=True)
+
+
+def puntuar_lote_toxicidad(textos):
+    """Probabilidad de la etiqueta 'toxic' para cada texto, en una sola pasada del modelo."""
+    tokenizer, model = registry.obtener(MODELO_TOXICIDAD)
+    with torch.inference_mode():
+        inputs = tokenizer(list(textos), return_tensors="pt", truncation=True, padding=True, max_length=512)
+        probs = torch.sigmoid(model(**inputs).logits)
+    return [probs[i, 0].item() for i in range(len(textos))]
+
 
-    texto_lower = texto.lower()
+batcher_toxicidad = MicroBatcher(
+    puntuar_lote_toxicidad,
+    max_batch_size=TOXICITY_BATCH_MAX_SIZE,
+    max_wait_ms=TOXICITY_BATCH_MAX_WAIT_MS,
+    nombre="toxicidad",
+)
 
-    for word in WHITELIST_WORDS:
-        if word in texto_lower:
-            return False, "Contiene palabra en la lista blanca"
+def _etapa_lexico(texto, normalizado):
+    """
+    Listas blanca y negra sobre el texto sin acentos ni mayúsculas. La ñ se
+    conserva: sin ella "coño" sería "cono" y coincidiría con "reconocimiento".
+    """
+    normalizado = normalizar_texto(texto, conservar_enie=True)
+    if PATRON_WHITELIST.search(normalizado):
+        return False, "Contiene palabra en la lista blanca"
+
+    coincidencia = PATRON_PROHIBIDAS.search(normalizado)
+    if coincidencia:
+        return True, f"Contiene palabra prohibida: '{coincidencia.group(0)}'"
+    return None
+
+
+def _palabras(lista):
+    return frozenset(t for palabra in lista for t in tokenizar(normalizar_texto(palabra)))
 
-    for word in FORBIDDEN_WORDS:
-        if word in texto_lower:
-            return True, f"Contiene palabra prohibida: '{word}'"
 
+# Las amenazas y las prohibidas de una sola palabra nunca cuentan como vocabulario seguro.
+_EXCLUIDAS = _palabras(SAFE_EXCLUDED_WORDS) | frozenset(
+    tokens[0] for tokens in (tokenizar(normalizar_texto(p)) for p in FORBIDDEN_WORDS) if len(tokens) == 1
+)
+SALUDOS = _palabras(SAFE_GREETING_WORDS) - _EXCLUIDAS
+INTENCION = _palabras(SAFE_INTENT_WORDS) - _EXCLUIDAS
+SUSTANTIVOS_TRAMITE = _palabras(SAFE_TRAMITE_WORDS) - _EXCLUIDAS
+VOCABULARIO_SEGURO = SALUDOS | INTENCION | SUSTANTIVOS_TRAMITE | (_palabras(SAFE_CONNECTOR_WORDS) - _EXCLUIDAS)
+
+
+def _etapa_frases_seguras(texto, normalizado):
+    """
+    Mensajes cortos escritos sólo con el vocabulario curado: saludos ("hola,
+    buenas tardes") o una pregunta o pedido sobre un trámite ("cómo saco el
+    certificado de antecedentes"). Cualquier otra palabra pasa a la etapa siguiente.
+    """
+    tokens = tokenizar(normalizado)
+    if not tokens or len(tokens) > TOXICITY_SAFE_MAX_TOKENS or not VOCABULARIO_SEGURO.issuperset(tokens):
+        return None
+    if SALUDOS.issuperset(tokens):
+        return False, "Saludo"
+    if INTENCION.intersection(tokens) and SUSTANTIVOS_TRAMITE.intersection(tokens):
+        return False, "Frase del dominio de trámites"
+    return None
+
+
+_clasificador_ngramas = None
+_clasificador_lock = threading.Lock()
+
+
+def _obtener_clasificador_ngramas():
+    global _clasificador_ngramas
+    if _clasificador_ngramas is None:
+        with _clasificador_lock:
+            if _clasificador_ngramas is None:
+                if os.path.exists(TOXICITY_NGRAM_MODEL_FILE):
+                    _clasificador_ngramas = ClasificadorNgramas.cargar(TOXICITY_NGRAM_MODEL_FILE)
+                    logger.info(f"Loaded n-gram toxicity classifier from {TOXICITY_NGRAM_MODEL_FILE}")
+                else:
+                    logger.info(f"N-gram toxicity classifier not found at {TOXICITY_NGRAM_MODEL_FILE}, stage disabled.")
+                    _clasificador_ngramas = False
+    return _clasificador_ngramas
+
+
+def _etapa_ngram(texto, normalizado):
+    clasificador = _obtener_clasificador_ngramas()
+    if not clasificador:
+        return None
+    prob = clasificador.predecir_proba(normalizado)
+    if prob <= TOXICITY_NGRAM_BENIGN_MAX:
+        return False, "No tóxico"
+    if prob >= TOXICITY_NGRAM_TOXIC_MIN:
+        return True, f"Detectado como tóxico por el clasificador de n-gramas (probabilidad: {prob:.2f})"
+    return None
+
+
+def _etapa_modelo(texto, normalizado):
+    tokenizer, model = registry.obtener(MODELO_TOXICIDAD) or (None, None)
     if tokenizer and model:
         try:
-            inputs = tokenizer(texto, return_tensors="pt", truncation=True, padding=True, max_length=512)
-            outputs = model(**inputs)
-            logits = outputs.logits
-            probs = torch.sigmoid(logits)
+            if TOXICITY_BATCHING_ENABLED:
+                prob_toxic = batcher_toxicidad.procesar(texto)
+            else:
+                prob_toxic = puntuar_lote_toxicidad([texto])[0]
 
-            is_toxic_by_model = probs[0, 0].item() > TOXICITY_THRESHOLD
+            is_toxic_by_model = prob_toxic > TOXICITY_THRESHOLD
 
             if is_toxic_by_model:
-                return True, f"Detectado como tóxico por el modelo (probabilidad de toxic: {probs[0, 0].item():.2f})"
+                return True, f"Detectado como tóxico por el modelo (probabilidad de toxic: {prob_toxic:.2f})"
 
         except Exception as e:
             logger.error(f"Error al ejecutar el modelo de toxicidad: {e}")
@@ -50,4 +164,33 @@ def detectar_toxicidad(texto):
     else:
         logger.warning("Toxicity model not loaded, skipping AI-based toxicity detection. Relying only on black/whitelist.")
 
-    return False, "No tóxico"
\ No newline at end of file
+    return False, "No tóxico"
+
+
+ETAPAS_TOXICIDAD = {
+    "lexico": _etapa_lexico,
+    "frases_seguras": _etapa_frases_seguras,
+    "ngram": _etapa_ngram,
+    "modelo": _etapa_modelo,
+}
+
+for _etapa in TOXICITY_CASCADE_STAGES:
+    if _etapa not in ETAPAS_TOXICIDAD:
+        logger.error(f"Etapa de toxicidad desconocida en TOXICITY_CASCADE_STAGES: '{_etapa}'")
+
+cascada_toxicidad = CascadaToxicidad(
+    (nombre, ETAPAS_TOXICIDAD[nombre]) for nombre in TOXICITY_CASCADE_STAGES if nombre in ETAPAS_TOXICIDAD
+)
+
+
+def detectar_toxicidad(texto):
+    """
+    Detects if a text is toxic by running the configured cascade of stages
+    (TOXICITY_CASCADE_STAGES): word lists, known-safe domain phrasing, a
+    char n-gram classifier and finally the transformer. The first confident
+    stage decides, so the model only runs on uncertain messages.
+    """
+    if not texto:
+        return False, "Texto vacío"
+
+    return cascada_toxicidad.evaluar(texto)
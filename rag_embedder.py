@@ -1,101 +1,279 @@
 # rag_embedder.py (asegúrate de que este archivo tenga estos cambios)
 
 import os
-import json
+import threading
 import numpy as np
-import torch
-from sentence_transformers import SentenceTransformer, util
 import logging
 
-from config import KNOWLEDGE_BASE_FILE, EMBEDDING_MODEL_NAME
+from config import (
+    EMBEDDING_MODEL_NAME, EMBEDDINGS_FILE, EMBEDDINGS_MATRIX_FILE, EMBEDDINGS_MANIFEST_FILE, EMBEDDINGS_ANN_FILE,
+    BM25_ENABLED, BM25_CONFIDENT_COVERAGE, BM25_CONFIDENT_MARGIN, BM25_MIN_SCORE, BM25_MIN_COVERAGE, RRF_K, HYBRID_CANDIDATES,
+)
+from data_manager import load_knowledge_base
+from embedding_store import (
+    guardar_embeddings, cargar_embeddings, existe_store, convertir_desde_json, hash_contenido, firma_filas,
+)
+from embedding_pipeline import codificar_textos, codificar_consulta
+from ann_index import crear_indice
+from bm25_index import IndiceBM25, tokenizar, fusion_rrf
+from model_registry import registry, MODELO_EMBEDDING
 
 logger = logging.getLogger(__name__)
 
-model = SentenceTransformer(EMBEDDING_MODEL_NAME)
 
-EMBEDDINGS_FILE = "data/tramites_embeddings.json"
+def obtener_modelo():
+    """Modelo de embeddings compartido a través del registro de modelos."""
+    model = registry.obtener(MODELO_EMBEDDING)
+    if model is None:
+        raise RuntimeError(f"Embedding model {EMBEDDING_MODEL_NAME} not available.")
+    return model
 
 SIMILARITY_THRESHOLD = 0.55
 
+def texto_para_embedding(tramite):
+    titulo = tramite.get('data', {}).get('titulo', '')
+    descripcion = tramite.get('data', {}).get('descripcion', '')
+    return f"{titulo}. {descripcion}"
+
+
+def _embeddings_existentes():
+    """Devuelve {url: (hash, vector)} del store actual, o {} si no hay uno válido."""
+    if not existe_store():
+        return {}
+    try:
+        matriz, manifiesto = cargar_embeddings()
+    except Exception as e:
+        logger.warning(f"No se pudo leer el store de embeddings, se regenera completo: {e}")
+        return {}
+    return {
+        fila["url"]: (fila.get("hash"), matriz[i])
+        for i, fila in enumerate(manifiesto["filas"])
+    }
+
+
 def crear_embeddings():
-    """Genera embeddings para todos los trámites y los guarda."""
-    with open(KNOWLEDGE_BASE_FILE, "r", encoding="utf-8") as f:
-        base = json.load(f)
+    """
+    Actualiza los embeddings de la base de conocimiento de forma incremental.
+    Cada fila queda identificada por el hash de su texto (título + descripción)
+    y del modelo: sólo se codifican los trámites nuevos o modificados y se
+    eliminan las URLs que ya no están en la base.
 
-    embeddings = []
+    Las llamadas se serializan con el lock del índice, porque el arranque y el
+    scraping en segundo plano pueden actualizar el store a la vez.
+    """
+    with _indice_lock:
+        _actualizar_embeddings()
+
+
+def _actualizar_embeddings():
+    base = load_knowledge_base()
+
+    existentes = _embeddings_existentes()
+
+    filas = []
+    vectores = []
+    pendientes = []
 
     for tramite in base:
+        url = tramite.get("url")
+        if not url:
+            continue
         titulo = tramite.get('data', {}).get('titulo', '')
-        descripcion = tramite.get('data', {}).get('descripcion', '')
-        
-        texto = f"{titulo}. {descripcion}" 
-        
-        emb = model.encode(texto, convert_to_numpy=True).tolist()
-        
-        embeddings.append({
-            "url": tramite["url"],
-            "titulo": titulo, 
-            "embedding": emb 
-        })
+        texto = texto_para_embedding(tramite)
+        clave = hash_contenido(texto, EMBEDDING_MODEL_NAME)
+
+        previo = existentes.get(url)
+        if previo and previo[0] == clave:
+            vectores.append(previo[1])
+        else:
+            vectores.append(None)
+            pendientes.append((len(filas), texto))
+        filas.append({"url": url, "titulo": titulo, "hash": clave})
 
-    with open(EMBEDDINGS_FILE, "w", encoding="utf-8") as f:
-        json.dump(embeddings, f, indent=2, ensure_ascii=False)
+    eliminados = len(set(existentes) - {fila["url"] for fila in filas})
+    sin_cambios = [fila["url"] for fila in filas] == list(existentes)
 
-    print(f"*** Embeddings generados para {len(embeddings)} trámites.")
+    if not pendientes and sin_cambios:
+        print(f"*** Embeddings al día para {len(filas)} trámites (sin cambios).")
+        return
+
+    if pendientes:
+        nuevos = codificar_textos(obtener_modelo(), [texto for _, texto in pendientes], nombre="crear_embeddings")
+        for (posicion, _), vector in zip(pendientes, nuevos):
+            vectores[posicion] = vector
+
+    matriz = np.array(vectores, dtype=np.float32)
+    guardar_embeddings(matriz, filas, EMBEDDING_MODEL_NAME)
+    # Deja entrenado el índice aproximado junto al store (no hace nada en bases chicas).
+    crear_indice(matriz, path=EMBEDDINGS_ANN_FILE, firma=firma_filas(filas))
+
+    print(
+        f"*** Embeddings actualizados para {len(filas)} trámites: "
+        f"{len(pendientes)} codificados, {len(filas) - len(pendientes)} reutilizados, {eliminados} eliminados."
+    )
+    invalidar_indice()
+
+
+class IndiceTramites:
+    """
+    Índice residente en memoria: matriz de embeddings normalizada,
+    índice léxico BM25 y un diccionario URL -> registro de la base de conocimiento.
+    """
+
+    def __init__(self, vectores, urls, titulos, registros_por_url, lexico=None):
+        self.vectores = vectores
+        self.urls = urls
+        self.titulos = titulos
+        self.registros_por_url = registros_por_url
+        self.lexico = lexico
+        self.urls_lexico = list(registros_por_url)
+
+    @classmethod
+    def cargar(cls):
+        matriz, manifiesto = cargar_embeddings()
+        if manifiesto.get("modelo") != EMBEDDING_MODEL_NAME:
+            logger.warning(
+                f"Los embeddings guardados fueron generados con '{manifiesto.get('modelo')}' "
+                f"y el modelo configurado es '{EMBEDDING_MODEL_NAME}'."
+            )
+        base = load_knowledge_base()
+
+        filas = manifiesto["filas"]
+        registros_por_url = {t.get("url"): t for t in base if t.get("url")}
+
+        logger.info(f"Índice de embeddings cargado: {len(filas)} trámites.")
+        return cls(
+            crear_indice(
+                matriz, normalizada=manifiesto.get("normalizado", False),
+                path=EMBEDDINGS_ANN_FILE, firma=firma_filas(filas),
+            ),
+            [fila["url"] for fila in filas],
+            [fila.get("titulo") for fila in filas],
+            registros_por_url,
+            IndiceBM25(list(registros_por_url.values())) if BM25_ENABLED else None,
+        )
+
+    def buscar(self, pregunta_emb, top_k=1, umbral=SIMILARITY_THRESHOLD):
+        """Devuelve una lista de (score, url) ordenada de mayor a menor."""
+        indices, scores = self.vectores.buscar(pregunta_emb, top_k=top_k, min_score=umbral)
+        return [(float(score), self.urls[i]) for i, score in zip(indices, scores)]
+
+    def buscar_lexico(self, pregunta, top_k=HYBRID_CANDIDATES):
+        """
+        Devuelve (resultados, confiable): resultados es una lista de
+        (score, url, cobertura) del índice BM25 y `confiable` indica si el
+        primero alcanza para responder sin calcular el embedding.
+        """
+        if self.lexico is None:
+            return [], False
+        terminos = tokenizar(pregunta)
+        indices, scores = self.lexico.buscar(pregunta, top_k=top_k)
+        resultados = [
+            (float(score), self.urls_lexico[i], self.lexico.cobertura(terminos, i))
+            for i, score in zip(indices, scores)
+        ]
+        if not resultados:
+            return resultados, False
+        mejor, _, cobertura = resultados[0]
+        segundo = resultados[1][0] if len(resultados) > 1 else 0.0
+        confiable = (
+            cobertura >= BM25_CONFIDENT_COVERAGE - 1e-6
+            and mejor >= BM25_MIN_SCORE
+            and mejor >= BM25_CONFIDENT_MARGIN * segundo
+        )
+        return resultados, confiable
+
+
+_indice = None
+_indice_version = None
+_indice_lock = threading.RLock()
+
+
+def _version_store():
+    """mtime del manifiesto: cambia cada vez que algún proceso guarda el store (se escribe último)."""
+    try:
+        return os.stat(EMBEDDINGS_MANIFEST_FILE).st_mtime_ns
+    except OSError:
+        return None
+
+
+def obtener_indice():
+    """
+    Carga el índice una vez por proceso y lo reutiliza en cada consulta. Si
+    otro proceso (el del scraping en segundo plano) guardó el store, se recarga.
+    """
+    global _indice, _indice_version
+    if _indice is not None and _indice_version != _version_store():
+        logger.info("El store de embeddings cambió en disco; se recarga el índice.")
+        invalidar_indice()
+    if _indice is None:
+        with _indice_lock:
+            if _indice is None:
+                if not existe_store():
+                    if os.path.exists(EMBEDDINGS_FILE):
+                        logger.info(f"Convirtiendo {EMBEDDINGS_FILE} al formato binario.")
+                        convertir_desde_json(EMBEDDINGS_FILE)
+                    else:
+                        logger.warning(f"Embeddings file not found: {EMBEDDINGS_MATRIX_FILE}. Creating embeddings now.")
+                        crear_embeddings()
+                _indice_version = _version_store()
+                _indice = IndiceTramites.cargar()
+    return _indice
+
+
+def invalidar_indice():
+    """Descarta el índice en memoria para que la próxima búsqueda lo recargue."""
+    global _indice
+    with _indice_lock:
+        _indice = None
+
+
+_estadisticas_lock = threading.Lock()
+estadisticas_busqueda = {"consultas": 0, "atajo_lexico": 0, "hibridas": 0}
+
+
+def _contar(clave):
+    with _estadisticas_lock:
+        estadisticas_busqueda[clave] += 1
 
 
 def buscar_tramite_por_embedding(pregunta, top_k=1):
+    """
+    Búsqueda híbrida: si el índice BM25 encuentra un trámite con todos los
+    términos de la pregunta, score mínimo y margen sobre el segundo, se
+    devuelve sin calcular el embedding. Si no, los resultados densos (sobre
+    el umbral de similitud) y los léxicos con cobertura suficiente se fusionan
+    por RRF. Sin ningún resultado denso no se fusiona nada y se devuelve []:
+    la pregunta queda para el LLM.
+    """
     logger.debug(f"Iniciando búsqueda RAG con pregunta: {pregunta}")
-    
+
     try:
-        if not os.path.exists(EMBEDDINGS_FILE):
-            logger.warning(f"Embeddings file not found: {EMBEDDINGS_FILE}. Creating embeddings now.")
-            crear_embeddings() 
-
-        with open(EMBEDDINGS_FILE, "r", encoding="utf-8") as f:
-            base_emb = json.load(f)
-        logger.debug(f"Cargados {len(base_emb)} embeddings")
-
-        with open(KNOWLEDGE_BASE_FILE, "r", encoding="utf-8") as f:
-            base = json.load(f)
-        logger.debug(f"Cargados {len(base)} trámites en base de conocimiento")
-
-        pregunta_emb = model.encode(pregunta, convert_to_numpy=True)
-        pregunta_emb = torch.tensor(pregunta_emb).float()
-        logger.debug("Embedding generado para la pregunta")
-
-        similitudes = []
-        for tramite in base_emb:
-            try:
-                emb_tramite = torch.tensor(tramite["embedding"]).float()
-                score = util.cos_sim(pregunta_emb, emb_tramite).item()
-                
-                logger.info(f"Similarity score for '{tramite.get('titulo')}' with query '{pregunta}': {score}")
-
-                if score >= SIMILARITY_THRESHOLD: 
-                    if tramite.get("url") is not None: 
-                        similitudes.append((score, tramite["url"]))
-                    else:
-                        logger.warning(f"Embedding encontrado sin URL válida: {tramite}")
-                else:
-                    logger.debug(f"Tramite '{tramite.get('titulo')}' excluido por baja similitud: {score}")
-
-            except Exception as e:
-                logger.error(f"Error procesando embedding: {e}")
-
-        similitudes.sort(reverse=True)
-        mejores = similitudes[:top_k]
-        logger.debug(f"Mejores similitudes encontradas: {mejores}")
-
-        resultados = []
-        mejores_urls = {url for score, url in mejores if score >= SIMILARITY_THRESHOLD} 
-        
-        for t in base:
-            try:
-                if t.get("url") in mejores_urls:
-                    resultados.append(t)
-            except Exception as e:
-                logger.error(f"Error procesando trámite de la base: {e}")
+        indice = obtener_indice()
+        _contar("consultas")
+
+        lexicos, confiable = indice.buscar_lexico(pregunta)
+        if confiable:
+            _contar("atajo_lexico")
+            urls = [url for _, url, _ in lexicos[:top_k]]
+            logger.debug(f"Atajo léxico (BM25): {lexicos[:top_k]}")
+        else:
+            pregunta_emb = codificar_consulta(obtener_modelo(), pregunta)
+            logger.debug("Embedding generado para la pregunta")
+
+            mejores = indice.buscar(pregunta_emb, top_k=max(top_k, HYBRID_CANDIDATES))
+            logger.debug(f"Mejores similitudes encontradas: {mejores[:top_k]}")
+
+            # Los léxicos sólo reordenan cuando algún resultado denso pasó el umbral;
+            # solos, palabras sueltas como "horario" o "turno" no alcanzan.
+            candidatos_lexicos = []
+            if mejores:
+                candidatos_lexicos = [url for _, url, cobertura in lexicos if cobertura >= BM25_MIN_COVERAGE]
+            if candidatos_lexicos:
+                _contar("hibridas")
+            urls = fusion_rrf([[url for _, url in mejores], candidatos_lexicos], RRF_K)[:top_k]
+
+        resultados = [indice.registros_por_url[url] for url in urls if url in indice.registros_por_url]
 
         if not resultados:
             logger.warning("No se encontraron datos válidos para las URLs relevantes (quizás por el umbral de similitud)")
@@ -103,4 +281,4 @@ def buscar_tramite_por_embedding(pregunta, top_k=1):
 
     except Exception as e:
         logger.error(f"Error en la búsqueda RAG: {e}")
-        return []
\ No newline at end of file
+        return []
@@ -1,143 +1,340 @@
+import os
 import logging
-import torch
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
-import json 
+import queue
+import threading
+from datetime import datetime
 
-from config import EMBEDDING_MODEL_NAME
-from data_manager import load_knowledge_base, get_all_urls_to_scrape
+from config import EMBEDDING_MODEL_NAME, BACKGROUND_SCRAPING_LOCK_FILE
+from data_manager import load_knowledge_base, get_all_urls_to_scrape, get_tramite
+from embedding_pipeline import codificar_textos, codificar_consultas
+from model_registry import registry, MODELO_EMBEDDING
+from rag_embedder import crear_embeddings, obtener_indice
+from vector_index import VectorIndex
+from ann_index import crear_indice
 
 logger = logging.getLogger(__name__)
 
+
+
+class KnowledgeBaseIndex:
+    """
+    RAG index: the normalized embedding matrix (an exact VectorIndex, or IVF
+    for large KBs; see ann_index.crear_indice) plus the parallel lists of
+    embedded texts and metadata. Instances are never modified in place;
+    merges build a new one and swap the module reference, so a retrieval
+    always sees a consistent matrix/metadata pair.
+    """
+
+    def __init__(self, vectors, texts, metadata):
+        self.vectors = vectors if hasattr(vectors, "buscar_lote") else crear_indice(vectors)
+        self.texts = texts
+        self.metadata = metadata
+
+    @classmethod
+    def empty(cls):
+        return cls(VectorIndex(np.zeros((0, 0), dtype=np.float32), normalizada=True), [], [])
+
+    def __len__(self):
+        return len(self.metadata)
+
+    def merge(self, other):
+        """Returns a new index with `other`'s entries added, replacing those with the same URL."""
+        if not len(self):
+            return other
+        urls = {metadata["url"] for metadata in other.metadata}
+        keep = [i for i, metadata in enumerate(self.metadata) if metadata["url"] not in urls]
+        matrix = np.vstack([self.vectors.matriz[keep], other.vectors.matriz]) if len(other) else self.vectors.matriz[keep]
+        return KnowledgeBaseIndex(
+            crear_indice(matrix, normalizada=True, base=self.vectors),
+            [self.texts[i] for i in keep] + other.texts,
+            [self.metadata[i] for i in keep] + other.metadata,
+        )
+
+
 embedding_model = None
-knowledge_base_embeddings = []
+knowledge_base_embeddings = KnowledgeBaseIndex.empty()
+_index_built = False
+_index_lock = threading.Lock()
+_build_lock = threading.Lock()
+_leader_lock_file = None
+
+_scrape_queue = queue.Queue()
+_scrape_thread = None
+_status_lock = threading.Lock()
+scraping_status = {
+    "state": "idle",
+    "queued": 0,
+    "processed": 0,
+    "ok": 0,
+    "errors": 0,
+    "merged": 0,
+    "started_at": None,
+    "finished_at": None,
+    "last_error": None,
+    "leader_pid": None,
+}
 
 def load_embedding_model():
-    """Loads the sentence embedding model."""
+    """Gets the shared sentence embedding model from the model registry."""
     global embedding_model
-    try:
+    if embedding_model is None:
+        embedding_model = registry.obtener(MODELO_EMBEDDING)
         if embedding_model is None:
-            embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
-            logger.info(f"Loaded embedding model: {EMBEDDING_MODEL_NAME}")
-    except Exception as e:
-        logger.error(f"Error loading embedding model {EMBEDDING_MODEL_NAME}: {e}")
-        embedding_model = None
+            logger.error(f"Error loading embedding model {EMBEDDING_MODEL_NAME}")
+
+def _text_for_entry(entry):
+    """Text used to embed a knowledge base entry: title, description and the main details."""
+    data = entry.get('data', {})
+
+    combined_text = f"{data.get('titulo', '')}. "
+    if data.get('descripcion'):
+        combined_text += f"{data['descripcion']} "
+    if data.get('requisitos'):
+        if isinstance(data['requisitos'], list):
+            combined_text += "Requisitos: " + " ".join(data['requisitos']) + " "
+        else:
+            combined_text += f"Requisitos: {data['requisitos']} "
+    if data.get('costo'):
+        if isinstance(data['costo'], list):
+            combined_text += "Costo: " + " ".join([f"{item['descripcion']} {item['valor']}" for item in data['costo']]) + " "
+        else:
+            combined_text += f"Costo: {data['costo']} "
+    if data.get('modalidad'):
+        combined_text += f"Modalidad: {data['modalidad']} "
+    if data.get('direccion'):
+        combined_text += f"Dirección: {data['direccion']} "
+    if data.get('opciones_ubicacion'):
+         for loc in data['opciones_ubicacion']:
+            combined_text += f"Ubicación: {loc.get('nombre', '')} en {loc.get('direccion', '')}. "
+    if data.get('formularios'):
+        form_names = ", ".join([f['nombre'] for f in data['formularios']])
+        combined_text += f"Formularios: {form_names}. "
+
+    return ' '.join(combined_text.split()).strip()
+
+
+def _embed_entries(entries, nombre="build_knowledge_base_embeddings"):
+    """Embeds knowledge base entries into a KnowledgeBaseIndex."""
+    texts_to_embed = []
+    metadata_list = []
+
+    for entry in entries:
+        combined_text = _text_for_entry(entry)
+        if combined_text:
+            texts_to_embed.append(combined_text)
+            metadata_list.append({
+                "categoria": entry.get('categoria', 'desconocido'),
+                "url": entry.get('url', ''),
+                "data": entry.get('data', {})
+            })
+
+    if not texts_to_embed:
+        return KnowledgeBaseIndex.empty()
+    embeddings = codificar_textos(embedding_model, texts_to_embed, nombre=nombre)
+    return KnowledgeBaseIndex(embeddings, texts_to_embed, metadata_list)
+
+
+def _merge_into_index(index):
+    """Adds or replaces (by URL) entries in the live index without blocking readers."""
+    global knowledge_base_embeddings
+    with _index_lock:
+        knowledge_base_embeddings = knowledge_base_embeddings.merge(index)
+
 
 def build_knowledge_base_embeddings():
     """
-    Loads scraped data from data_manager, ensures all primary URLs are scraped,
-    and then creates embeddings for search.
-    This should be called once at startup or when the knowledge base is updated.
+    Builds the RAG index from the current knowledge base. It is not built at
+    startup: retrieve_relevant_documents calls this the first time it runs
+    (see _ensure_index), and it can be called again after the knowledge
+    base is updated.
     """
-    global knowledge_base_embeddings
-    load_embedding_model() 
+    global knowledge_base_embeddings, _index_built
+    load_embedding_model()
 
     if not embedding_model:
         logger.error("Embedding model not loaded. Cannot build knowledge base embeddings.")
         return
 
-    from scraper import scrape_tramite_data 
-    
-    urls_to_ensure = get_all_urls_to_scrape()
-    
-    scraped_data_entries = load_knowledge_base() 
-    
-    for url_to_check in urls_to_ensure:
-        found_in_scraped = any(entry.get('url') == url_to_check for entry in scraped_data_entries)
-        if not found_in_scraped:
-            logger.info(f"URL {url_to_check} not found in knowledge base. Attempting to scrape...")
-            scraped_data = scrape_tramite_data(url_to_check)
-            if scraped_data:
-                scraped_data_entries = load_knowledge_base() 
-            else:
-                logger.warning(f"Failed to scrape data for {url_to_check}. It will not be in the RAG system.")
-
+    scraped_data_entries = load_knowledge_base()
 
     if not scraped_data_entries:
         logger.warning("No scraped data found to build knowledge base embeddings.")
+        index = KnowledgeBaseIndex.empty()
+    else:
+        index = _embed_entries(scraped_data_entries)
+        if index:
+            logger.info(f"Built RAG knowledge base with {len(index)} embedded entries.")
+        else:
+            logger.warning("No texts generated to embed for RAG knowledge base.")
+    with _index_lock:
+        knowledge_base_embeddings = index
+        _index_built = True
+
+
+def _ensure_index():
+    if not _index_built:
+        with _build_lock:
+            if not _index_built:
+                build_knowledge_base_embeddings()
+
+
+def _take_leader_lock():
+    """
+    Takes a non-blocking exclusive lock on BACKGROUND_SCRAPING_LOCK_FILE and
+    keeps it for the life of the process. Returns False if another process
+    (another worker, or the debug reloader's parent) already holds it.
+    """
+    global _leader_lock_file
+    if _leader_lock_file is not None:
+        return True
+    os.makedirs(os.path.dirname(BACKGROUND_SCRAPING_LOCK_FILE) or ".", exist_ok=True)
+    lock_file = open(BACKGROUND_SCRAPING_LOCK_FILE, "a+")
+    try:
+        if os.name == "nt":
+            import msvcrt
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _leader_lock_file = lock_file
+    return True
+
+
+def start_background_scraping():
+    """
+    Queues the URLs from tramites_urls.json that are not in the knowledge base
+    yet for the background scraper, which saves them and updates the embedding
+    store as they arrive (see get_scraping_status). Only one process per host
+    does this; the others return False and pick up the new entries when
+    rag_embedder sees the store change.
+    """
+    if not _take_leader_lock():
+        logger.info("Background scraping is already running in another process.")
+        return False
+    with _status_lock:
+        scraping_status["leader_pid"] = os.getpid()
+
+    known_urls = {entry.get('url') for entry in load_knowledge_base()}
+    missing_urls = [url for url in get_all_urls_to_scrape() if url not in known_urls]
+    if missing_urls:
+        logger.info(f"{len(missing_urls)} URLs not found in knowledge base. Scraping them in the background.")
+        enqueue_urls_for_scraping(missing_urls)
+    return True
+
+
+def enqueue_urls_for_scraping(urls):
+    """Queues `urls` for the background scraper, starting it if needed."""
+    global _scrape_thread
+    for url in urls:
+        _scrape_queue.put(url)
+    with _status_lock:
+        scraping_status["queued"] += len(urls)
+        if scraping_status["state"] != "running":
+            scraping_status["state"] = "queued"
+        if _scrape_thread is None or not _scrape_thread.is_alive():
+            _scrape_thread = threading.Thread(target=_scrape_worker, name="rag-scraper", daemon=True)
+            _scrape_thread.start()
+
+
+def _merge_scraped(urls):
+    """
+    Called by the scraper after each committed batch: updates the embedding
+    store used by buscar_tramite_por_embedding and, if the RAG index was
+    already built in this process, merges the new entries into it.
+    """
+    entries = [entry for entry in (get_tramite(url) for url in urls) if entry and entry.get('data')]
+    try:
+        crear_embeddings()
+        if _index_built:
+            _merge_into_index(_embed_entries(entries, nombre="background_scraping"))
+    except Exception as e:
+        logger.error(f"Error merging {len(entries)} scraped entries into the index: {e}")
+        with _status_lock:
+            scraping_status["last_error"] = str(e)
         return
+    with _status_lock:
+        scraping_status["merged"] += len(entries)
 
-    knowledge_base_embeddings = []
-    texts_to_embed = []
-    metadata_list = []
 
-    for entry in scraped_data_entries:
-        data = entry.get('data', {})
-        url = entry.get('url', '')
-        
-        categoria = entry.get('categoria', 'desconocido')  
-
-        combined_text = f"{data.get('titulo', '')}. "
-        if data.get('descripcion'):
-            combined_text += f"{data['descripcion']} "
-        if data.get('requisitos'):
-            if isinstance(data['requisitos'], list):
-                combined_text += "Requisitos: " + " ".join(data['requisitos']) + " "
-            else:
-                combined_text += f"Requisitos: {data['requisitos']} "
-        if data.get('costo'):
-            if isinstance(data['costo'], list):
-                combined_text += "Costo: " + " ".join([f"{item['descripcion']} {item['valor']}" for item in data['costo']]) + " "
-            else:
-                combined_text += f"Costo: {data['costo']} "
-        if data.get('modalidad'):
-            combined_text += f"Modalidad: {data['modalidad']} "
-        if data.get('direccion'):
-            combined_text += f"Dirección: {data['direccion']} "
-        if data.get('opciones_ubicacion'):
-             for loc in data['opciones_ubicacion']:
-                combined_text += f"Ubicación: {loc.get('nombre', '')} en {loc.get('direccion', '')}. "
-        if data.get('formularios'):
-            form_names = ", ".join([f['nombre'] for f in data['formularios']])
-            combined_text += f"Formularios: {form_names}. "
-        
-        combined_text = ' '.join(combined_text.split()).strip()
+def _scrape_done(url, data):
+    with _status_lock:
+        scraping_status["processed"] += 1
+        if data is None:
+            scraping_status["errors"] += 1
+            logger.warning(f"Failed to scrape data for {url}. It will not be in the RAG system.")
+        else:
+            scraping_status["ok"] += 1
 
-        if combined_text:
-            texts_to_embed.append(combined_text)
-            metadata_list.append({
-                "categoria": categoria,
-                "url": url,
-                "data": data 
-            })
-    
-    if texts_to_embed:
-        embeddings = embedding_model.encode(texts_to_embed, convert_to_tensor=False, show_progress_bar=False)
-        for i, emb in enumerate(embeddings):
-            knowledge_base_embeddings.append({
-                "text": texts_to_embed[i],
-                "embedding": emb,
-                "metadata": metadata_list[i]
-            })
-        logger.info(f"Built RAG knowledge base with {len(knowledge_base_embeddings)} embedded entries.")
-    else:
-        logger.warning("No texts generated to embed for RAG knowledge base.")
 
+def _scrape_worker():
+    from scraper import scrape_tramites_en_paralelo
+
+    while True:
+        batch = [_scrape_queue.get()]
+        while True:
+            try:
+                batch.append(_scrape_queue.get_nowait())
+            except queue.Empty:
+                break
 
-def retrieve_relevant_documents(query, top_k=3, min_similarity=0.4): 
+        with _status_lock:
+            scraping_status["state"] = "running"
+            scraping_status["started_at"] = scraping_status["started_at"] or datetime.now().isoformat()
+            scraping_status["finished_at"] = None
+        try:
+            # procesos=0: parse in this thread instead of forking a process pool from the server.
+            scrape_tramites_en_paralelo(batch, procesos=0, al_terminar=_scrape_done, al_guardar=_merge_scraped)
+        except Exception as e:
+            logger.error(f"Background scraping failed: {e}")
+            with _status_lock:
+                scraping_status["last_error"] = str(e)
+        finally:
+            for _ in batch:
+                _scrape_queue.task_done()
+
+        if _scrape_queue.empty():
+            with _status_lock:
+                scraping_status["state"] = "done"
+                scraping_status["finished_at"] = datetime.now().isoformat()
+
+
+def get_scraping_status():
+    """Progress of the background scraper, for the status endpoint."""
+    with _status_lock:
+        status = dict(scraping_status)
+    status["pending"] = _scrape_queue.qsize()
+    status["indexed_entries"] = len(obtener_indice().urls)
+    return status
+
+
+def retrieve_relevant_documents(query, top_k=3, min_similarity=0.4):
     """
     Retrieves the most relevant documents (tramites) from the knowledge base
     based on the semantic similarity of the query.
+
+    `query` may also be a list of queries: they are encoded and scored
+    together (one matrix product) and a list of result lists is returned.
     """
-    load_embedding_model() 
+    _ensure_index()
+    index = knowledge_base_embeddings
+    queries = [query] if isinstance(query, str) else list(query)
 
-    if not embedding_model or not knowledge_base_embeddings:
+    if not embedding_model or not len(index):
         logger.warning("Embedding model or RAG knowledge base not ready for retrieval.")
-        return []
+        return [] if isinstance(query, str) else [[] for _ in queries]
 
     try:
-        query_embedding = embedding_model.encode(query, convert_to_tensor=False)
+        query_embeddings = codificar_consultas(embedding_model, queries)
     except Exception as e:
         logger.error(f"Error encoding query for retrieval: {e}")
-        return []
-
-    similarities = []
-    for item in knowledge_base_embeddings:
-        doc_embedding = item['embedding']
-        similarity = cosine_similarity(query_embedding.reshape(1, -1), doc_embedding.reshape(1, -1))[0][0]
-        similarities.append({"item": item['metadata'], "similarity": float(similarity)})
-
-    similarities.sort(key=lambda x: x["similarity"], reverse=True)
+        return [] if isinstance(query, str) else [[] for _ in queries]
 
-    return [s["item"] for s in similarities if s["similarity"] >= min_similarity][:top_k]
\ No newline at end of file
+    results = [
+        [index.metadata[i] for i in indices]
+        for indices, _ in index.vectors.buscar_lote(query_embeddings, top_k=top_k, min_score=min_similarity)
+    ]
+    return results[0] if isinstance(query, str) else results
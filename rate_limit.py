@@ -0,0 +1,50 @@
+import time
+import threading
+from urllib.parse import urlsplit
+
+
+class TokenBucket:
+    """Token bucket seguro entre threads: `tasa` tokens por segundo, hasta `capacidad` acumulados."""
+
+    def __init__(self, tasa, capacidad=None):
+        self.tasa = float(tasa)
+        self.capacidad = float(capacidad if capacidad is not None else max(1.0, tasa))
+        self._tokens = self.capacidad
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reponer(self):
+        ahora = time.monotonic()
+        self._tokens = min(self.capacidad, self._tokens + (ahora - self._ultimo) * self.tasa)
+        self._ultimo = ahora
+
+    def adquirir(self, tokens=1.0):
+        """Bloquea hasta que haya `tokens` disponibles y los consume."""
+        if self.tasa <= 0:
+            return
+        while True:
+            with self._lock:
+                self._reponer()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                espera = (tokens - self._tokens) / self.tasa
+            time.sleep(espera)
+
+
+class LimitadorPorHost:
+    """Un TokenBucket independiente por host."""
+
+    def __init__(self, tasa, capacidad=None):
+        self.tasa = tasa
+        self.capacidad = capacidad
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def adquirir(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(self.tasa, self.capacidad)
+        bucket.adquirir()
@@ -2,20 +2,29 @@ import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from urllib.parse import urljoin, urldefrag, quote
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 import re
-import os
-import json
+import hashlib
 import logging
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, as_completed, FIRST_COMPLETED
 
-from config import BASE_URL, KNOWLEDGE_BASE_FILE
-from data_manager import load_knowledge_base, save_knowledge_base
+from config import (
+    BASE_URL, SCRAPER_MAX_WORKERS, SCRAPER_PARSE_PROCESSES,
+    SCRAPER_REQUESTS_PER_SECOND, SCRAPER_PARSER, KB_COMMIT_BATCH, HTML_CACHE_ENABLED,
+)
+from data_manager import get_tramite, upsert_tramites
+from rate_limit import LimitadorPorHost
+import html_cache
 
 logger = logging.getLogger(__name__)
 
 session = requests.Session()
 retries = Retry(total=5, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
-session.mount("https://", HTTPAdapter(max_retries=retries))
+adapter = HTTPAdapter(max_retries=retries, pool_maxsize=SCRAPER_MAX_WORKERS)
+session.mount("https://", adapter)
+session.mount("http://", adapter)
+limitador = LimitadorPorHost(SCRAPER_REQUESTS_PER_SECOND, max(1.0, SCRAPER_REQUESTS_PER_SECOND))
 
 PHONE_REGEX = re.compile(r"\+?54?\s*\(?0?370\)?[\s-]?\d+")
 EMAIL_REGEX = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
@@ -37,15 +46,8 @@ def split_address(raw):
     return {'full': raw.strip()}
 
 
-def scrape_tramite_data(url):
-    kb = load_knowledge_base()
-    for entry in kb:
-        if entry.get('url') == url and entry.get('data'):
-            logger.info(f"Cached: {url}")
-            return entry['data']
-
-    logger.info(f"Scraping: {url}")
-    data = {
+def nuevo_registro_tramite():
+    return {
         'titulo': None,
         'descripcion': None,
         'requisitos': [],
@@ -71,155 +73,435 @@ def scrape_tramite_data(url):
         'opciones_ubicacion': []
     }
 
-    try:
-        resp = session.get(url, timeout=30)
-        resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, 'html.parser')
-
-        # Título y descripción
-        data['titulo'] = soup.find('h2').get_text(strip=True) if soup.find('h2') else None
-        desc_p = soup.select_one('.bs-callout-info p')
-        data['descripcion'] = desc_p.get_text(' ', strip=True) if desc_p else None
-
-        # Requisitos y observaciones
-        data['requisitos'] = [p.get_text(strip=True) for p in soup.select('.bs-callout-warning p')]
-        data['observaciones'] = [p.get_text(strip=True) for p in soup.select('.bs-callout-danger p')]
-
-        # Formularios
-        name = None
-        for row in soup.select('#formularios table tr'):
-            strong = row.find('strong')
-            if strong:
-                name = strong.get_text(strip=True)
-            link = row.find('a', href=True)
-            if link and name:
-                full_url = urljoin(BASE_URL, link['href'])
-                data['formularios'].append({'nombre': name, 'url': full_url})
-                name = None
-
-        # Normas
-        name_n = None
-        for row in soup.select('#normas table tr'):
-            strong = row.find('strong')
-            if strong:
-                name_n = strong.get_text(strip=True)
-            link = row.find('a', href=True)
-            if link and name_n:
-                full_url = urljoin(BASE_URL, link['href'])
-                data['normativa'].append({'nombre': name_n, 'url': full_url})
-                name_n = None
-
-        # Costo
-        cost_table = soup.select_one('#cuanto table')
-        if cost_table:
-            costos = []
-            for row in cost_table.find_all('tr'):
-                cols = row.find_all('td')
-                if len(cols) >= 2:
-                    descripcion = cols[0].get_text(" ", strip=True)
-                    valor = cols[1].get_text(" ", strip=True)
-                    costos.append({
-                        'descripcion': descripcion,
-                        'valor': valor
-                    })
-            data['costo'] = costos
-        else:
-            raw_cost = soup.find(text=re.compile(r'\$\s*\d+'))
-            data['costo'] = [{'descripcion': None, 'valor': raw_cost.strip()}] if raw_cost else []
-            
-        # Ubicaciones: extraer múltiples sedes con detalle
-        for panel in soup.select('#donde .panel-default'):
-            title_tag = panel.select_one('.panel-title a')
-            body = panel.select_one('.panel-body')
-            if not (title_tag and body):
+
+def descargar_tramite(url, validadores=None):
+    """
+    Descarga el HTML de un trámite respetando el límite de peticiones por host.
+
+    Con `validadores` de la descarga anterior ({'etag', 'last_modified', 'hash'})
+    hace un GET condicional. Devuelve (html, validadores_nuevos), con html en
+    None si la página no cambió (304 o mismo hash del contenido).
+    """
+    validadores = validadores or {}
+    headers = {}
+    if validadores.get('etag'):
+        headers['If-None-Match'] = validadores['etag']
+    if validadores.get('last_modified'):
+        headers['If-Modified-Since'] = validadores['last_modified']
+
+    limitador.adquirir(url)
+    resp = session.get(url, timeout=30, headers=headers)
+    verificado = datetime.now().isoformat()
+    if resp.status_code == 304:
+        return None, {**validadores, 'verificado': verificado}
+    resp.raise_for_status()
+
+    nuevos = {
+        'etag': resp.headers.get('ETag'),
+        'last_modified': resp.headers.get('Last-Modified'),
+        'hash': hashlib.sha256(resp.content).hexdigest(),
+        'verificado': verificado,
+    }
+    if HTML_CACHE_ENABLED:
+        html_cache.guardar_html(url, resp.content, resp.encoding, nuevos['hash'], verificado)
+    if validadores.get('hash') == nuevos['hash']:
+        return None, nuevos
+    return resp.text, nuevos
+
+
+class _RegionesTramite(SoupStrainer):
+    """
+    Filtro de parseo que sólo construye las regiones de la página que usa el
+    extractor (título, callouts, formularios, normas, costo, sedes, pasos y
+    bloques de features). Todo lo demás (menú, pie, scripts) se descarta sin
+    crear nodos.
+    """
+    IDS = frozenset({'formularios', 'normas', 'cuanto', 'donde'})
+    CLASES = frozenset({'bs-callout-info', 'bs-callout-warning', 'bs-callout-danger', 'steps', 'features-block'})
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        if name == 'h2':
+            return True
+        attrs = attrs or {}
+        if attrs.get('id') in self.IDS:
+            return True
+        clases = attrs.get('class') or ()
+        if isinstance(clases, str):
+            clases = clases.split()
+        return not self.CLASES.isdisjoint(clases)
+
+    def allow_string_creation(self, string):
+        return False
+
+
+def _parser_disponible(nombre):
+    if nombre == 'lxml':
+        try:
+            import lxml  # noqa: F401
+        except ImportError:
+            logger.warning("lxml no está instalado; se usa html.parser para extraer los trámites.")
+            return 'html.parser'
+    return nombre
+
+
+PARSER = _parser_disponible(SCRAPER_PARSER)
+
+
+def extraer_datos_tramite(html, parser=None):
+    """
+    Extrae los datos estructurados de la página de un trámite.
+    Es una función pura (sin red ni disco) para poder correrla en un pool de procesos.
+
+    Con `parser='lxml'` (el valor por defecto de SCRAPER_PARSER) sólo se
+    construyen las secciones que interesan; con 'html.parser' se parsea la
+    página completa como antes. verificar_parser.py compara ambos caminos.
+    """
+    parser = parser or PARSER
+    if parser == 'html.parser':
+        soup = BeautifulSoup(html, 'html.parser')
+        return _extraer_de_soup(soup, lambda: soup)
+
+    soup = BeautifulSoup(html, parser, parse_only=_RegionesTramite())
+    return _extraer_de_soup(soup, lambda: BeautifulSoup(html, parser))
+
+
+def _extraer_de_soup(soup, documento_completo):
+    """
+    Arma el registro del trámite desde `soup`. `documento_completo()` devuelve
+    la página entera y sólo se usa para buscar el costo fuera de #cuanto.
+    """
+    data = nuevo_registro_tramite()
+
+    # Título y descripción
+    data['titulo'] = soup.find('h2').get_text(strip=True) if soup.find('h2') else None
+    desc_p = soup.select_one('.bs-callout-info p')
+    data['descripcion'] = desc_p.get_text(' ', strip=True) if desc_p else None
+
+    # Requisitos y observaciones
+    data['requisitos'] = [p.get_text(strip=True) for p in soup.select('.bs-callout-warning p')]
+    data['observaciones'] = [p.get_text(strip=True) for p in soup.select('.bs-callout-danger p')]
+
+    # Formularios
+    name = None
+    for row in soup.select('#formularios table tr'):
+        strong = row.find('strong')
+        if strong:
+            name = strong.get_text(strip=True)
+        link = row.find('a', href=True)
+        if link and name:
+            full_url = urljoin(BASE_URL, link['href'])
+            data['formularios'].append({'nombre': name, 'url': full_url})
+            name = None
+
+    # Normas
+    name_n = None
+    for row in soup.select('#normas table tr'):
+        strong = row.find('strong')
+        if strong:
+            name_n = strong.get_text(strip=True)
+        link = row.find('a', href=True)
+        if link and name_n:
+            full_url = urljoin(BASE_URL, link['href'])
+            data['normativa'].append({'nombre': name_n, 'url': full_url})
+            name_n = None
+
+    # Costo
+    cost_table = soup.select_one('#cuanto table')
+    if cost_table:
+        costos = []
+        for row in cost_table.find_all('tr'):
+            cols = row.find_all('td')
+            if len(cols) >= 2:
+                descripcion = cols[0].get_text(" ", strip=True)
+                valor = cols[1].get_text(" ", strip=True)
+                costos.append({
+                    'descripcion': descripcion,
+                    'valor': valor
+                })
+        data['costo'] = costos
+    else:
+        raw_cost = documento_completo().find(text=re.compile(r'\$\s*\d+'))
+        data['costo'] = [{'descripcion': None, 'valor': raw_cost.strip()}] if raw_cost else []
+
+    # Ubicaciones: extraer múltiples sedes con detalle
+    for panel in soup.select('#donde .panel-default'):
+        title_tag = panel.select_one('.panel-title a')
+        body = panel.select_one('.panel-body')
+        if not (title_tag and body):
+            continue
+        loc = {'nombre': title_tag.get_text(strip=True)}
+        # Recorrer filas de la tabla dentro del panel
+        for tr in body.select('tr'):
+            cols = tr.find_all('td')
+            if len(cols) != 2:
                 continue
-            loc = {'nombre': title_tag.get_text(strip=True)}
-            # Recorrer filas de la tabla dentro del panel
-            for tr in body.select('tr'):
-                cols = tr.find_all('td')
-                if len(cols) != 2:
-                    continue
-                key = cols[0].get_text(strip=True).rstrip(':').lower()
-                val = cols[1].get_text(' ', strip=True)
-                if 'domicilio' in key:
-                    loc['direccion'] = val
-                elif key.startswith('tel'):
-                    loc.setdefault('telefonos', []).append(normalize_phone(val))
-                elif 'e-mail' in key or 'email' in key:
-                    loc['email'] = val
-                elif 'responsable' in key:
-                    loc['responsable'] = val
-                elif 'horario' in key:
-                    loc['horarios'] = val
-            data['opciones_ubicacion'].append(loc)
-
-        if len(data['opciones_ubicacion']) == 1:
-            loc0 = data['opciones_ubicacion'][0]
-            data['direccion'] = loc0.get('direccion')
-            data['telefono'] = loc0.get('telefonos')
-            data['email'] = loc0.get('email')
-            data['horarios'] = loc0.get('horarios')
-
-        # Pasos detallados
-        for step in soup.select('.steps .step'):
-            num = step.select_one('.number')
-            title_s = step.select_one('.step-wrapper h4')
-            desc_p = step.select_one('.step-wrapper p')
-            data['pasos'].append({
-                'numero': num.get_text(strip=True) if num else None,
-                'titulo': title_s.get_text(strip=True) if title_s else None,
-                'descripcion': desc_p.get_text(strip=True) if desc_p else None
-            })
-
-        # Bloques de features adicionales (destinatario, categoría, etc.)
-        for fb in soup.select('.text-small.features-block'):
-            txt = fb.get_text(' ', strip=True)
-            if 'Trámite destinado a' in txt:
-                a = fb.find('a', href=True)
-                data['destinatario'] = a.get_text(strip=True) if a else None
-            if 'Tema:' in txt:
-                data['categoria'] = txt.split('Tema:',1)[1].strip()
-            if 'Organismo Responsable' in txt:
-                a = fb.find('a', href=True)
-                data['organismo'] = a.get_text(strip=True) if a else None
-            if 'Sitio Oficial' in txt:
-                a = fb.find('a', href=True)
-                data['sitio_oficial'] = urljoin(BASE_URL, a['href']) if a else None
-            if 'Duración Aproximada' in txt:
-                h6 = fb.find('h6')
-                data['duracion'] = h6.get_text(strip=True) if h6 else None
-            if 'Cómo se realiza' in txt:
-                strong = fb.find('strong')
-                data['modalidad'] = strong.get_text(strip=True) if strong else data['modalidad']
-            if 'Trámites similares' in txt:
-                for a in fb.select('.list-group a[href]'):
-                    data['similares'].append({'nombre': a.get_text(strip=True), 'url': urljoin(BASE_URL, a['href'])})
-            if 'Trámites Externos' in txt:
-                for a in fb.select('.list-group a[href]'):
-                    data['externos'].append({'nombre': a.get_text(strip=True), 'url': a['href']})
-
-        # Mapa usando dirección simple
-        if data.get('direccion'):
-            addr_text = data['direccion'].get('full', '') if isinstance(data['direccion'], dict) else ''
-            q = quote(addr_text + ', Formosa')
-            data['mapa_url'] = f"https://www.google.com/maps/search/?api=1&query={q}"
-
-        os.makedirs(os.path.dirname(KNOWLEDGE_BASE_FILE), exist_ok=True)
-        found = False
-        for i, e in enumerate(kb):
-            if e['url'] == url:
-                kb[i]['data'] = data
-                found = True
-                break
-        if not found:
-            kb.append({'url': url, 'data': data})
-        save_knowledge_base(kb)
+            key = cols[0].get_text(strip=True).rstrip(':').lower()
+            val = cols[1].get_text(' ', strip=True)
+            if 'domicilio' in key:
+                loc['direccion'] = val
+            elif key.startswith('tel'):
+                loc.setdefault('telefonos', []).append(normalize_phone(val))
+            elif 'e-mail' in key or 'email' in key:
+                loc['email'] = val
+            elif 'responsable' in key:
+                loc['responsable'] = val
+            elif 'horario' in key:
+                loc['horarios'] = val
+        data['opciones_ubicacion'].append(loc)
+
+    if len(data['opciones_ubicacion']) == 1:
+        loc0 = data['opciones_ubicacion'][0]
+        data['direccion'] = loc0.get('direccion')
+        data['telefono'] = loc0.get('telefonos')
+        data['email'] = loc0.get('email')
+        data['horarios'] = loc0.get('horarios')
+
+    # Pasos detallados
+    for step in soup.select('.steps .step'):
+        num = step.select_one('.number')
+        title_s = step.select_one('.step-wrapper h4')
+        desc_p = step.select_one('.step-wrapper p')
+        data['pasos'].append({
+            'numero': num.get_text(strip=True) if num else None,
+            'titulo': title_s.get_text(strip=True) if title_s else None,
+            'descripcion': desc_p.get_text(strip=True) if desc_p else None
+        })
+
+    # Bloques de features adicionales (destinatario, categoría, etc.)
+    for fb in soup.select('.text-small.features-block'):
+        txt = fb.get_text(' ', strip=True)
+        if 'Trámite destinado a' in txt:
+            a = fb.find('a', href=True)
+            data['destinatario'] = a.get_text(strip=True) if a else None
+        if 'Tema:' in txt:
+            data['categoria'] = txt.split('Tema:',1)[1].strip()
+        if 'Organismo Responsable' in txt:
+            a = fb.find('a', href=True)
+            data['organismo'] = a.get_text(strip=True) if a else None
+        if 'Sitio Oficial' in txt:
+            a = fb.find('a', href=True)
+            data['sitio_oficial'] = urljoin(BASE_URL, a['href']) if a else None
+        if 'Duración Aproximada' in txt:
+            h6 = fb.find('h6')
+            data['duracion'] = h6.get_text(strip=True) if h6 else None
+        if 'Cómo se realiza' in txt:
+            strong = fb.find('strong')
+            data['modalidad'] = strong.get_text(strip=True) if strong else data['modalidad']
+        if 'Trámites similares' in txt:
+            for a in fb.select('.list-group a[href]'):
+                data['similares'].append({'nombre': a.get_text(strip=True), 'url': urljoin(BASE_URL, a['href'])})
+        if 'Trámites Externos' in txt:
+            for a in fb.select('.list-group a[href]'):
+                data['externos'].append({'nombre': a.get_text(strip=True), 'url': a['href']})
+
+    # Mapa usando dirección simple
+    if data.get('direccion'):
+        addr_text = data['direccion'].get('full', '') if isinstance(data['direccion'], dict) else ''
+        q = quote(addr_text + ', Formosa')
+        data['mapa_url'] = f"https://www.google.com/maps/search/?api=1&query={q}"
+
+    return data
+
+
+def scrape_tramite_data(url, refrescar=False):
+    """
+    Devuelve los datos de un trámite, desde la base si ya están. Con
+    `refrescar=True` vuelve a pedir la página con un GET condicional y sólo la
+    parsea si cambió.
+    """
+    cached = get_tramite(url)
+    tiene_datos = bool(cached and cached.get('data'))
+    if tiene_datos and not refrescar:
+        logger.info(f"Cached: {url}")
+        return cached['data']
+
+    logger.info(f"Scraping: {url}")
+    try:
+        html, validadores = descargar_tramite(url, cached.get('validadores') if tiene_datos else None)
+        if html is None:
+            logger.info(f"Sin cambios: {url}")
+            upsert_tramites([{'url': url, 'validadores': validadores}])
+            return cached['data']
+
+        data = extraer_datos_tramite(html)
+        upsert_tramites([{'url': url, 'data': data, 'validadores': validadores}])
         return data
     except Exception as e:
         logger.error(f"Error scraping {url}: {e}")
         return None
 
+
+def scrape_tramites_en_paralelo(urls, max_workers=SCRAPER_MAX_WORKERS, procesos=SCRAPER_PARSE_PROCESSES,
+                                lote_commit=KB_COMMIT_BATCH, refrescar=False, al_terminar=None, al_guardar=None):
+    """
+    Scrapea `urls` en paralelo: las descargas corren en un pool de threads, el
+    parseo con BeautifulSoup en un pool de procesos (`procesos=0` lo hace en el
+    thread principal) y un único escritor (este thread) guarda los resultados
+    en la base de conocimiento en lotes de `lote_commit`.
+
+    Sin `refrescar` se saltean los trámites que ya están en la base. Con
+    `refrescar` se piden todos con GET condicional y sólo se parsean los que
+    cambiaron.
+
+    `al_terminar(url, data)` se llama por cada URL procesada (data es None si falló)
+    y `al_guardar(urls)` después de cada lote confirmado en la base.
+    Devuelve un dict con los contadores de la ejecución: cacheados, nuevos,
+    reparseados, sin_cambios y errores.
+    """
+    pendientes = []
+    datos_previos = {}
+    validadores_previos = {}
+    cacheados = 0
+    for url in dict.fromkeys(urls):
+        cached = get_tramite(url)
+        if cached and cached.get('data'):
+            if not refrescar:
+                cacheados += 1
+                continue
+            datos_previos[url] = cached['data']
+            validadores_previos[url] = cached.get('validadores')
+        pendientes.append(url)
+
+    resumen = {
+        'total': len(pendientes) + cacheados, 'cacheados': cacheados, 'ok': 0,
+        'nuevos': 0, 'reparseados': 0, 'sin_cambios': 0, 'errores': 0,
+    }
+    lote = []
+
+    def guardar_lote():
+        upsert_tramites(lote)
+        if al_guardar:
+            al_guardar([entrada['url'] for entrada in lote])
+        lote.clear()
+
+    def registrar(url, data, validadores=None, estado=None):
+        if data is None:
+            resumen['errores'] += 1
+        else:
+            resumen['ok'] += 1
+            resumen[estado] += 1
+            entrada = {'url': url, 'validadores': validadores}
+            if estado != 'sin_cambios':
+                entrada['data'] = data
+            lote.append(entrada)
+            if len(lote) >= lote_commit:
+                guardar_lote()
+        if al_terminar:
+            al_terminar(url, data)
+
+    def estado_parseado(url):
+        return 'reparseados' if url in datos_previos else 'nuevos'
+
+    descargas = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scraper")
+    parseo = ProcessPoolExecutor(max_workers=procesos) if procesos != 0 else None
+    en_curso = {}
+    try:
+        for url in pendientes:
+            futuro = descargas.submit(descargar_tramite, url, validadores_previos.get(url))
+            en_curso[futuro] = ('descarga', url, None)
+
+        while en_curso:
+            terminados, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+            for futuro in terminados:
+                etapa, url, validadores = en_curso.pop(futuro)
+                try:
+                    resultado = futuro.result()
+                except Exception as e:
+                    logger.error(f"Error scraping {url} ({etapa}): {e}")
+                    registrar(url, None)
+                    continue
+
+                if etapa == 'parseo':
+                    registrar(url, resultado, validadores, estado_parseado(url))
+                    continue
+
+                html, validadores = resultado
+                if html is None:
+                    registrar(url, datos_previos[url], validadores, 'sin_cambios')
+                elif parseo is not None:
+                    en_curso[parseo.submit(extraer_datos_tramite, html)] = ('parseo', url, validadores)
+                else:
+                    try:
+                        registrar(url, extraer_datos_tramite(html), validadores, estado_parseado(url))
+                    except Exception as e:
+                        logger.error(f"Error scraping {url} (parseo): {e}")
+                        registrar(url, None)
+    finally:
+        descargas.shutdown(wait=True, cancel_futures=True)
+        if parseo is not None:
+            parseo.shutdown(wait=True, cancel_futures=True)
+        if lote:
+            guardar_lote()
+
+    logger.info(
+        f"Scraping paralelo terminado: {resumen['nuevos']} nuevos, {resumen['reparseados']} reparseados, "
+        f"{resumen['sin_cambios']} sin cambios, {resumen['errores']} errores, "
+        f"{resumen['cacheados']} ya estaban en la base."
+    )
+    return resumen
+
+def _extraer_desde_cache(entrada):
+    return extraer_datos_tramite(html_cache.leer_html(entrada['hash'], entrada.get('encoding')))
+
+
+def reparsear_desde_cache(procesos=SCRAPER_PARSE_PROCESSES, lote_commit=KB_COMMIT_BATCH, urls=None):
+    """
+    Reconstruye la base de conocimiento desde el HTML guardado en html_cache,
+    sin acceso a la red: toma la última descarga de cada URL y la parsea en un
+    pool de procesos (`procesos=0` parsea en este thread).
+    """
+    ultimas = html_cache.ultimas_versiones()
+    if urls is not None:
+        ultimas = {url: ultimas[url] for url in urls if url in ultimas}
+
+    resumen = {'total': len(ultimas), 'ok': 0, 'errores': 0}
+    lote = []
+
+    def registrar(url, data):
+        resumen['ok'] += 1
+        lote.append({'url': url, 'data': data})
+        if len(lote) >= lote_commit:
+            upsert_tramites(lote)
+            lote.clear()
+
+    try:
+        if procesos == 0:
+            for url, entrada in ultimas.items():
+                try:
+                    registrar(url, _extraer_desde_cache(entrada))
+                except Exception as e:
+                    logger.error(f"Error re-parsing {url}: {e}")
+                    resumen['errores'] += 1
+        else:
+            with ProcessPoolExecutor(max_workers=procesos) as pool:
+                futuros = {pool.submit(_extraer_desde_cache, entrada): url for url, entrada in ultimas.items()}
+                for futuro in as_completed(futuros):
+                    url = futuros[futuro]
+                    try:
+                        registrar(url, futuro.result())
+                    except Exception as e:
+                        logger.error(f"Error re-parsing {url}: {e}")
+                        resumen['errores'] += 1
+    finally:
+        if lote:
+            upsert_tramites(lote)
+
+    logger.info(f"Re-parse desde cache: {resumen['ok']} ok, {resumen['errores']} errores de {resumen['total']} URLs.")
+    return resumen
+
+
 if __name__ == '__main__':
-    from utils_scraper import descubrir_urls_tramites, procesar_todos_los_tramites
-    urls = descubrir_urls_tramites()
-    procesar_todos_los_tramites()
+    import argparse
+    parser = argparse.ArgumentParser(description="Scraper de trámites de formosa.gob.ar")
+    parser.add_argument("modo", nargs="?", choices=["scrape", "reparse"], default="scrape",
+                        help="'reparse' reconstruye la base desde el HTML cacheado, sin red")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if args.modo == "reparse":
+        resumen = reparsear_desde_cache()
+        print(f"*** {resumen['ok']} trámites re-parseados desde cache, {resumen['errores']} con error.")
+    else:
+        from utils_scraper import descubrir_urls_tramites, procesar_todos_los_tramites
+        urls = descubrir_urls_tramites()
+        procesar_todos_los_tramites()
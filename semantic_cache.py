@@ -0,0 +1,172 @@
+"""
+Cache semántico de respuestas: una consulta reutiliza la respuesta de otra
+ya contestada si sus embeddings tienen similitud coseno >= `umbral`.
+
+Las entradas vencen a los `ttl` segundos y, pasado `max_size`, se desaloja la
+usada hace más tiempo. Con `path` el cache se escribe en un .npz (reemplazo
+atómico) después de cada alta y se recarga al arrancar si la `firma` guardada
+coincide; la firma debe cambiar con cualquier cosa que cambie las respuestas
+(modelo de embeddings, prompt, modelo del LLM).
+"""
+import os
+import json
+import time
+import logging
+import threading
+import numpy as np
+
+from vector_index import normalizar_filas
+
+logger = logging.getLogger(__name__)
+
+FORMATO_VERSION = 1
+
+
+class CacheSemantico:
+    def __init__(self, umbral, max_size=512, ttl=None, path=None, firma=None):
+        self.umbral = umbral
+        self.max_size = max(0, int(max_size))
+        self.ttl = ttl or None
+        self.path = path or None
+        self.firma = firma
+        # Una fila normalizada por entrada; _entradas[i] corresponde a _vectores[i].
+        self._vectores = None
+        self._entradas = []
+        self._lock = threading.Lock()
+        self._lock_disco = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirados = 0
+        self.desalojados = 0
+        self.segundos_ahorrados = 0.0
+        if self.path:
+            self._cargar()
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def _conservar(self, indices):
+        self._vectores = self._vectores[indices]
+        self._entradas = [self._entradas[i] for i in indices]
+
+    def _purgar_vencidos(self, ahora):
+        if not self.ttl or not self._entradas:
+            return
+        vigentes = [i for i, e in enumerate(self._entradas) if ahora - e["creado"] <= self.ttl]
+        if len(vigentes) < len(self._entradas):
+            self.expirados += len(self._entradas) - len(vigentes)
+            self._conservar(vigentes)
+
+    def buscar(self, embedding):
+        """Devuelve (respuesta, similitud) de la entrada más parecida a `embedding`, o None."""
+        consulta = normalizar_filas(embedding)[0]
+        with self._lock:
+            self._purgar_vencidos(time.time())
+            if self._entradas and self._vectores.shape[1] == consulta.shape[0]:
+                similitudes = self._vectores @ consulta
+                mejor = int(np.argmax(similitudes))
+                if similitudes[mejor] >= self.umbral:
+                    entrada = self._entradas[mejor]
+                    entrada["usado"] = time.time()
+                    self.hits += 1
+                    self.segundos_ahorrados += entrada["segundos"]
+                    return entrada["respuesta"], float(similitudes[mejor])
+            self.misses += 1
+            return None
+
+    def guardar(self, consulta, embedding, respuesta, segundos=0.0):
+        """
+        Agrega la `respuesta` a `consulta`. `segundos` es lo que tardó en
+        generarse: cada hit posterior lo suma a los segundos ahorrados.
+        """
+        if self.max_size == 0:
+            return
+        vector = normalizar_filas(embedding)
+        ahora = time.time()
+        with self._lock:
+            if self._vectores is None or self._vectores.shape[1] != vector.shape[1]:
+                self._vectores = np.zeros((0, vector.shape[1]), dtype=np.float32)
+                self._entradas = []
+            self._vectores = np.vstack([self._vectores, vector])
+            self._entradas.append({
+                "consulta": consulta,
+                "respuesta": respuesta,
+                "creado": ahora,
+                "usado": ahora,
+                "segundos": round(float(segundos), 3),
+            })
+            sobrantes = len(self._entradas) - self.max_size
+            if sobrantes > 0:
+                orden = sorted(range(len(self._entradas)), key=lambda i: self._entradas[i]["usado"])
+                self._conservar(sorted(orden[sobrantes:]))
+                self.desalojados += sobrantes
+        if self.path:
+            self._escribir()
+
+    def clear(self):
+        with self._lock:
+            self._vectores = None
+            self._entradas = []
+        if self.path:
+            self._escribir()
+
+    def _escribir(self):
+        with self._lock_disco:
+            with self._lock:
+                vectores = self._vectores if self._vectores is not None else np.zeros((0, 0), dtype=np.float32)
+                meta = json.dumps({
+                    "version": FORMATO_VERSION,
+                    "firma": self.firma,
+                    "entradas": [dict(e) for e in self._entradas],
+                }, ensure_ascii=False)
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp-{os.getpid()}"
+            try:
+                with open(tmp_path, "wb") as f:
+                    np.savez(f, vectores=vectores, meta=np.array(meta))
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.warning(f"No se pudo guardar el cache semántico en '{self.path}': {e}")
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def _cargar(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as datos:
+                meta = json.loads(str(datos["meta"]))
+                vectores = np.asarray(datos["vectores"], dtype=np.float32)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"No se pudo leer el cache semántico '{self.path}': {e}")
+            return
+        if meta.get("version") != FORMATO_VERSION or meta.get("firma") != self.firma:
+            logger.info("El cache semántico guardado es de otra configuración; se empieza vacío.")
+            return
+        entradas = meta.get("entradas", [])
+        if len(entradas) != vectores.shape[0]:
+            return
+        with self._lock:
+            self._vectores = vectores
+            self._entradas = entradas
+            self._purgar_vencidos(time.time())
+            self.expirados = 0
+        logger.info(f"Cache semántico cargado: {len(self)} respuestas.")
+
+    def estadisticas(self):
+        with self._lock:
+            tamano = len(self._entradas)
+        consultas = self.hits + self.misses
+        return {
+            "tamano": tamano,
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "umbral": self.umbral,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / consultas, 3) if consultas else 0.0,
+            "expirados": self.expirados,
+            "desalojados": self.desalojados,
+            "segundos_ahorrados": round(self.segundos_ahorrados, 3),
+        }
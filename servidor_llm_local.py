@@ -0,0 +1,116 @@
+"""
+Servidor local que imita /api/v1/chat/completions de OpenRouter, para probar
+el cliente LLM sin red ni API key.
+
+Uso:
+    python servidor_llm_local.py --puerto 8081 --demora 1.5
+    OPENROUTER_BASE_URL=http://127.0.0.1:8081/api/v1 OPENROUTER_API_KEY=x python app.py
+
+Responde con un eco del último mensaje del usuario. Con --estado 429 (u otro
+código) devuelve ese error en lugar de la respuesta. Si el pedido trae
+"stream": true la respuesta sale por SSE, una palabra cada --demora-token segundos.
+"""
+import json
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+RUTA = "/api/v1/chat/completions"
+
+
+class ManejadorCompletions(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive y Transfer-Encoding: chunked, como OpenRouter
+    demora = 0.0
+    demora_token = 0.05
+    estado = 200
+    llamadas = 0
+    _lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, estado, cuerpo):
+        datos = json.dumps(cuerpo, ensure_ascii=False).encode("utf-8")
+        try:
+            self.send_response(estado)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(datos)))
+            self.end_headers()
+            self.wfile.write(datos)
+        except (BrokenPipeError, ConnectionResetError):
+            # El cliente se fue (por ejemplo, venció su deadline).
+            pass
+
+    def _stream(self, numero, texto):
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for palabra in texto.split(" "):
+                evento = {"id": f"local-{numero}", "choices": [{"index": 0, "delta": {"content": palabra + " "}}]}
+                self._chunk(f"data: {json.dumps(evento, ensure_ascii=False)}\n\n".encode("utf-8"))
+                time.sleep(self.demora_token)
+            self._chunk(b"data: [DONE]\n\n")
+            self._chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def _chunk(self, datos):
+        self.wfile.write(f"{len(datos):x}\r\n".encode("ascii") + datos + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        if self.path.rstrip("/") != RUTA:
+            return self._json(404, {"error": {"message": "not found"}})
+        largo = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(largo) or b"{}")
+        with self._lock:
+            type(self).llamadas += 1
+            numero = type(self).llamadas
+
+        time.sleep(self.demora)
+        if self.estado != 200:
+            return self._json(self.estado, {"error": {"message": f"HTTP {self.estado}"}})
+
+        pregunta = next((m["content"] for m in reversed(payload.get("messages", [])) if m.get("role") == "user"), "")
+        if payload.get("stream"):
+            return self._stream(numero, f"Respuesta local a: {pregunta}")
+        self._json(200, {
+            "id": f"local-{numero}",
+            "model": payload.get("model"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": f"Respuesta local a: {pregunta}"},
+                "finish_reason": "stop",
+            }],
+        })
+
+
+def iniciar(puerto=0, demora=0.0, estado=200, demora_token=0.05):
+    """Levanta el servidor en un thread y lo devuelve (ver .server_port)."""
+    ManejadorCompletions.demora = demora
+    ManejadorCompletions.demora_token = demora_token
+    ManejadorCompletions.estado = estado
+    servidor = ThreadingHTTPServer(("127.0.0.1", puerto), ManejadorCompletions)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--puerto", type=int, default=8081)
+    parser.add_argument("--demora", type=float, default=0.0, help="Segundos antes de responder")
+    parser.add_argument("--demora-token", type=float, default=0.05, help="Segundos entre palabras en streaming")
+    parser.add_argument("--estado", type=int, default=200, help="Código HTTP a devolver")
+    args = parser.parse_args()
+
+    servidor = iniciar(args.puerto, args.demora, args.estado, args.demora_token)
+    print(f"*** Servidor LLM local en http://127.0.0.1:{servidor.server_port}{RUTA}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        servidor.shutdown()
@@ -0,0 +1,80 @@
+import threading
+
+
+class Vuelo:
+    """Una llamada en curso: el líder la termina y los demás esperan su resultado."""
+
+    def __init__(self):
+        self._listo = threading.Event()
+        self.resultado = None
+        self.error = None
+
+    def terminar(self, resultado=None, error=None):
+        self.resultado = resultado
+        self.error = error
+        self._listo.set()
+
+    def esperar(self):
+        self._listo.wait()
+        if self.error is not None:
+            raise self.error
+        return self.resultado
+
+
+class SingleFlight:
+    """
+    Coalescencia de llamadas idénticas concurrentes: mientras hay una llamada
+    en curso para una clave, las que llegan con la misma clave esperan su
+    resultado (o su excepción) en lugar de repetirla. Al terminar la clave se
+    libera; no es un cache.
+    """
+
+    def __init__(self):
+        self._vuelos = {}
+        self._lock = threading.Lock()
+        self.llamadas = 0
+        self.colapsadas = 0
+
+    def unirse(self, clave):
+        """
+        Devuelve (vuelo, es_lider). El líder tiene que llamar a `terminar(clave,
+        vuelo, ...)` pase lo que pase; los demás llaman a `vuelo.esperar()`.
+        """
+        with self._lock:
+            vuelo = self._vuelos.get(clave)
+            if vuelo is not None:
+                self.colapsadas += 1
+                return vuelo, False
+            vuelo = self._vuelos[clave] = Vuelo()
+            self.llamadas += 1
+            return vuelo, True
+
+    def terminar(self, clave, vuelo, resultado=None, error=None):
+        with self._lock:
+            if self._vuelos.get(clave) is vuelo:
+                del self._vuelos[clave]
+        vuelo.terminar(resultado, error)
+
+    def ejecutar(self, clave, funcion):
+        """Devuelve `funcion()`, compartiendo la llamada con las concurrentes de la misma clave."""
+        vuelo, es_lider = self.unirse(clave)
+        if not es_lider:
+            return vuelo.esperar()
+        try:
+            resultado = funcion()
+        except BaseException as e:
+            self.terminar(clave, vuelo, error=e)
+            raise
+        self.terminar(clave, vuelo, resultado)
+        return resultado
+
+    def estadisticas(self):
+        with self._lock:
+            en_vuelo = len(self._vuelos)
+        total = self.llamadas + self.colapsadas
+        return {
+            "en_vuelo": en_vuelo,
+            "llamadas": self.llamadas,
+            "colapsadas": self.colapsadas,
+            "ratio_colapsadas": round(self.colapsadas / total, 3) if total else 0.0,
+        }
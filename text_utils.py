@@ -0,0 +1,26 @@
+import re
+import unicodedata
+
+_ESPACIOS = re.compile(r"\s+")
+
+
+def quitar_acentos(texto, conservar_enie=False):
+    """
+    'Trámite' -> 'Tramite'. La ñ también pierde la tilde: 'año' -> 'ano',
+    salvo con `conservar_enie=True` (para las listas de palabras, donde
+    'coño' no puede volverse una subcadena de 'reconocimiento').
+    """
+    descompuesto = unicodedata.normalize("NFKD", texto)
+    sin_acentos = "".join(
+        c for i, c in enumerate(descompuesto)
+        if not unicodedata.combining(c)
+        or (conservar_enie and c == "\u0303" and i and descompuesto[i - 1] in "nN")
+    )
+    return unicodedata.normalize("NFC", sin_acentos) if conservar_enie else sin_acentos
+
+
+def normalizar_texto(texto, conservar_enie=False):
+    """Forma canónica para comparar mensajes: sin acentos, en minúsculas y con espacios simples."""
+    if not texto:
+        return ""
+    return _ESPACIOS.sub(" ", quitar_acentos(texto, conservar_enie).lower()).strip()
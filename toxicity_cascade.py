@@ -0,0 +1,191 @@
+"""
+Cascada de etapas para detectar_toxicidad y clasificador lineal de n-gramas
+de caracteres que se entrena offline.
+
+Entrenamiento (JSONL con {"texto": ..., "toxico": 0/1}):
+    python toxicity_cascade.py datos.jsonl
+    python toxicity_cascade.py mensajes.jsonl --destilar   # etiqueta con toxic-bert las líneas sin "toxico"
+"""
+import re
+import sys
+import json
+import time
+import zlib
+import random
+import logging
+import argparse
+import threading
+import numpy as np
+
+from config import TOXICITY_NGRAM_MODEL_FILE
+from text_utils import normalizar_texto
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenizar(texto_normalizado):
+    return _TOKEN.findall(texto_normalizado)
+
+
+class CascadaToxicidad:
+    """
+    Ejecuta las etapas en orden. Cada etapa recibe (texto, texto_normalizado) y
+    devuelve (es_toxico, razon) si está segura o None para pasar a la siguiente.
+    Lleva cuenta por etapa de cuántos mensajes evaluó, cuántos decidió y su latencia.
+    """
+
+    def __init__(self, etapas):
+        self.etapas = list(etapas)
+        self._lock = threading.Lock()
+        self._mensajes = 0
+        self._por_etapa = {nombre: {"evaluados": 0, "decididos": 0, "segundos": 0.0} for nombre, _ in self.etapas}
+
+    def evaluar(self, texto):
+        normalizado = normalizar_texto(texto)
+        resultado = None
+        for nombre, etapa in self.etapas:
+            inicio = time.perf_counter()
+            try:
+                resultado = etapa(texto, normalizado)
+            finally:
+                self._registrar(nombre, time.perf_counter() - inicio, resultado is not None)
+            if resultado is not None:
+                break
+        with self._lock:
+            self._mensajes += 1
+        return resultado if resultado is not None else (False, "No tóxico")
+
+    def _registrar(self, nombre, segundos, decidio):
+        with self._lock:
+            stats = self._por_etapa[nombre]
+            stats["evaluados"] += 1
+            stats["decididos"] += int(decidio)
+            stats["segundos"] += segundos
+
+    def estadisticas(self):
+        with self._lock:
+            etapas = {}
+            for nombre, stats in self._por_etapa.items():
+                evaluados = stats["evaluados"]
+                etapas[nombre] = {
+                    "evaluados": evaluados,
+                    "decididos": stats["decididos"],
+                    "tasa_decision": round(stats["decididos"] / evaluados, 3) if evaluados else 0.0,
+                    "ms_promedio": round(1000 * stats["segundos"] / evaluados, 3) if evaluados else 0.0,
+                    "ms_total": round(1000 * stats["segundos"], 1),
+                }
+            llegaron_al_modelo = self._por_etapa.get("modelo", {}).get("evaluados", 0)
+            return {
+                "mensajes": self._mensajes,
+                "modelo_evitado": round(1 - llegaron_al_modelo / self._mensajes, 3) if self._mensajes else 0.0,
+                "etapas": etapas,
+            }
+
+
+class ClasificadorNgramas:
+    """
+    Regresión logística sobre n-gramas de caracteres del texto normalizado,
+    con hashing trick (crc32, estable entre procesos) en `n_features` columnas.
+    """
+
+    def __init__(self, n_features=2**18, ngramas=(2, 3, 4), pesos=None, sesgo=0.0):
+        self.n_features = int(n_features)
+        self.ngramas = tuple(ngramas)
+        self.pesos = pesos if pesos is not None else np.zeros(self.n_features, dtype=np.float32)
+        self.sesgo = float(sesgo)
+
+    def caracteristicas(self, texto_normalizado):
+        """Índices únicos de los n-gramas presentes y el valor (normalizado L2) de cada uno."""
+        relleno = f" {texto_normalizado} "
+        indices = {
+            zlib.crc32(relleno[i:i + n].encode("utf-8")) % self.n_features
+            for n in self.ngramas
+            for i in range(len(relleno) - n + 1)
+        }
+        if not indices:
+            return np.empty(0, dtype=np.int64), 0.0
+        return np.fromiter(indices, dtype=np.int64, count=len(indices)), 1.0 / np.sqrt(len(indices))
+
+    def predecir_proba(self, texto_normalizado):
+        indices, valor = self.caracteristicas(texto_normalizado)
+        z = self.sesgo + valor * float(self.pesos[indices].sum())
+        return 1.0 / (1.0 + np.exp(-z))
+
+    def entrenar(self, textos, etiquetas, epocas=10, tasa=0.5, l2=1e-6, semilla=0):
+        """SGD sobre log-loss. `textos` ya normalizados, `etiquetas` 0/1."""
+        muestras = [(self.caracteristicas(t), float(y)) for t, y in zip(textos, etiquetas)]
+        aleatorio = random.Random(semilla)
+        for epoca in range(epocas):
+            aleatorio.shuffle(muestras)
+            perdida = 0.0
+            for (indices, valor), y in muestras:
+                z = self.sesgo + valor * float(self.pesos[indices].sum())
+                p = 1.0 / (1.0 + np.exp(-z))
+                gradiente = p - y
+                self.pesos[indices] -= tasa * (gradiente * valor + l2 * self.pesos[indices])
+                self.sesgo -= tasa * gradiente
+                perdida -= y * np.log(p + 1e-12) + (1 - y) * np.log(1 - p + 1e-12)
+            logger.info(f"Época {epoca + 1}/{epocas}: log-loss {perdida / max(len(muestras), 1):.4f}")
+        return self
+
+    def guardar(self, path=TOXICITY_NGRAM_MODEL_FILE):
+        np.savez_compressed(
+            path,
+            pesos=self.pesos,
+            sesgo=np.float32(self.sesgo),
+            n_features=np.int64(self.n_features),
+            ngramas=np.array(self.ngramas, dtype=np.int64),
+        )
+
+    @classmethod
+    def cargar(cls, path=TOXICITY_NGRAM_MODEL_FILE):
+        with np.load(path) as datos:
+            return cls(
+                n_features=int(datos["n_features"]),
+                ngramas=tuple(int(n) for n in datos["ngramas"]),
+                pesos=datos["pesos"].astype(np.float32),
+                sesgo=float(datos["sesgo"]),
+            )
+
+
+def _leer_jsonl(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(linea) for linea in f if linea.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("datos", help="Archivo JSONL con {'texto': ..., 'toxico': 0/1}")
+    parser.add_argument("--destilar", action="store_true", help="Etiquetar con toxic-bert los textos sin 'toxico'")
+    parser.add_argument("--epocas", type=int, default=10)
+    parser.add_argument("--salida", default=TOXICITY_NGRAM_MODEL_FILE)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    filas = _leer_jsonl(args.datos)
+    sin_etiqueta = [f for f in filas if f.get("toxico") is None]
+    if sin_etiqueta:
+        if not args.destilar:
+            print(f"{len(sin_etiqueta)} filas sin etiqueta 'toxico'; usá --destilar para etiquetarlas con el modelo.")
+            return 1
+        from config import TOXICITY_THRESHOLD
+        from models import puntuar_lote_toxicidad
+        textos = [f["texto"] for f in sin_etiqueta]
+        for desde in range(0, len(textos), 32):
+            for fila, prob in zip(sin_etiqueta[desde:desde + 32], puntuar_lote_toxicidad(textos[desde:desde + 32])):
+                fila["toxico"] = int(prob > TOXICITY_THRESHOLD)
+
+    clasificador = ClasificadorNgramas().entrenar(
+        [normalizar_texto(f["texto"]) for f in filas],
+        [int(f["toxico"]) for f in filas],
+        epocas=args.epocas,
+    )
+    clasificador.guardar(args.salida)
+    print(f"*** Clasificador de n-gramas entrenado con {len(filas)} textos y guardado en '{args.salida}'.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,22 @@
 # utils.py
 import json
+import time
+import hashlib
 import requests
 import logging
 from datetime import datetime
 from urllib.parse import quote # Añadir import aquí
 
-from config import OPENROUTER_API_KEY
-from rag_embedder import buscar_tramite_por_embedding  
+from config import (
+    OPENROUTER_API_KEY, EMBEDDING_MODEL_NAME, LLM_CACHE_ENABLED, LLM_CACHE_SIMILARITY, LLM_CACHE_SIZE,
+    LLM_CACHE_TTL, LLM_CACHE_FILE, LLM_SINGLE_FLIGHT_ENABLED,
+)
+from llm_client import cliente_llm, LLMError, LLMSaturado
+from rag_embedder import buscar_tramite_por_embedding, obtener_modelo
+from embedding_pipeline import codificar_consulta
+from semantic_cache import CacheSemantico
+from single_flight import SingleFlight
+from text_utils import normalizar_texto
 from data_manager import load_knowledge_base
 
 base_conocimiento = load_knowledge_base()
@@ -16,6 +26,8 @@ sugerencias_globales = [item.get('titulo', 'Trámite sin título') for item in b
 
 logger = logging.getLogger(__name__)
 
+MENSAJE_LIMITE = "El sistema está recibiendo muchas consultas en poco tiempo. Por favor, esperá unos segundos e intentá nuevamente."
+
 # SYSTEM_PROMPT ajustado para ser más conversacional cuando no hay RAG exacta
 SYSTEM_PROMPT = """
 # ASISTENTE VIRTUAL DE TRÁMITES — GOBIERNO DE FORMOSA
@@ -163,7 +175,8 @@ def buscar_tramites_inteligente(consulta):
     return retrieved_results
 
 
-def generar_respuesta_contextual(mensaje_usuario, historial_conversacion=None, current_tramite_data=None):
+def generar_respuesta_contextual(mensaje_usuario, historial_conversacion=None, current_tramite_data=None,
+                                 stream_ia=False):
     """
     Genera la respuesta contextual:
      1) Atiende selección de ubicación pendiente
@@ -171,6 +184,9 @@ def generar_respuesta_contextual(mensaje_usuario, historial_conversacion=None, c
      3) Detecta cambio explícito de trámite via RAG
      4) Fallback a LLM si no hay trámite
      5) Formatea selección de ubicaciones múltiples
+
+    Con `stream_ia=True` el paso 4 no llama al LLM: devuelve {"tipo": "stream_ia"}
+    para que el llamador transmita la respuesta con llamar_ia_openrouter_stream.
     """
     if not historial_conversacion:
         historial_conversacion = []
@@ -214,12 +230,14 @@ def generar_respuesta_contextual(mensaje_usuario, historial_conversacion=None, c
         datos_tramite = primer
         categoria_id  = nuevos[0].get('categoria', 'desconocido')
     else:
+        if stream_ia:
+            return {"tipo": "stream_ia"}
         ia = llamar_ia_openrouter(mensaje_usuario, historial_conversacion)
 
         if ia.get("tipo") == "error_red" and "Too Many Requests" in ia.get("respuesta", ""):
             logger.warning("Limitación de rate detectada. Mostrando mensaje amigable.")
             return {
-                "mensaje": "El sistema está recibiendo muchas consultas en poco tiempo. Por favor, esperá unos segundos e intentá nuevamente.",
+                "mensaje": MENSAJE_LIMITE,
                 "tipo": "error_limite",
                 "sugerencias": sugerencias_globales,
                 "necesita_seleccion": False,
@@ -395,19 +413,14 @@ def _generar_respuesta_con_datos(datos_tramite, consulta, categoria_id):
             "datos_tramite_identificado": datos_tramite
         }
 
-def llamar_ia_openrouter(mensaje_usuario, historial):
-    """
-    Llama a la API de OpenRouter para una respuesta general cuando RAG no encuentra nada.
-    """
-    if not OPENROUTER_API_KEY:
-        logger.error("OpenRouter API key not configured")
-        return {"respuesta": "Error de configuración. Por favor, contacta al administrador.", "error": True, "tipo": "error_configuracion"}
+def es_error_de_limite(e):
+    """True si `e` indica que el LLM está saturado (semáforo lleno o HTTP 429)."""
+    respuesta_http = getattr(e, "response", None)
+    return isinstance(e, LLMSaturado) or (respuesta_http is not None and respuesta_http.status_code == 429)
 
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-        "Content-Type": "application/json",
-    }
 
+def _payload_openrouter(mensaje_usuario, historial):
+    """Cuerpo de la llamada a /chat/completions: system prompt, historial y mensaje."""
     messages = [
         {"role": "system", "content": SYSTEM_PROMPT}, # SYSTEM_PROMPT ya es texto plano
     ]
@@ -432,33 +445,141 @@ def llamar_ia_openrouter(mensaje_usuario, historial):
     
     messages.append({"role": "user", "content": mensaje_usuario})
 
-    data = {
+    return {
         "model": "google/gemini-2.0-flash-exp:free", # Asegúrate de que este es el modelo que quieres usar
         "messages": messages,
         "max_tokens": 1000,
         "temperature": 0.5
     }
 
+
+# Las respuestas guardadas valen mientras no cambien el prompt, el modelo del LLM ni el de embeddings.
+_firma_cache_ia = hashlib.sha256(
+    f"{EMBEDDING_MODEL_NAME}\n{json.dumps(_payload_openrouter('', []), sort_keys=True)}".encode("utf-8")
+).hexdigest()
+cache_respuestas_ia = CacheSemantico(
+    LLM_CACHE_SIMILARITY, LLM_CACHE_SIZE, LLM_CACHE_TTL,
+    path=LLM_CACHE_FILE if LLM_CACHE_ENABLED else None, firma=_firma_cache_ia,
+)
+llamadas_ia = SingleFlight()
+
+
+def _embedding_para_cache(mensaje_usuario, data):
+    """
+    Embedding del mensaje para el cache semántico, o None si no corresponde
+    usarlo: con historial la misma pregunta puede significar otra cosa
+    ("¿y en Clorinda?"), así que sólo se cachean payloads system + user.
+    """
+    if not LLM_CACHE_ENABLED or len(data["messages"]) != 2:
+        return None
     try:
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers=headers,
-            data=json.dumps(data, indent=2, ensure_ascii=False),
-            timeout=45
-        )
-        response.raise_for_status()
-        resultado = response.json()
+        return codificar_consulta(obtener_modelo(), mensaje_usuario)
+    except Exception as e:
+        logger.warning(f"Sin cache semántico para esta consulta: {e}")
+        return None
+
+
+def _clave_single_flight(modo, mensaje_usuario, data):
+    """
+    Clave para compartir la llamada con otras idénticas en curso, o None si
+    hay historial (la misma pregunta puede tener otra respuesta).
+    """
+    if not LLM_SINGLE_FLIGHT_ENABLED or len(data["messages"]) != 2:
+        return None
+    return (modo, normalizar_texto(mensaje_usuario))
+
+
+def llamar_ia_openrouter(mensaje_usuario, historial):
+    """
+    Llama a la API de OpenRouter para una respuesta general cuando RAG no encuentra nada.
+    """
+    if not OPENROUTER_API_KEY:
+        logger.error("OpenRouter API key not configured")
+        return {"respuesta": "Error de configuración. Por favor, contacta al administrador.", "error": True, "tipo": "error_configuracion"}
+
+    data = _payload_openrouter(mensaje_usuario, historial)
+    embedding = _embedding_para_cache(mensaje_usuario, data)
+    if embedding is not None:
+        encontrado = cache_respuestas_ia.buscar(embedding)
+        if encontrado:
+            logger.info(f"Respuesta de la IA desde el cache semántico (similitud {encontrado[1]:.3f}).")
+            return {"respuesta": encontrado[0], "tipo": "respuesta_general_ia", "sugerencias": sugerencias_globales}
+
+    clave = _clave_single_flight("completar", mensaje_usuario, data)
+    if clave is None:
+        return _completar_ia(mensaje_usuario, data, embedding)
+    # Las preguntas idénticas que llegan mientras ésta está en curso reciben el mismo resultado (o error).
+    return llamadas_ia.ejecutar(clave, lambda: _completar_ia(mensaje_usuario, data, embedding))
+
+
+def _completar_ia(mensaje_usuario, data, embedding):
+    try:
+        inicio = time.perf_counter()
+        resultado = cliente_llm.completar(data)
         if 'choices' not in resultado or not resultado['choices']:
             logger.error(f"Unexpected response from OpenRouter: {resultado}")
             return {"respuesta": "No pude generar una respuesta adecuada. ¿Podrías reformular tu pregunta?", "error": True, "tipo": "error_ia_vacia"}
 
         respuesta_ia = resultado['choices'][0]['message']['content']
+        if embedding is not None and respuesta_ia:
+            cache_respuestas_ia.guardar(mensaje_usuario, embedding, respuesta_ia, time.perf_counter() - inicio)
         
         return {"respuesta": respuesta_ia, "tipo": "respuesta_general_ia", "sugerencias": sugerencias_globales}
 
-    except requests.RequestException as e:
+    except (requests.RequestException, LLMError) as e:
         logger.error(f"Network or HTTP error when calling OpenRouter: {e}")
+        if es_error_de_limite(e):
+            # generar_respuesta_contextual reconoce este texto y muestra el aviso de límite.
+            return {"respuesta": "Too Many Requests", "error": True, "tipo": "error_red"}
         return {"respuesta": "Hubo un problema técnico al conectar con la IA. Intenta de nuevo más tarde.", "error": True, "tipo": "error_red"}
     except Exception as e:
         logger.error(f"Ocurrió un error inesperado al procesar la respuesta de la IA: {e}", exc_info=True)
-        return {"respuesta": "Ocurrió un error inesperado. Por favor, contacta al soporte.", "error": True, "tipo": "error_interno_ia"}
\ No newline at end of file
+        return {"respuesta": "Ocurrió un error inesperado. Por favor, contacta al soporte.", "error": True, "tipo": "error_interno_ia"}
+
+
+def llamar_ia_openrouter_stream(mensaje_usuario, historial):
+    """
+    Versión en streaming de llamar_ia_openrouter: generador con los fragmentos
+    de texto a medida que llegan. Los errores se propagan (LLMError o de requests).
+    Un hit del cache semántico, o una pregunta idéntica a otra que se está
+    transmitiendo, sale como un único fragmento.
+    """
+    if not OPENROUTER_API_KEY:
+        raise LLMError("OpenRouter API key not configured")
+    data = _payload_openrouter(mensaje_usuario, historial)
+    embedding = _embedding_para_cache(mensaje_usuario, data)
+    if embedding is not None:
+        encontrado = cache_respuestas_ia.buscar(embedding)
+        if encontrado:
+            logger.info(f"Respuesta de la IA desde el cache semántico (similitud {encontrado[1]:.3f}).")
+            yield encontrado[0]
+            return
+
+    clave = _clave_single_flight("stream", mensaje_usuario, data)
+    vuelo = None
+    if clave is not None:
+        vuelo, es_lider = llamadas_ia.unirse(clave)
+        if not es_lider:
+            # Otra sesión ya está transmitiendo la misma pregunta: se espera su texto completo.
+            yield vuelo.esperar()
+            return
+
+    inicio = time.perf_counter()
+    partes = []
+    try:
+        for texto in cliente_llm.stream(data):
+            partes.append(texto)
+            yield texto
+    except GeneratorExit:
+        if vuelo is not None:
+            llamadas_ia.terminar(clave, vuelo, error=LLMError("La respuesta compartida se interrumpió."))
+        raise
+    except BaseException as e:
+        if vuelo is not None:
+            llamadas_ia.terminar(clave, vuelo, error=e)
+        raise
+    if vuelo is not None:
+        llamadas_ia.terminar(clave, vuelo, "".join(partes))
+    if embedding is not None and partes:
+        cache_respuestas_ia.guardar(mensaje_usuario, embedding, "".join(partes), time.perf_counter() - inicio)
+
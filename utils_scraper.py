@@ -6,7 +6,11 @@ from bs4 import BeautifulSoup
 import re
 import os
 import json
-import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from config import CRAWL_CHECKPOINT_FILE
+from rate_limit import LimitadorPorHost
+import crawl_checkpoint
 
 BASE_URL = "https://formosa.gob.ar"
 PAGINAS_INICIALES = [
@@ -21,84 +25,171 @@ TRAMITES_URLS_FILE = os.path.join(OUTPUT_DIR, "tramites_urls.json")
 PATRON_TRAMITE = re.compile(r"/tramite/\d+/[\w\-áéíóúÁÉÍÓÚñÑ]+")
 PATRON_PAGINACION = re.compile(r"/tramites/buscar/pagina/(\d+)")
 
+CRAWLER_MAX_WORKERS = 8
+CRAWLER_REQUESTS_PER_SECOND = 4.0
+CRAWLER_BURST = 4
+CRAWLER_CHECKPOINT_EVERY = 10  # páginas visitadas entre checkpoints de la frontera
+
 session = requests.Session()
 retries = Retry(
     total=5,
     backoff_factor=0.5,
     status_forcelist=[429, 500, 502, 503, 504]
 )
-session.mount("https://", HTTPAdapter(max_retries=retries))
+adapter = HTTPAdapter(max_retries=retries, pool_connections=4, pool_maxsize=CRAWLER_MAX_WORKERS)
+session.mount("https://", adapter)
+session.mount("http://", adapter)
+
+
+def _paginas_iniciales(base_url):
+    paginas = {base_url + pagina[len(BASE_URL):] for pagina in PAGINAS_INICIALES}
+    # Añadir URLs de paginación del 2 al 24
+    for pagina in range(2, 25):
+        paginas.add(f"{base_url}/tramites/buscar/pagina/{pagina}")
+    return paginas
 
-def descubrir_urls_tramites():
+
+def _visitar(url, base_url, limitador):
+    """
+    Descarga una página y devuelve (tramites, enlaces, paginas) encontrados en ella,
+    o None si falló. Corre en los threads del crawler.
+    """
+    limitador.adquirir(url)
+    print(f"Visitando: {url}")
+    try:
+        resp = session.get(url, timeout=60)
+        resp.raise_for_status()
+    except Exception as e:
+        print(f"[ERROR] Falló GET {url}: {e}")
+        return None
+
+    soup = BeautifulSoup(resp.text, "html.parser")
+    tramites, enlaces, paginas = set(), set(), set()
+
+    for a in soup.select("div.list-group a[href]"):
+        href = a["href"].strip()
+        href = urljoin(base_url, href)
+        href, _ = urldefrag(href)
+        if not href.startswith(base_url):
+            continue
+        if PATRON_TRAMITE.search(href):
+            tramites.add(href)
+        elif "/tramites" in href:
+            enlaces.add(href)
+
+    for li in soup.select("ul.pagination li a"):
+        href = li.get("href")
+        if href:
+            href = urljoin(base_url, href)
+            href, _ = urldefrag(href)
+            match = PATRON_PAGINACION.search(href)
+            if match:
+                try:
+                    page_number = int(match.group(1))
+                    paginas.add(f"{base_url}/tramites/buscar/pagina/{page_number}")
+                except ValueError:
+                    print(f"Skipping invalid pagination URL (non-integer page): {href}")
+                    continue
+
+    return tramites, enlaces, paginas
+
+
+def descubrir_urls_tramites(base_url=BASE_URL, max_workers=CRAWLER_MAX_WORKERS,
+                            peticiones_por_segundo=CRAWLER_REQUESTS_PER_SECOND,
+                            output_file=TRAMITES_URLS_FILE, reanudar=False,
+                            checkpoint_file=CRAWL_CHECKPOINT_FILE):
     """
     Recorre todas las páginas de trámites de forma exhaustiva,
     explorando enlaces internos y extrayendo URLs únicas de trámite.
+
+    Las páginas se descargan en paralelo con hasta `max_workers` threads y un
+    token bucket por host que limita el ritmo a `peticiones_por_segundo`.
+
+    Cada CRAWLER_CHECKPOINT_EVERY páginas se guarda la frontera, las visitadas
+    y los trámites encontrados. Con `reanudar` se continúa desde ese checkpoint
+    (reintentando las páginas que fallaron) en lugar de empezar de cero.
     """
     urls_tramites = set()
     urls_visitadas = set()
-    urls_por_visitar = set(PAGINAS_INICIALES)
+    urls_fallidas = set()
+    urls_por_visitar = _paginas_iniciales(base_url)
+    en_curso = {}
+    limitador = LimitadorPorHost(peticiones_por_segundo, CRAWLER_BURST)
 
-    # Añadir URLs de paginación del 2 al 24
-    for pagina in range(2, 25):  # Del 2 al 24
-        url_paginacion = f"{BASE_URL}/tramites/buscar/pagina/{pagina}"
-        urls_por_visitar.add(url_paginacion)
-
-    while urls_por_visitar:
-        url_actual = urls_por_visitar.pop()
-        url_actual = urldefrag(url_actual).url
-        if url_actual in urls_visitadas:
-            continue
+    checkpoint = crawl_checkpoint.cargar_frontera(base_url, checkpoint_file) if reanudar else None
+    if checkpoint and checkpoint["completo"] and os.path.exists(output_file):
+        print(f"[INFO] El último crawl terminó; se reutilizan sus {len(checkpoint['tramites'])} URLs de trámites.")
+        return checkpoint["tramites"]
+    if checkpoint:
+        urls_tramites = checkpoint["tramites"]
+        urls_visitadas = checkpoint["visitadas"]
+        urls_por_visitar = (checkpoint["por_visitar"] | checkpoint["fallidas"]) - urls_visitadas
+        print(
+            f"[INFO] Reanudando crawl: {len(urls_visitadas)} páginas visitadas, "
+            f"{len(urls_por_visitar)} por visitar, {len(urls_tramites)} trámites."
+        )
 
-        print(f"Visitando: {url_actual}")
-        try:
-            resp = session.get(url_actual, timeout=60)
-            resp.raise_for_status()
-        except Exception as e:
-            print(f"[ERROR] Falló GET {url_actual}: {e}")
-            continue
+    def guardar_checkpoint(completo=False):
+        crawl_checkpoint.guardar_frontera(
+            base_url, urls_por_visitar | set(en_curso.values()), urls_visitadas,
+            urls_fallidas, urls_tramites, completo=completo, path=checkpoint_file,
+        )
 
-        urls_visitadas.add(url_actual)
-        soup = BeautifulSoup(resp.text, "html.parser")
+    desde_checkpoint = 0
 
-        for a in soup.select("div.list-group a[href]"):
-            href = a["href"].strip()
-            href = urljoin(BASE_URL, href)
-            href, _ = urldefrag(href)
-            if not href.startswith(BASE_URL):
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="crawler") as executor:
+        while urls_por_visitar or en_curso:
+            while urls_por_visitar and len(en_curso) < max_workers:
+                url_actual = urldefrag(urls_por_visitar.pop()).url
+                if url_actual in urls_visitadas or url_actual in en_curso.values():
+                    continue
+                en_curso[executor.submit(_visitar, url_actual, base_url, limitador)] = url_actual
+
+            if not en_curso:
                 continue
-            if PATRON_TRAMITE.search(href):
-                urls_tramites.add(href)
-            elif "/tramites" in href and href not in urls_visitadas and href not in urls_por_visitar:
-                 urls_por_visitar.add(href)
-
-        for li in soup.select("ul.pagination li a"):
-            href = li.get("href")
-            if href:
-                href = urljoin(BASE_URL, href)
-                href, _ = urldefrag(href)
-                match = PATRON_PAGINACION.search(href)
-                if match:
-                    try:
-                        page_number = int(match.group(1))
-                        clean_pagination_url = f"{BASE_URL}/tramites/buscar/pagina/{page_number}"
-                        if clean_pagination_url not in urls_visitadas and clean_pagination_url not in urls_por_visitar:
-                            urls_por_visitar.add(clean_pagination_url)
-                    except ValueError:
-                        print(f"Skipping invalid pagination URL (non-integer page): {href}")
-                        continue
-        
-        time.sleep(1) 
-
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    with open(TRAMITES_URLS_FILE, "w", encoding="utf-8") as f:
+
+            terminados, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+            for futuro in terminados:
+                url_actual = en_curso.pop(futuro)
+                resultado = futuro.result()
+                desde_checkpoint += 1
+                if resultado is None:
+                    urls_fallidas.add(url_actual)
+                    continue
+
+                urls_visitadas.add(url_actual)
+                urls_fallidas.discard(url_actual)
+                tramites, enlaces, paginas = resultado
+                urls_tramites.update(tramites)
+                for href in enlaces | paginas:
+                    if href not in urls_visitadas and href not in en_curso.values():
+                        urls_por_visitar.add(href)
+
+            if desde_checkpoint >= CRAWLER_CHECKPOINT_EVERY:
+                guardar_checkpoint()
+                desde_checkpoint = 0
+
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    with open(output_file, "w", encoding="utf-8") as f:
         json.dump(sorted(urls_tramites), f, ensure_ascii=False, indent=2)
+    guardar_checkpoint(completo=True)
 
     print(f"Se descubrieron {len(urls_tramites)} URLs únicas de trámites.")
     return urls_tramites
 
-def procesar_todos_los_tramites():
+def procesar_todos_los_tramites(paralelo=True, refrescar=False, reanudar=False):
     """
-    Procesa cada trámite llamando a scrape_tramite_data().
+    Procesa cada trámite llamando a scrape_tramite_data(), o en modo paralelo
+    con scrape_tramites_en_paralelo() (descargas concurrentes, parseo en un
+    pool de procesos y la base de conocimiento guardada por lotes).
+
+    Con `refrescar` vuelve a pedir también los trámites ya guardados, con GET
+    condicional (ETag / Last-Modified / hash del contenido), y sólo re-parsea
+    los que cambiaron.
+
+    El estado de cada URL se registra en el checkpoint de scraping a medida
+    que se guarda en la base; con `reanudar` se saltean las que ya quedaron
+    'ok' en la corrida anterior.
     """
     if not os.path.exists(TRAMITES_URLS_FILE):
         print("Primero ejecutá descubrir_urls_tramites()")
@@ -107,17 +198,61 @@ def procesar_todos_los_tramites():
     with open(TRAMITES_URLS_FILE, "r", encoding="utf-8") as f:
         urls = json.load(f)
 
+    if reanudar:
+        completadas = crawl_checkpoint.urls_completadas()
+        if completadas:
+            print(f"[INFO] Reanudando: {len(completadas)} trámites ya procesados en la corrida anterior.")
+        urls = [url for url in urls if url not in completadas]
+    else:
+        crawl_checkpoint.reiniciar_estados()
+
     print(f"[INFO] Procesando {len(urls)} trámites...")
-    from scraper import scrape_tramite_data 
+    from scraper import scrape_tramite_data, scrape_tramites_en_paralelo
+
+    if paralelo:
+        procesados = 0
+
+        def informar(url, datos):
+            nonlocal procesados
+            procesados += 1
+            if datos:
+                print(f"[{procesados}] [OK] {datos.get('titulo', 'sin título')}")
+            else:
+                print(f"[{procesados}] [ERROR] Falló en {url}")
+                crawl_checkpoint.registrar_estados([url], "error")
+
+        resumen = scrape_tramites_en_paralelo(
+            urls, refrescar=refrescar, al_terminar=informar,
+            al_guardar=lambda guardadas: crawl_checkpoint.registrar_estados(guardadas, "ok"),
+        )
+        print(
+            f"[INFO] {resumen['nuevos']} nuevos, {resumen['reparseados']} reparseados, "
+            f"{resumen['sin_cambios']} sin cambios, {resumen['errores']} con error, "
+            f"{resumen['cacheados']} ya estaban en la base."
+        )
+        return resumen
 
     for i, url in enumerate(urls, 1):
         print(f"[{i}/{len(urls)}] Scrapeando: {url}")
-        datos = scrape_tramite_data(url)
+        datos = scrape_tramite_data(url, refrescar=refrescar)
         if datos:
             print(f"[OK] {datos.get('titulo', 'sin título')}")
+            crawl_checkpoint.registrar_estados([url], "ok")
         else:
             print(f"[ERROR] Falló en {url}")
+            crawl_checkpoint.registrar_estados([url], "error")
 
 if __name__ == "__main__":
-    descubrir_urls_tramites()
-    procesar_todos_los_tramites()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Descubre y scrapea los trámites de formosa.gob.ar")
+    parser.add_argument("--refrescar", action="store_true",
+                        help="No redescubrir URLs; volver a pedir los trámites guardados con GET condicional")
+    parser.add_argument("--reanudar", "--resume", action="store_true",
+                        help="Continuar el crawl y el scraping desde el último checkpoint")
+    args = parser.parse_args()
+
+    if args.refrescar:
+        procesar_todos_los_tramites(refrescar=True, reanudar=args.reanudar)
+    else:
+        descubrir_urls_tramites(reanudar=args.reanudar)
+        procesar_todos_los_tramites(reanudar=args.reanudar)
\ No newline at end of file
@@ -0,0 +1,89 @@
+import numpy as np
+
+
+def normalizar_filas(matriz):
+    """Devuelve una copia float32 contigua con cada fila de norma L2 = 1."""
+    matriz = np.ascontiguousarray(matriz, dtype=np.float32)
+    if matriz.ndim == 1:
+        matriz = matriz.reshape(1, -1)
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    normas[normas == 0] = 1.0
+    return np.ascontiguousarray(matriz / normas, dtype=np.float32)
+
+
+def top_k_indices(scores, top_k):
+    """Índices de los `top_k` scores más altos, ordenados de mayor a menor."""
+    n = scores.shape[0]
+    if top_k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+    if top_k < n:
+        candidatos = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        candidatos = np.arange(n)
+    return candidatos[np.argsort(-scores[candidatos], kind="stable")]
+
+
+class VectorIndex:
+    """
+    Índice exacto de similitud coseno sobre una matriz de embeddings.
+    Las filas se guardan normalizadas, así que el coseno es un producto punto.
+    """
+
+    def __init__(self, matriz, normalizada=False):
+        if normalizada:
+            self.matriz = np.asarray(matriz, dtype=np.float32)
+        else:
+            self.matriz = normalizar_filas(matriz)
+
+    def __len__(self):
+        return self.matriz.shape[0]
+
+    @property
+    def dimension(self):
+        return self.matriz.shape[1] if self.matriz.ndim == 2 else 0
+
+    def buscar(self, consulta, top_k=1, min_score=None):
+        """
+        Devuelve (indices, scores) de las `top_k` filas más similares a `consulta`,
+        ordenadas de mayor a menor y filtradas por `min_score` si se indica.
+        """
+        if len(self) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        consulta = normalizar_filas(consulta)[0]
+        scores = self.matriz @ consulta
+        indices = top_k_indices(scores, top_k)
+        mejores = scores[indices]
+        if min_score is not None:
+            mascara = mejores >= min_score
+            indices, mejores = indices[mascara], mejores[mascara]
+        return indices, mejores
+
+    def buscar_lote(self, consultas, top_k=1, min_score=None):
+        """
+        Versión por lotes de `buscar`: un solo producto de matrices para todas
+        las consultas. Devuelve una lista con (indices, scores) por consulta.
+        """
+        consultas = normalizar_filas(consultas)
+        k = min(top_k, len(self))
+        if k <= 0:
+            vacio = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+            return [vacio] * consultas.shape[0]
+
+        scores = consultas @ self.matriz.T
+        if k < len(self):
+            candidatos = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            candidatos = np.broadcast_to(np.arange(len(self)), scores.shape)
+        mejores = np.take_along_axis(scores, candidatos, axis=1)
+        orden = np.argsort(-mejores, axis=1, kind="stable")
+        indices = np.take_along_axis(candidatos, orden, axis=1)
+        mejores = np.take_along_axis(mejores, orden, axis=1)
+
+        resultados = []
+        for fila_indices, fila_scores in zip(indices, mejores):
+            if min_score is not None:
+                mascara = fila_scores >= min_score
+                fila_indices, fila_scores = fila_indices[mascara], fila_scores[mascara]
+            resultados.append((fila_indices, fila_scores))
+        return resultados
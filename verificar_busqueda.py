@@ -0,0 +1,63 @@
+"""
+Chequeo de la búsqueda híbrida (BM25 + embeddings) con consultas genéricas o
+ajenas a los trámites: ninguna puede tomar el atajo léxico ni devolver un
+trámite, tienen que llegar vacías para que las conteste el LLM.
+
+Con --sin-densos la búsqueda densa no devuelve nada (como pasa con el modelo
+real para estas consultas, debajo de SIMILARITY_THRESHOLD) y se verifica que
+los candidatos léxicos solos no alcancen para devolver un trámite; sirve
+también con un modelo de embeddings de prueba.
+
+Uso:
+    python verificar_busqueda.py
+    python verificar_busqueda.py --sin-densos
+"""
+import sys
+import argparse
+import logging
+
+from rag_embedder import obtener_indice, buscar_tramite_por_embedding
+
+CONSULTAS_SIN_TRAMITE = [
+    "quiero saber el horario",
+    "¿cómo saco turno en Buenos Aires?",
+    "hola",
+    "qué podés hacer",
+    "gracias, muy amable",
+    "necesito ayuda",
+    "dónde queda la oficina",
+    "cuánto sale",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--sin-densos", action="store_true", help="Simula que ningún resultado denso pasa el umbral")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    indice = obtener_indice()
+    if args.sin_densos:
+        indice.buscar = lambda pregunta_emb, top_k=1, umbral=None: []
+    fallas = []
+    for consulta in CONSULTAS_SIN_TRAMITE:
+        lexicos, confiable = indice.buscar_lexico(consulta)
+        if confiable:
+            fallas.append(f"'{consulta}' toma el atajo léxico hacia {lexicos[0][1]}")
+        resultados = buscar_tramite_por_embedding(consulta, top_k=args.top_k)
+        if resultados:
+            titulos = [(r.get('data') or {}).get('titulo') for r in resultados]
+            fallas.append(f"'{consulta}' devuelve {titulos}")
+
+    if fallas:
+        print("❌ La búsqueda devuelve trámites para consultas que no los piden:")
+        for falla in fallas:
+            print(f"   - {falla}")
+        return 1
+    print(f"✅ Las {len(CONSULTAS_SIN_TRAMITE)} consultas genéricas quedan sin trámite y pasan al LLM.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""
+Chequeo de descubrir_urls_tramites contra un servidor HTTP local que imita
+los listados de formosa.gob.ar: /tramites/{organismos,temas,destinatarios},
+/tramites/buscar y /tramites/buscar/pagina/N con paginación.
+
+Verifica que:
+  - cada página se pide una sola vez (y todas las del sitio se visitan),
+  - el conjunto de URLs de trámites descubiertas es exactamente el esperado,
+  - el ritmo de pedidos respeta el token bucket (tasa + ráfaga).
+
+Uso:
+    python verificar_crawler.py
+    python verificar_crawler.py --paginas 40 --por-pagina 8 --rps 10
+"""
+import sys
+import time
+import json
+import argparse
+import tempfile
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import utils_scraper
+
+SECCIONES = ["organismos", "temas", "destinatarios"]
+
+
+class SitioFixture:
+    """Contenido del sitio falso: `paginas` páginas de /tramites/buscar con `por_pagina` trámites cada una."""
+
+    def __init__(self, paginas, por_pagina, organismos=5):
+        self.paginas = paginas
+        self.por_pagina = por_pagina
+        self.organismos = organismos
+
+    def tramites_de_pagina(self, numero):
+        desde = (numero - 1) * self.por_pagina
+        return [f"/tramite/{i}/tramite_número_{i}" for i in range(desde + 1, desde + self.por_pagina + 1)]
+
+    def tramites_de_organismo(self, numero):
+        # Repite trámites de los listados y agrega uno propio por organismo.
+        return self.tramites_de_pagina(numero)[:2] + [f"/tramite/{9000 + numero}/solo-en-organismo-{numero}"]
+
+    def tramites_esperados(self):
+        rutas = set()
+        for numero in range(1, self.paginas + 1):
+            rutas.update(self.tramites_de_pagina(numero))
+        for numero in range(1, self.organismos + 1):
+            rutas.update(self.tramites_de_organismo(numero))
+        return rutas
+
+    def rutas_esperadas(self):
+        rutas = {f"/tramites/{seccion}" for seccion in SECCIONES}
+        rutas.add("/tramites/buscar")
+        rutas.update(f"/tramites/buscar/pagina/{n}" for n in range(2, self.paginas + 1))
+        rutas.update(f"/tramites/organismo/{n}" for n in range(1, self.organismos + 1))
+        return rutas
+
+    def _listado(self, enlaces, paginacion=()):
+        items = "".join(f'<a href="{href}" class="list-group-item">{href}</a>' for href in enlaces)
+        paginas = "".join(f'<li><a href="{href}">{href}</a></li>' for href in paginacion)
+        return (
+            f'<html><body><div class="list-group">{items}</div>'
+            f'<ul class="pagination">{paginas}</ul>'
+            f'<a href="https://otro-sitio.example/tramites/x">externo</a></body></html>'
+        )
+
+    def _paginacion(self, numero):
+        # Como el sitio real: vecinas, primera y última (las > 24 sólo se descubren así).
+        vecinas = {1, numero - 1, numero + 1, self.paginas}
+        return [
+            f"/tramites/buscar/pagina/{n}#contenido" if n > 1 else "/tramites/buscar"
+            for n in sorted(vecinas) if 1 <= n <= self.paginas
+        ]
+
+    def html(self, ruta):
+        if ruta in {f"/tramites/{seccion}" for seccion in SECCIONES}:
+            enlaces = [f"/tramites/organismo/{n}" for n in range(1, self.organismos + 1)]
+            return self._listado(enlaces + ["/tramites/buscar"])
+        if ruta.startswith("/tramites/organismo/"):
+            numero = int(ruta.rsplit("/", 1)[1])
+            if 1 <= numero <= self.organismos:
+                return self._listado(self.tramites_de_organismo(numero) + ["/tramites/temas"])
+        if ruta == "/tramites/buscar":
+            return self._listado(self.tramites_de_pagina(1), self._paginacion(1))
+        if ruta.startswith("/tramites/buscar/pagina/"):
+            numero = int(ruta.rsplit("/", 1)[1])
+            if 2 <= numero <= self.paginas:
+                return self._listado(self.tramites_de_pagina(numero), self._paginacion(numero))
+        return None
+
+
+class ManejadorFixture(BaseHTTPRequestHandler):
+    sitio = None
+    pedidos = []
+    _lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        with self._lock:
+            type(self).pedidos.append((time.monotonic(), self.path))
+        html = self.sitio.html(self.path)
+        datos = (html or "no encontrado").encode("utf-8")
+        self.send_response(200 if html else 404)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+
+def iniciar(sitio, puerto=0):
+    """Levanta el servidor en un thread y lo devuelve (ver .server_port)."""
+    ManejadorFixture.sitio = sitio
+    ManejadorFixture.pedidos = []
+    servidor = ThreadingHTTPServer(("127.0.0.1", puerto), ManejadorFixture)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def excesos_de_ritmo(tiempos, tasa, rafaga, tolerancia=0.05):
+    """
+    Pares de pedidos (i, j) que violan el token bucket: entre el i-ésimo y el
+    j-ésimo no pueden llegar más de rafaga + tasa * (t_j - t_i) pedidos.
+    """
+    tiempos = sorted(tiempos)
+    excesos = []
+    for i in range(len(tiempos)):
+        for j in range(i + 1, len(tiempos)):
+            permitidos = rafaga + tasa * (tiempos[j] - tiempos[i] + tolerancia)
+            if j - i + 1 > permitidos:
+                excesos.append((i, j))
+    return excesos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paginas", type=int, default=30, help="Páginas de /tramites/buscar (más de 24 prueba el descubrimiento)")
+    parser.add_argument("--por-pagina", type=int, default=5)
+    parser.add_argument("--rps", type=float, default=10.0, help="Pedidos por segundo del crawler")
+    parser.add_argument("--workers", type=int, default=utils_scraper.CRAWLER_MAX_WORKERS)
+    args = parser.parse_args()
+
+    sitio = SitioFixture(args.paginas, args.por_pagina)
+    servidor = iniciar(sitio)
+    base_url = f"http://127.0.0.1:{servidor.server_port}"
+
+    inicio = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp:
+        encontradas = utils_scraper.descubrir_urls_tramites(
+            base_url, max_workers=args.workers, peticiones_por_segundo=args.rps,
+            output_file=f"{tmp}/tramites_urls.json", checkpoint_file=f"{tmp}/crawl_checkpoint.json",
+        )
+    segundos = time.perf_counter() - inicio
+    servidor.shutdown()
+
+    pedidos = list(ManejadorFixture.pedidos)
+    conteo = Counter(ruta for _, ruta in pedidos)
+    repetidas = {ruta: n for ruta, n in conteo.items() if n > 1}
+    faltantes = sitio.rutas_esperadas() - set(conteo)
+    inexistentes = {ruta for ruta in conteo if sitio.html(ruta) is None}
+    esperadas = {base_url + ruta for ruta in sitio.tramites_esperados()}
+    excesos = excesos_de_ritmo([t for t, _ in pedidos], args.rps, utils_scraper.CRAWLER_BURST)
+
+    print(json.dumps({
+        "pedidos": len(pedidos),
+        "segundos": round(segundos, 2),
+        "tramites_encontrados": len(encontradas),
+        "tramites_esperados": len(esperadas),
+        "rps": args.rps,
+        "rafaga": utils_scraper.CRAWLER_BURST,
+    }, indent=2, ensure_ascii=False))
+
+    fallas = []
+    if repetidas:
+        fallas.append(f"páginas pedidas más de una vez: {repetidas}")
+    if faltantes:
+        fallas.append(f"páginas no visitadas: {sorted(faltantes)}")
+    if inexistentes:
+        # _paginas_iniciales agrega /pagina/2..24 aunque el sitio tenga menos.
+        if args.paginas >= 24:
+            fallas.append(f"pedidos a páginas inexistentes: {sorted(inexistentes)}")
+    if set(encontradas) != esperadas:
+        fallas.append(
+            f"URLs de trámites distintas: {len(esperadas - set(encontradas))} faltan, "
+            f"{len(set(encontradas) - esperadas)} sobran"
+        )
+    if excesos:
+        fallas.append(f"el ritmo superó el token bucket en {len(excesos)} ventanas")
+
+    if fallas:
+        print("❌ El crawler falla contra el sitio local:")
+        for falla in fallas:
+            print(f"   - {falla}")
+        return 1
+    print("✅ Cada página se pidió una vez, se encontraron todos los trámites y se respetó el límite de ritmo.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
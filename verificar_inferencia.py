@@ -0,0 +1,132 @@
+"""
+Chequeo de deriva numérica entre el backend fp32 de PyTorch y un backend
+optimizado (int8 / onnx), sobre la base de conocimiento y una muestra de mensajes.
+
+Uso:
+    python verificar_inferencia.py --backend int8
+    python verificar_inferencia.py --backend onnx --max-textos 100
+"""
+import sys
+import json
+import argparse
+import logging
+import numpy as np
+
+from config import TOXICITY_THRESHOLD, EMBEDDING_BATCH_SIZE
+from data_manager import load_knowledge_base
+from inference_backends import cargar_modelo_embedding, cargar_modelo_toxicidad, BACKENDS
+from embedding_pipeline import codificar_textos
+from vector_index import normalizar_filas
+
+logger = logging.getLogger(__name__)
+
+MENSAJES_MUESTRA = [
+    "hola",
+    "cómo saco el certificado de antecedentes",
+    "requisitos para el dni",
+    "licencia de conducir",
+    "cuánto sale la partida de nacimiento",
+    "dónde queda la oficina de rentas",
+    "necesito inscribirme en ingresos brutos",
+    "qué podés hacer",
+    "gracias, muy amable",
+    "sos un inútil, no servís para nada",
+    "andate a la mierda",
+    "te voy a matar",
+    "this is a stupid answer",
+    "you are an idiot",
+    "¿cómo saco turno en Buenos Aires?",
+]
+
+# Umbrales de aceptación de la deriva frente a fp32.
+COSENO_MINIMO = 0.98
+ACUERDO_TOP1_MINIMO = 0.97
+DIFERENCIA_PROB_MAXIMA = 0.05
+ACUERDO_DECISION_MINIMO = 0.98
+
+
+def _textos_kb(max_textos=None):
+    from rag_embedder import texto_para_embedding
+    base = load_knowledge_base()
+    textos = [texto_para_embedding(t) for t in base]
+    return textos[:max_textos] if max_textos else textos
+
+
+def comparar_embeddings(backend, textos, consultas):
+    ref_modelo = cargar_modelo_embedding("torch")
+    opt_modelo = cargar_modelo_embedding(backend)
+
+    ref = codificar_textos(ref_modelo, textos, EMBEDDING_BATCH_SIZE, nombre="fp32")
+    opt = codificar_textos(opt_modelo, textos, EMBEDDING_BATCH_SIZE, nombre=backend)
+    cosenos = np.sum(ref * opt, axis=1)
+
+    # La recuperación es lo que importa: el mejor trámite para cada consulta debe coincidir.
+    q_ref = normalizar_filas(codificar_textos(ref_modelo, consultas, nombre="fp32"))
+    q_opt = normalizar_filas(codificar_textos(opt_modelo, consultas, nombre=backend))
+    top1_ref = np.argmax(q_ref @ ref.T, axis=1)
+    top1_opt = np.argmax(q_opt @ opt.T, axis=1)
+
+    return {
+        "textos": len(textos),
+        "coseno_min": float(cosenos.min()),
+        "coseno_medio": float(cosenos.mean()),
+        "acuerdo_top1": float(np.mean(top1_ref == top1_opt)),
+    }
+
+
+def _probabilidades(tokenizer, model, textos, batch_size=16):
+    import torch
+    probs = []
+    with torch.inference_mode():
+        for desde in range(0, len(textos), batch_size):
+            lote = textos[desde:desde + batch_size]
+            inputs = tokenizer(lote, return_tensors="pt", truncation=True, padding=True, max_length=512)
+            probs.extend(torch.sigmoid(model(**inputs).logits)[:, 0].tolist())
+    return np.array(probs)
+
+
+def comparar_toxicidad(backend, textos):
+    ref = _probabilidades(*cargar_modelo_toxicidad("torch"), textos)
+    opt = _probabilidades(*cargar_modelo_toxicidad(backend), textos)
+    diferencias = np.abs(ref - opt)
+    return {
+        "textos": len(textos),
+        "diferencia_max": float(diferencias.max()),
+        "diferencia_media": float(diferencias.mean()),
+        "acuerdo_decision": float(np.mean((ref > TOXICITY_THRESHOLD) == (opt > TOXICITY_THRESHOLD))),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=[b for b in BACKENDS if b != "torch"], default="int8")
+    parser.add_argument("--max-textos", type=int, default=None, help="Limitar la cantidad de trámites de la KB")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    textos = _textos_kb(args.max_textos)
+    titulos = [t.split(". ", 1)[0] for t in textos]
+
+    emb = comparar_embeddings(args.backend, textos, MENSAJES_MUESTRA + titulos[:50])
+    tox = comparar_toxicidad(args.backend, MENSAJES_MUESTRA + titulos[:50])
+    print(json.dumps({"backend": args.backend, "embeddings": emb, "toxicidad": tox}, indent=2, ensure_ascii=False))
+
+    fallas = []
+    if emb["coseno_min"] < COSENO_MINIMO:
+        fallas.append(f"coseno mínimo {emb['coseno_min']:.4f} < {COSENO_MINIMO}")
+    if emb["acuerdo_top1"] < ACUERDO_TOP1_MINIMO:
+        fallas.append(f"acuerdo top-1 {emb['acuerdo_top1']:.3f} < {ACUERDO_TOP1_MINIMO}")
+    if tox["diferencia_max"] > DIFERENCIA_PROB_MAXIMA:
+        fallas.append(f"diferencia de probabilidad {tox['diferencia_max']:.4f} > {DIFERENCIA_PROB_MAXIMA}")
+    if tox["acuerdo_decision"] < ACUERDO_DECISION_MINIMO:
+        fallas.append(f"acuerdo de decisión {tox['acuerdo_decision']:.3f} < {ACUERDO_DECISION_MINIMO}")
+
+    if fallas:
+        print("❌ Deriva fuera de tolerancia: " + "; ".join(fallas))
+        return 1
+    print(f"✅ El backend '{args.backend}' está dentro de la tolerancia frente a fp32.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
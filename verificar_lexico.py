@@ -0,0 +1,108 @@
+"""
+Chequeo de la etapa léxica de detectar_toxicidad: ningún título ni
+descripción de la base de conocimiento (ni las consultas de ejemplo) puede
+contener una palabra prohibida, y los insultos de ejemplo sí tienen que
+detectarse.
+
+También chequea la etapa de frases seguras: las consultas de trámites se
+aceptan sin modelo, pero las amenazas armadas con palabras de la base de
+conocimiento ("muerte a los funcionarios") tienen que seguir hasta el modelo.
+
+Uso:
+    python verificar_lexico.py
+"""
+import sys
+import argparse
+import logging
+
+from data_manager import load_knowledge_base
+from models import _etapa_lexico, _etapa_frases_seguras
+from text_utils import normalizar_texto
+
+CONSULTAS_BENIGNAS = [
+    "quiero conocer los requisitos",
+    "no conozco el trámite",
+    "desconocido",
+    "economía mixta",
+    "tengo una disputa con el vecino",
+    "es un trámite corto?",
+    "licencia de pesca recreativa",
+    "cuánto sale el año de antigüedad",
+]
+
+INSULTOS = [
+    "sos un coño",
+    "hijo de puta",
+    "sos un pelotudo",
+    "que gil",
+    "andate a la mierda",
+]
+
+FRASES_SEGURAS = [
+    "hola, buenas tardes",
+    "muchas gracias",
+    "cómo saco el certificado de antecedentes",
+    "cuánto sale la partida de nacimiento",
+    "qué requisitos hay para la licencia de conducir",
+    "dónde renuevo el dni",
+]
+
+# Amenazas armadas con palabras que aparecen en la base de conocimiento (funcionarios,
+# director, registro, oficina...): ninguna puede decidirse sin el modelo.
+AMENAZAS = [
+    "muerte a los funcionarios",
+    "hay que matar a los empleados del registro",
+    "quiero la muerte del director",
+    "voy a quemar la oficina de rentas",
+    "una bomba en el registro civil",
+    "los funcionarios se tienen que morir",
+]
+
+
+def _lexico(texto):
+    # Misma llamada que hace CascadaToxicidad.evaluar.
+    return _etapa_lexico(texto, normalizar_texto(texto))
+
+
+def _prohibida(texto):
+    resultado = _lexico(texto)
+    return resultado is not None and resultado[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    fallas = []
+    for entry in load_knowledge_base():
+        data = entry.get('data') or {}
+        for campo in ('titulo', 'descripcion'):
+            texto = data.get(campo)
+            if isinstance(texto, str) and _prohibida(texto):
+                fallas.append(f"{campo} de {entry.get('url')}: {_lexico(texto)[1]}")
+    for consulta in CONSULTAS_BENIGNAS:
+        if _prohibida(consulta):
+            fallas.append(f"consulta '{consulta}': {_lexico(consulta)[1]}")
+    for insulto in INSULTOS:
+        if not _prohibida(insulto):
+            fallas.append(f"insulto no detectado: '{insulto}'")
+    for frase in FRASES_SEGURAS:
+        if _etapa_frases_seguras(frase, normalizar_texto(frase)) is None:
+            fallas.append(f"frase de trámite no aceptada sin modelo: '{frase}'")
+    for amenaza in AMENAZAS:
+        resultado = _etapa_frases_seguras(amenaza, normalizar_texto(amenaza))
+        if resultado is not None:
+            fallas.append(f"amenaza '{amenaza}' no llega al modelo: {resultado[1]}")
+
+    if fallas:
+        print("❌ La etapa léxica falla:")
+        for falla in fallas:
+            print(f"   - {falla}")
+        return 1
+    print("✅ Ningún texto de la base de conocimiento coincide con una palabra prohibida y las amenazas llegan al modelo.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+Chequeo diferencial del extractor de trámites: compara, campo por campo, el
+resultado del camino rápido (lxml con parseo por secciones) contra el de
+referencia (html.parser sobre la página completa) y mide páginas/segundo de cada uno.
+
+Por defecto usa el HTML guardado en html_cache; también acepta un directorio
+con archivos .html.
+
+Uso:
+    python verificar_parser.py
+    python verificar_parser.py --directorio paginas/ --repeticiones 3
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+
+import html_cache
+from scraper import extraer_datos_tramite, nuevo_registro_tramite
+
+logger = logging.getLogger(__name__)
+
+PARSER_REFERENCIA = "html.parser"
+
+
+def _paginas_cache(max_paginas=None):
+    paginas = []
+    for url, entrada in html_cache.ultimas_versiones().items():
+        if max_paginas and len(paginas) >= max_paginas:
+            break
+        paginas.append((url, html_cache.leer_html(entrada["hash"], entrada.get("encoding"))))
+    return paginas
+
+
+def _paginas_directorio(directorio, max_paginas=None):
+    paginas = []
+    for nombre in sorted(os.listdir(directorio)):
+        if not nombre.endswith((".html", ".htm")):
+            continue
+        if max_paginas and len(paginas) >= max_paginas:
+            break
+        with open(os.path.join(directorio, nombre), "r", encoding="utf-8", errors="replace") as f:
+            paginas.append((nombre, f.read()))
+    return paginas
+
+
+def medir(paginas, parser, repeticiones=1):
+    """Devuelve (resultados, paginas_por_segundo) de extraer todas las páginas con `parser`."""
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        resultados = [extraer_datos_tramite(html, parser=parser) for _, html in paginas]
+    segundos = time.perf_counter() - inicio
+    return resultados, len(paginas) * repeticiones / segundos if segundos else float("inf")
+
+
+def diferencias(referencia, candidato):
+    """Campos en los que `candidato` no coincide con `referencia`."""
+    return [campo for campo in nuevo_registro_tramite() if referencia.get(campo) != candidato.get(campo)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--directorio", help="Directorio con páginas .html (por defecto, html_cache)")
+    parser.add_argument("--parser", default="lxml", help="Parser a comparar contra html.parser")
+    parser.add_argument("--max-paginas", type=int, default=None)
+    parser.add_argument("--repeticiones", type=int, default=1, help="Pasadas para medir el rendimiento")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.directorio:
+        paginas = _paginas_directorio(args.directorio, args.max_paginas)
+    else:
+        paginas = _paginas_cache(args.max_paginas)
+    if not paginas:
+        print("❌ No hay páginas para comparar (html_cache vacío o directorio sin .html).")
+        return 1
+
+    referencia, pps_referencia = medir(paginas, PARSER_REFERENCIA, args.repeticiones)
+    candidato, pps_candidato = medir(paginas, args.parser, args.repeticiones)
+
+    distintas = {}
+    for (origen, _), ref, cand in zip(paginas, referencia, candidato):
+        campos = diferencias(ref, cand)
+        if campos:
+            distintas[origen] = {campo: {PARSER_REFERENCIA: ref[campo], args.parser: cand[campo]} for campo in campos}
+
+    print(json.dumps({
+        "paginas": len(paginas),
+        "paginas_por_segundo": {
+            PARSER_REFERENCIA: round(pps_referencia, 1),
+            args.parser: round(pps_candidato, 1),
+        },
+        "aceleracion": round(pps_candidato / pps_referencia, 2) if pps_referencia else None,
+        "paginas_distintas": len(distintas),
+    }, indent=2, ensure_ascii=False))
+
+    if distintas:
+        for origen, campos in list(distintas.items())[:10]:
+            print(f"--- {origen}")
+            print(json.dumps(campos, indent=2, ensure_ascii=False))
+        print(f"❌ {len(distintas)} de {len(paginas)} páginas difieren entre {args.parser} y {PARSER_REFERENCIA}.")
+        return 1
+    print(f"✅ {args.parser} y {PARSER_REFERENCIA} extraen lo mismo en las {len(paginas)} páginas.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())